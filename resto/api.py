@@ -5,6 +5,8 @@ from frappe.auth import LoginManager
 from frappe.core.doctype.user.user import generate_keys
 from frappe.utils import flt, get_datetime, now_datetime
 
+from resto.print_metrics import timed
+
 @frappe.whitelist()
 def print_now():
     from resto.printing import pos_invoice_print_now
@@ -85,67 +87,29 @@ def get_branch_list():
 
 @frappe.whitelist()
 def get_all_branch_menu_with_children(branch=None):
-    filters = {"enabled": 1}
-    if branch:
-        filters["branch"] = branch
-
-    branch_menus = frappe.get_all(
-        "Branch Menu",
-        filters=filters,
-        fields=["name", "menu_item", "rate"],
-        limit_page_length=0
-    )
-
-    if not branch_menus:
-        return []
-
-    menu_items = [bm.menu_item for bm in branch_menus if bm.menu_item]
-
-    resto_menus = {
-        rm.name: rm
-        for rm in frappe.get_all(
-            "Resto Menu",
-            filters={"name": ["in", menu_items]},
-            fields=[
-                "name",
-                "title",
-                "menu_category",
-                "sell_item",
-                "use_stock",
-                "stock_limit",
-                "stock_used",
-                "is_sold_out",
-                "description"
-            ]
-        )
-    }
-
-    files = frappe.get_all(
-        "File",
-        filters={
-            "attached_to_doctype": "Resto Menu",
-            "attached_to_name": ["in", menu_items]
-        },
-        fields=["attached_to_name", "file_url"]
-    )
-    image_map = {f.attached_to_name: f.file_url for f in files}
+    from resto.menu_catalog import attach_stock, get_catalog_snapshot
+    return attach_stock(get_catalog_snapshot(branch)["items"])
 
-    result = []
+@frappe.whitelist()
+def get_branch_menu_catalog(branch=None, since_version=None):
+    """
+    Katalog menu dengan versi untuk sync POS.
+    since_version bisa dikirim lewat parameter atau header If-None-Match.
+    Return status not_modified (HTTP 304), delta atau full.
+    """
+    from resto.menu_catalog import get_catalog_delta
 
-    for bm in branch_menus:
-        if bm.menu_item not in resto_menus:
-            continue
+    if not since_version:
+        since_version = (frappe.get_request_header("If-None-Match") or "").strip('"') or None
 
-        branch_doc = frappe.get_doc("Branch Menu", bm.name)
-        branch_dict = branch_doc.as_dict()
+    result = get_catalog_delta(branch, since_version)
 
-        branch_dict.update({
-            "rate": bm.rate,
-            "resto_menu": resto_menus.get(bm.menu_item),
-            "image": image_map.get(bm.menu_item)
-        })
+    response_headers = getattr(frappe.local, "response_headers", None)
+    if response_headers is not None:
+        response_headers.set("ETag", f'"{result["version"]}"')
 
-        result.append(branch_dict)
+    if result["status"] == "not_modified":
+        frappe.local.response["http_status_code"] = 304
 
     return result
 
@@ -161,72 +125,174 @@ def create_customer(name, mobile_no=None):
     doc.insert(ignore_permissions=True)
     return doc.as_dict()
 
-@frappe.whitelist()
-def update_table_status(name, status=None, taken_by=None, pax=None, customer=None, type_customer=None, orders=None, checked=None):
-    doc = frappe.get_doc("Table", name)
+# =====================================================
+# UPDATE STATUS MEJA
+# =====================================================
+TABLE_UPDATE_RETRIES = 3
+TABLE_STATE_FIELDS = ("status", "taken_by", "pax", "customer", "type_customer", "checked")
+
+def _parse_table_invoices(orders):
+    """orders (list / JSON string, item dict atau nama invoice) -> list nama invoice unik."""
+    if isinstance(orders, str):
+        try:
+            orders = json.loads(orders)
+        except Exception:
+            frappe.log_error("Gagal parse orders JSON", orders)
+            orders = []
 
+    if not isinstance(orders, list):
+        orders = []
+
+    invoices = (o.get("invoice_name") if isinstance(o, dict) else o for o in orders)
+    return list(dict.fromkeys(i for i in invoices if i))
+
+def _insert_table_orders(table_name, invoices, start_idx, now):
+    """INSERT baris Table Order baru saja (status di-fetch dari POS Invoice dalam satu query)."""
+    statuses = dict(frappe.get_all(
+        "POS Invoice",
+        filters={"name": ["in", invoices]},
+        fields=["name", "status"],
+        as_list=True
+    ))
+    user = frappe.session.user
+
+    frappe.db.bulk_insert(
+        "Table Order",
+        fields=["name", "parent", "parenttype", "parentfield", "idx", "invoice_name", "status",
+                "docstatus", "creation", "modified", "owner", "modified_by"],
+        values=[
+            (frappe.generate_hash(length=10), table_name, "Table", "orders", idx, invoice,
+             statuses.get(invoice), 0, now, now, user, user)
+            for idx, invoice in enumerate(invoices, start=start_idx)
+        ]
+    )
+
+def _lock_table_orders(table_name):
+    """Locking read baris Table Order meja (selalu data ter-commit terbaru) -> [(invoice_name, idx)]."""
+    return frappe.db.sql("""
+        SELECT invoice_name, idx
+        FROM `tabTable Order`
+        WHERE parenttype = 'Table' AND parentfield = 'orders' AND parent = %s
+        ORDER BY idx
+        FOR UPDATE
+    """, table_name)
+
+def apply_table_update(name, values=None, invoices=(), clear_orders=False, expected_modified=None):
+    """
+    Update meja tanpa doc.save: UPDATE kolom yang berubah saja dan INSERT baris
+    Table Order yang belum ada, tanpa Version dan tanpa menulis ulang semua orders.
+
+    Optimistic concurrency pada `modified`: UPDATE hanya berlaku kalau `modified`
+    masih sama dengan yang dibaca. Kalau meja diubah waiter lain di antaranya,
+    baca ulang (locking read) lalu terapkan lagi perubahan di atas data terbaru,
+    jadi orders waiter lain tidak tertimpa. Baris orders selalu dibaca dengan
+    FOR UPDATE: read biasa di REPEATABLE READ memakai snapshot awal transaksi
+    dan bisa melewatkan order yang baru di-commit waiter lain. expected_modified (dari client)
+    menolak update kalau meja sudah berubah sejak client membacanya.
+
+    values boleh dict atau fn(current) -> dict. Return state meja setelah update.
+    """
+    from resto.table_feed import publish_table_change, table_message
+    from resto.table_lookup import invalidate_invoice_tables
+
+    fields = ["name", "table_name", "table_type", "zone", "floor", "modified", *TABLE_STATE_FIELDS]
+
+    for attempt in range(TABLE_UPDATE_RETRIES):
+        current = frappe.db.get_value("Table", name, fields, as_dict=True, for_update=attempt > 0)
+        if not current:
+            frappe.throw(f"Table {name} tidak ditemukan", frappe.DoesNotExistError)
+
+        if expected_modified and current.modified != get_datetime(expected_modified):
+            frappe.throw(
+                f"Table {name} sudah diubah user lain, muat ulang data meja.",
+                frappe.TimestampMismatchError
+            )
+
+        rows = _lock_table_orders(name)
+        existing = [invoice for invoice, _ in rows]
+        last_idx = max((idx for _, idx in rows), default=0)
+        changes = values(current) if callable(values) else dict(values or {})
+        changes = {k: v for k, v in changes.items() if current.get(k) != v}
+        drop_orders = clear_orders and existing
+        new_invoices = [i for i in invoices if clear_orders or i not in existing]
+
+        if not (changes or drop_orders or new_invoices):
+            current.orders = [frappe._dict(invoice_name=i) for i in existing]
+            return current
+
+        now = now_datetime()
+        assignments = "".join(f", `{k}` = %({k})s" for k in changes)
+        frappe.db.sql(f"""
+            UPDATE `tabTable`
+            SET modified = %(now)s, modified_by = %(user)s{assignments}
+            WHERE name = %(name)s AND modified = %(modified)s
+        """, {**changes, "now": now, "user": frappe.session.user, "name": name, "modified": current.modified})
+
+        if frappe.db._cursor.rowcount != 1:
+            # Meja berubah sejak dibaca; ulangi dengan data terbaru
+            continue
+
+        # Nama meja / pax semua invoice di meja ini ikut berubah
+        invalidate_invoice_tables(existing + new_invoices)
+
+        if drop_orders:
+            frappe.db.sql("""
+                DELETE FROM `tabTable Order`
+                WHERE parenttype = 'Table' AND parentfield = 'orders' AND parent = %s
+            """, name)
+            existing, last_idx = [], 0
+
+        if new_invoices:
+            _insert_table_orders(name, new_invoices, last_idx + 1, now)
+
+        current.update(changes)
+        current.modified = now
+        current.orders = [frappe._dict(invoice_name=i) for i in existing + new_invoices]
+        publish_table_change(table_message(current))
+        return current
+
+    frappe.throw(f"Table {name} sedang diubah user lain, coba lagi.", frappe.TimestampMismatchError)
+
+@frappe.whitelist()
+def update_table_status(name, status=None, taken_by=None, pax=None, customer=None, type_customer=None, orders=None, checked=None, modified=None):
     if status == "Kosong":
-        doc.status = "Kosong"
-        doc.taken_by = ""
-        doc.pax = 0
-        doc.customer = ""
-        doc.type_customer = ""
-        doc.checked = 0
-        doc.orders = []
+        table = apply_table_update(
+            name,
+            {"status": "Kosong", "taken_by": "", "pax": 0, "customer": "", "type_customer": "", "checked": 0},
+            clear_orders=True,
+            expected_modified=modified
+        )
     else:
+        values = {}
         if checked is not None:
-            doc.checked = int(checked)
+            values["checked"] = int(checked)
         if status is not None:
-            doc.status = status
+            values["status"] = status
         if taken_by is not None:
-            doc.taken_by = taken_by
+            values["taken_by"] = taken_by
         if pax is not None:
-            doc.pax = int(pax)
+            values["pax"] = int(pax)
         if customer is not None:
-            doc.customer = customer
+            values["customer"] = customer
         if type_customer is not None:
-            doc.type_customer = type_customer
-        if orders is not None:
+            values["type_customer"] = type_customer
 
-            if isinstance(orders, str):
-                try:
-                    orders = json.loads(orders)
-                except Exception:
-                    frappe.log_error("Gagal parse orders JSON", orders)
-                    orders = []
-
-            if not isinstance(orders, list):
-                orders = []
-
-            # ambil invoice yang sudah ada
-            existing_invoices = {d.invoice_name for d in doc.orders}
-
-            for o in orders:
-                invoice_name = o.get("invoice_name") if isinstance(o, dict) else o
-
-                if invoice_name and invoice_name not in existing_invoices:
-                    doc.append("orders", {"invoice_name": invoice_name})
-
-    doc.save(ignore_permissions=True)
-    frappe.db.commit()
+        invoices = _parse_table_invoices(orders) if orders is not None else []
+        table = apply_table_update(name, values, invoices, expected_modified=modified)
 
     return {
         "success": True,
-        "message": f"Table {doc.name} updated successfully",
-        "checked": getattr(doc, "checked", None)
+        "message": f"Table {name} updated successfully",
+        "checked": table.checked,
+        "modified": table.modified
     }
 
 @frappe.whitelist()
 def add_table_order(table_name, order):
     """Tambah order baru ke Table tanpa menghapus orders lama"""
-    import json
-
     if not table_name or not order:
         frappe.throw("Table name dan order wajib diisi.")
 
-    # Ambil dokumen Table
-    doc = frappe.get_doc("Table", table_name)
-
     # Pastikan order bisa dibaca (bisa dikirim sebagai dict atau JSON string)
     if isinstance(order, str):
         try:
@@ -239,19 +305,15 @@ def add_table_order(table_name, order):
         frappe.throw("Field 'invoice_name' wajib ada di order.")
 
     # Cek apakah invoice_name sudah ada
-    existing_invoices = {o.invoice_name for o in doc.orders}
-    if invoice_name in existing_invoices:
+    if frappe.db.exists("Table Order", {"parenttype": "Table", "parent": table_name, "invoice_name": invoice_name}):
         return {"success": False, "message": f"Invoice {invoice_name} sudah ada di Table {table_name}"}
 
-    # Tambahkan order baru
-    doc.append("orders", {"invoice_name": invoice_name})
-
     # Ubah status jadi 'Terisi' jika sebelumnya kosong
-    if doc.status == "Kosong":
-        doc.status = "Terisi"
-
-    doc.save(ignore_permissions=True)
-    frappe.db.commit()
+    apply_table_update(
+        table_name,
+        lambda current: {"status": "Terisi"} if current.status == "Kosong" else {},
+        [invoice_name]
+    )
 
     return {"success": True, "message": f"Order {invoice_name} berhasil ditambahkan ke Table {table_name}"}
 
@@ -309,7 +371,7 @@ def create_pos_invoice(payload):
             "name"
         )
         if tax_template_name:
-            template = frappe.get_doc("Sales Taxes and Charges Template", tax_template_name)
+            template = frappe.get_cached_doc("Sales Taxes and Charges Template", tax_template_name)
             for t in template.taxes:
                 taxes.append({
                     "charge_type": t.charge_type,
@@ -328,7 +390,7 @@ def create_pos_invoice(payload):
         "pos_profile": pos_profile,
         "order_type": order_type,
         "branch": branch,
-        "company": frappe.db.get_single_value("Global Defaults", "default_company"),
+        "company": company,
         "items": [],
         "payments": [],
         "queue": queue,
@@ -388,9 +450,8 @@ def create_pos_invoice(payload):
     else:
         frappe.log_error("Field 'additional_items' tidak ditemukan di POS Invoice", "Create POS Invoice Error")
 
-    # Simpan dokumen
+    # Simpan dokumen (insert sudah menjalankan validate + before_save, tidak perlu save ulang)
     pos_invoice.insert(ignore_permissions=True)
-    pos_invoice.save()
 
     return {
         "status": "success",
@@ -509,68 +570,13 @@ def send_to_kitchen(payload, table_name=None, status=None, taken_by=None, pax=0,
         semua field Table yang dikirim dari FE
     """
     try:
-        if isinstance(payload, str):
-            payload = json.loads(payload)
-
-        result = create_pos_invoice(payload)
-        pos_name = result["name"]
-
-        table_update_result = None
-
-        # ✅ update table dulu sebelum print
-        if table_name:
-            if frappe.db.exists("Table", table_name):
-                # normalize orders dari FE
-                if orders is None:
-                    orders = []
-                elif isinstance(orders, str):
-                    try:
-                        orders = json.loads(orders)
-                    except Exception:
-                        frappe.log_error("Gagal parse orders JSON", orders)
-                        orders = []
-
-                if not isinstance(orders, list):
-                    orders = []
-
-                # cek apakah invoice sudah ada dalam list orders
-                exists = any(
-                    isinstance(o, dict) and o.get("invoice_name") == pos_name
-                    for o in orders
-                )
-
-                # kalau belum ada → append
-                if not exists:
-                    orders.append({"invoice_name": pos_name})
-
-                table_update_result = update_table_status(
-                    name=table_name,
-                    status=status or "Terisi",
-                    taken_by=taken_by,
-                    pax=pax,
-                    customer=customer,
-                    type_customer=type_customer,
-                    orders=orders,
-                    checked=checked
-                )
-            else:
-                # Take Away / table tidak ada → lewati update table
-                frappe.log_error(f"Take Away POS Invoice {pos_name} tidak terkait table", "send_to_kitchen")    
-
-        # print kitchen
-        try:
-            print_to_ks_now(pos_name)
-            printing_status = "Printing queued"
-        except Exception as print_err:
-            frappe.log_error(frappe.get_traceback(), f"Printing Error for POS {pos_name}")
-            printing_status = f"Printing gagal: {str(print_err)}"
-
-        return {
-            "status": "success",
-            "pos_invoice": pos_name,
-            "table_update": table_update_result,
-            "message": f"POS Invoice {pos_name} created. {printing_status}"
-        }
+        result = _send_to_kitchen(
+            payload, table_name=table_name, status=status, taken_by=taken_by, pax=pax,
+            customer=customer, type_customer=type_customer, orders=orders, checked=checked
+        )
+        # Satu commit: invoice, meja dan Print Job kitchen masuk bersamaan
+        frappe.db.commit()
+        return result
 
     except Exception as e:
         frappe.log_error(frappe.get_traceback(), "Send to Kitchen - Invoice Creation Error")
@@ -579,6 +585,79 @@ def send_to_kitchen(payload, table_name=None, status=None, taken_by=None, pax=0,
             msg=str(e)
         )
 
+def _send_to_kitchen(payload, table_name=None, status=None, taken_by=None, pax=0,
+                     customer=None, type_customer=None, orders=None, checked=None):
+    """
+    Isi send_to_kitchen tanpa commit: buat invoice sekali (insert), update meja
+    lewat apply_table_update, dan antrikan tiket kitchen ke spooler. Printer
+    tidak disentuh di request ini.
+    """
+    if isinstance(payload, str):
+        payload = json.loads(payload)
+
+    result = create_pos_invoice(payload)
+    pos_name = result["name"]
+
+    table_update_result = None
+
+    # ✅ update table dulu sebelum print
+    if table_name:
+        if frappe.db.exists("Table", table_name):
+            # normalize orders dari FE
+            if orders is None:
+                orders = []
+            elif isinstance(orders, str):
+                try:
+                    orders = json.loads(orders)
+                except Exception:
+                    frappe.log_error("Gagal parse orders JSON", orders)
+                    orders = []
+
+            if not isinstance(orders, list):
+                orders = []
+
+            # cek apakah invoice sudah ada dalam list orders
+            exists = any(
+                isinstance(o, dict) and o.get("invoice_name") == pos_name
+                for o in orders
+            )
+
+            # kalau belum ada → append
+            if not exists:
+                orders.append({"invoice_name": pos_name})
+
+            table_update_result = update_table_status(
+                name=table_name,
+                status=status or "Terisi",
+                taken_by=taken_by,
+                pax=pax,
+                customer=customer,
+                type_customer=type_customer,
+                orders=orders,
+                checked=checked
+            )
+        else:
+            # Take Away / table tidak ada → lewati update table
+            frappe.log_error(f"Take Away POS Invoice {pos_name} tidak terkait table", "send_to_kitchen")    
+
+    # print kitchen lewat spooler, request tidak menunggu printer
+    try:
+        frappe.db.savepoint("queue_kitchen_tickets")
+        queue_kitchen_tickets(pos_name, commit=False)
+        printing_status = "Printing queued"
+    except Exception as print_err:
+        # Invoice + meja tetap tersimpan, hanya antrian print yang dibatalkan
+        frappe.db.rollback(save_point="queue_kitchen_tickets")
+        frappe.log_error(frappe.get_traceback(), f"Printing Error for POS {pos_name}")
+        printing_status = f"Printing gagal: {str(print_err)}"
+
+    return {
+        "status": "success",
+        "pos_invoice": pos_name,
+        "table_update": table_update_result,
+        "message": f"POS Invoice {pos_name} created. {printing_status}"
+    }
+
 def grouping_items_to_kitchen_station(branch, pos_name):
     """
     ***UNUSED***
@@ -616,23 +695,46 @@ def send_to_ks_printing(kitchen_station, pos_invoice, items):
         })
     return doc.insert(ignore_permissions=True)
 
-def print_to_ks_now(pos_invoice):
-    from resto.printing import kitchen_print_from_payload
+def _payload_pairs(payload):
+    """Pasangan (invoice item, station) dalam satu payload tiket."""
+    return {(it.get("name"), payload.get("kitchen_station")) for it in payload.get("items", [])}
+
+def _collect_kitchen_payloads(pos_invoice):
+    """
+    Payload per station untuk item yang belum dicetak + nama item yang harus dikunci.
+    Setiap (item, station) di-claim dulu di Kitchen Print Ledger; yang sudah
+    di-claim / dicetak proses lain tidak ikut, jadi panggilan paralel atau
+    retry tidak menghasilkan tiket ganda. Ledger satu-satunya penentu per
+    station: is_print_kitchen baru di-set setelah semua station tercetak.
+    """
+    from resto.resto_sopwer.doctype.kitchen_print_ledger.kitchen_print_ledger import (
+        claim_kitchen_items,
+        get_printed_before_ledger,
+    )
 
     # Kumpulkan semua payload per station
     station_payloads = []
     items_to_lock = set()  # menyimpan nama item yang akan dikunci setelah cetak
 
-    for item in get_branch_menu_for_kitchen_printing(pos_invoice):
+    tickets = get_branch_menu_for_kitchen_printing(pos_invoice)
+
+    # Item lama yang tercetak sebelum ada ledger tidak dicetak ulang
+    legacy = get_printed_before_ledger(
+        [it.get("name") for ticket in tickets for it in ticket.get("items", [])]
+    )
+
+    claimed = claim_kitchen_items(pos_invoice, [
+        (it.get("name"), ticket.get("kitchen_station"))
+        for ticket in tickets
+        for it in ticket.get("items", [])
+        if it.get("name") not in legacy
+    ])
+
+    for item in tickets:
         items_to_send = []
         for it in item.get("items", []):
             name = it.get("name")
-            if not name:
-                continue
-
-            # Cek apakah item sudah pernah dicetak (0 = belum)
-            status = frappe.db.get_value("POS Invoice Item", name, "is_print_kitchen")
-            if int(status or 0) == 0:
+            if (name, item.get("kitchen_station")) in claimed:
                 items_to_send.append(it)
                 items_to_lock.add(name)  # tandai untuk dikunci nanti
 
@@ -645,16 +747,109 @@ def print_to_ks_now(pos_invoice):
             }
             station_payloads.append(payload)
 
-    # Kirim semua instruksi cetak ke masing-masing station
+    return station_payloads, items_to_lock
+
+def print_to_ks_now(pos_invoice):
+    from resto.printing import kitchen_print_from_payload
+    from resto.resto_sopwer.doctype.kitchen_print_ledger.kitchen_print_ledger import (
+        flag_fully_printed,
+        mark_printed,
+    )
+
+    station_payloads, items_to_lock = _collect_kitchen_payloads(pos_invoice)
+
+    # Claim terlihat proses lain sebelum printer disentuh
+    frappe.db.commit()
+
+    # Kirim semua instruksi cetak ke masing-masing station; tiap station yang
+    # sudah tercetak langsung dicatat supaya crash di tengah tidak mencetak ulang
     for payload in station_payloads:
         kitchen_print_from_payload(payload)
+        mark_printed(_payload_pairs(payload))
+        frappe.db.commit()
 
-    # Setelah semua terkirim, kunci semua item yang sudah diproses
-    for name in items_to_lock:
-        frappe.db.set_value("POS Invoice Item", name, "is_print_kitchen", 1)
+    # Kunci item yang sudah tercetak di semua station-nya
+    flag_fully_printed(items_to_lock)
 
     frappe.db.commit()
 
+def queue_kitchen_tickets(pos_invoice, commit=True):
+    """
+    Versi async print_to_ks_now: satu Print Job per tiket station, dikirim
+    oleh print spooler. Claim ledger dan insert job terjadi di satu
+    transaksi, jadi send ulang tidak membuat tiket ganda. is_print_kitchen
+    di-set spooler setelah semua station item tercetak. Send berulang dalam
+    coalesce window Printer Settings digabung ke tiket yang masih antri.
+    """
+    from resto.print_spooler import enqueue_print_job, get_kitchen_coalesce_seconds
+    from resto.resto_sopwer.doctype.kitchen_print_ledger.kitchen_print_ledger import attach_print_job
+
+    station_payloads, _ = _collect_kitchen_payloads(pos_invoice)
+    if not station_payloads:
+        return []
+
+    coalesce_seconds = get_kitchen_coalesce_seconds(
+        frappe.db.get_value("POS Invoice", pos_invoice, "branch")
+    )
+
+    jobs = []
+    for payload in station_payloads:
+        payload["owner"] = frappe.session.user
+        job = enqueue_print_job(
+            payload.get("printer_name") or payload.get("kitchen_station"),
+            "Kitchen",
+            payload,
+            pos_invoice=pos_invoice,
+            kitchen_station=payload.get("kitchen_station"),
+            coalesce_seconds=coalesce_seconds
+        )
+        attach_print_job(_payload_pairs(payload), job)
+        if job not in jobs:
+            jobs.append(job)
+
+    if commit:
+        frappe.db.commit()
+    return jobs
+
+@timed("route", ticket_type="Kitchen")
+def _get_kitchen_routing_rows(pos_name: str):
+    """
+    Satu query item invoice (+ branch, short_name), lalu printer station
+    di-resolve dari tabel routing yang di-cache (resto.kitchen_routing).
+    Satu baris per (item, printer station), urutan sama seperti sebelumnya.
+    """
+    from resto.kitchen_routing import get_menu_printers
+
+    items = frappe.db.sql("""
+        SELECT
+            pii.name,
+            pii.resto_menu,
+            pii.item_name,
+            pii.qty,
+            pii.quick_notes,
+            pii.add_ons,
+            pi.branch,
+            IFNULL(rm.short_name, '') AS short_name
+        FROM `tabPOS Invoice Item` pii
+        JOIN `tabPOS Invoice` pi
+            ON pi.name = pii.parent
+        LEFT JOIN `tabResto Menu` rm
+            ON rm.name = pii.resto_menu
+        WHERE
+            pii.parent = %(pos_name)s
+            AND pii.parenttype = 'POS Invoice'
+            AND IFNULL(pii.resto_menu, '') != ''
+        ORDER BY pii.idx
+    """, {"pos_name": pos_name}, as_dict=True)
+
+    rows = []
+    for it in items:
+        for printer in get_menu_printers(it.branch, it.resto_menu):
+            if not printer["kitchen_station"]:
+                continue
+            rows.append(frappe._dict(it, **printer))
+    return rows
+
 @frappe.whitelist()
 def get_branch_menu_for_kitchen_printing(pos_name: str):
     """
@@ -662,86 +857,39 @@ def get_branch_menu_for_kitchen_printing(pos_name: str):
     For Combine: one ticket with all items for that station.
     For Split: one ticket per item for that station.
     """
-    # Ambil branch dari POS Invoice agar pencarian Branch Menu relevan
-    branch = frappe.db.get_value("POS Invoice", pos_name, "branch")
-
-    # Ambil item dari POS Invoice Item
-    pos_items = frappe.get_all(
-        "POS Invoice Item",
-        filters={"parent": pos_name},
-        fields=["name", "resto_menu", "item_name", "qty", "quick_notes", "add_ons"]
-    )
-
-    if not pos_items:
-        return []
-
     # Dictionary untuk menyimpan data per station
     # station_data[station] = {"items": [], "printing_type": ...}
     station_data = {}
-    short_name_cache = {}
-
-    for it in pos_items:
-        resto_menu = it.get("resto_menu")
-        if not resto_menu:
-            continue
-
-        # Ambil short_name dari Resto Menu (cache)
-        if resto_menu not in short_name_cache:
-            short_name_cache[resto_menu] = frappe.db.get_value(
-                "Resto Menu", resto_menu, "short_name"
-            ) or ""
-
-        # Cari Branch Menu yang sesuai resto_menu (dan branch jika tersedia)
-        bm_filters = {"menu_item": resto_menu}
-        if branch:
-            bm_filters["branch"] = branch
 
-        branch_menus = frappe.get_all(
-            "Branch Menu",
-            filters=bm_filters,
-            fields=["name"]
-        )
+    for row in _get_kitchen_routing_rows(pos_name):
+        station = row.kitchen_station
+        printing_type = row.printing_type
 
-        if not branch_menus:
-            continue
+        # Inisialisasi data station jika belum ada
+        if station not in station_data:
+            station_data[station] = {
+                "items": [],
+                "printing_type": printing_type
+            }
+        elif station_data[station]["printing_type"] != printing_type:
+            # Jika printing_type berbeda, log warning dan gunakan yang pertama
+            frappe.logger("pos_print").warning(
+                f"Inconsistent printing_type for station {station}: "
+                f"{station_data[station]['printing_type']} vs {printing_type}. "
+                f"Using {station_data[station]['printing_type']}"
+            )
 
-        # Untuk setiap Branch Menu yang cocok, ambil printer entries
-        for bm in branch_menus:
-            bm_doc = frappe.get_doc("Branch Menu", bm.name)
-            for printer_entry in (bm_doc.printers or []):
-                printer_name = printer_entry.get("printer_name")
-                if not printer_name:
-                    continue
-                station = printer_entry.get("kitchen_station")
-                if not station:
-                    continue
-                printing_type = printer_entry.get("printing_type") or "Combine"  # default Combine
-
-                # Inisialisasi data station jika belum ada
-                if station not in station_data:
-                    station_data[station] = {
-                        "items": [],
-                        "printing_type": printing_type
-                    }
-                else:
-                    # Jika printing_type berbeda, log warning dan gunakan yang pertama
-                    if station_data[station]["printing_type"] != printing_type:
-                        frappe.logger("pos_print").warning(
-                            f"Inconsistent printing_type for station {station}: "
-                            f"{station_data[station]['printing_type']} vs {printing_type}. "
-                            f"Using {station_data[station]['printing_type']}"
-                        )
-
-                # Tambahkan item ke station ini
-                station_data[station]["items"].append({
-                    "resto_menu": resto_menu,
-                    "short_name": short_name_cache.get(resto_menu, ""),
-                    "item_name": it.get("item_name") or "",
-                    "qty": it.get("qty") or 0,
-                    "quick_notes": it.get("quick_notes") or "",
-                    "add_ons": it.get("add_ons") or "",
-                    "name": it.get("name")
-                })
+        # Tambahkan item ke station ini
+        station_data[station]["items"].append({
+            "resto_menu": row.resto_menu,
+            "short_name": row.short_name or "",
+            "item_name": row.item_name or "",
+            "qty": row.qty or 0,
+            "quick_notes": row.quick_notes or "",
+            "add_ons": row.add_ons or "",
+            "name": row.name,
+            "printer_name": row.printer_name
+        })
 
     # Bangun hasil akhir berdasarkan printing_type
     result = []
@@ -773,10 +921,38 @@ def get_branch_menu_for_kitchen_printing(pos_name: str):
     result.sort(key=lambda x: (x["kitchen_station"] or "", len(x["items"])))
     return result
 
+def _get_table_orders_by_parent(table_names):
+    """Satu query Table Order untuk banyak meja -> {parent: [{"invoice_name": ...}]} urut idx."""
+    orders = {name: [] for name in table_names}
+    if not table_names:
+        return orders
+
+    rows = frappe.db.sql("""
+        SELECT parent, invoice_name
+        FROM `tabTable Order`
+        WHERE parenttype = 'Table' AND parentfield = 'orders' AND parent IN %(tables)s
+        ORDER BY parent, idx
+    """, {"tables": list(table_names)}, as_dict=True)
+
+    for row in rows:
+        orders[row.parent].append({"invoice_name": row.invoice_name})
+    return orders
+
 @frappe.whitelist(allow_guest=True)
-def get_all_tables_with_details():
+def get_all_tables_with_details(floor=None, zone=None):
+    """
+    Denah meja + invoice aktif. Opsional difilter per floor / zone.
+    Selalu dua query (Table + Table Order), berapapun jumlah meja.
+    """
+    filters = {}
+    if floor:
+        filters["floor"] = floor
+    if zone:
+        filters["zone"] = zone
+
     tables = frappe.get_all(
         "Table",
+        filters=filters,
         fields=[
             "name",
             "table_name",
@@ -794,9 +970,10 @@ def get_all_tables_with_details():
         order_by="table_name asc"
     )
 
+    orders_by_table = _get_table_orders_by_parent([t.name for t in tables])
+
     result = []
     for t in tables:
-        doc = frappe.get_doc("Table", t.name)
         result.append({
             "id": t.name,
             "name": t.table_name,
@@ -810,9 +987,7 @@ def get_all_tables_with_details():
             "takenBy": t.taken_by or None,
             "checked": t.checked,
             # "order": t.order or None,
-            "orders": [
-                {"invoice_name": o.invoice_name} for o in doc.orders
-            ],
+            "orders": orders_by_table[t.name],
         })
 
     return result
@@ -1809,9 +1984,7 @@ def print_void_item(pos_invoice: str):
     """
     Print semua item VOID MENU yang belum dicetak
     """
-    import cups
-    from .printing import build_void_item_receipt, cups_print_raw
-    import tempfile
+    from .printing import build_void_item_receipt, cups_print_raw, flag_items
     invoice = frappe.get_doc("POS Invoice", pos_invoice)
     items_to_print = [
         {
@@ -1837,9 +2010,8 @@ def print_void_item(pos_invoice: str):
 
     print_void_to_other_station(pos_invoice, items_to_print, invoice.branch)
 
-    # Update status is_print_kitchen
-    for it in items_to_print:
-        frappe.db.set_value("POS Invoice Item", it["name"], "is_void_printed", 1)
+    # Update status is_void_printed
+    flag_items([it["name"] for it in items_to_print], "is_void_printed")
     frappe.db.commit()
 
     frappe.logger("pos_print").info({"invoice": pos_invoice, "printer": printer_name, "job_id": job_id, "items_printed": len(items_to_print)})
@@ -1848,12 +2020,12 @@ def print_void_item(pos_invoice: str):
 
 
 def print_void_to_other_station(pos_invoice, items_to_print, branch):
-    import cups
     from .printing import build_void_item_receipt, cups_print_raw
-    import tempfile
+    from resto.kitchen_routing import get_printers_for_sell_item
+
+    branch = branch or frappe.db.get_value("POS Invoice", pos_invoice, "branch")
 
     for item in items_to_print:
-        branch_menu = frappe.get_doc("Branch Menu", {"branch": branch, "sell_item": item['item_code']})
-        for printer in branch_menu.printers:
+        for printer in get_printers_for_sell_item(item['item_code'], branch):
             raw = build_void_item_receipt(pos_invoice, items_to_print)
-            cups_print_raw(raw, printer.printer_name)
\ No newline at end of file
+            cups_print_raw(raw, printer["printer_name"])
\ No newline at end of file
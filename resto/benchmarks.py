@@ -0,0 +1,417 @@
+"""
+Benchmark manual untuk jalur panas POS.
+
+Jalankan dari bench, contoh:
+    bench --site <site> execute resto.benchmarks.bench_branch_menu_catalog
+
+Data sintetis dibuat lewat frappe.db.bulk_insert di dalam transaksi
+dan selalu di-rollback di akhir, jadi aman dijalankan di site staging.
+"""
+import time
+from contextlib import contextmanager
+
+import frappe
+from frappe.utils import now
+
+
+@contextmanager
+def count_calls():
+    """Hitung jumlah frappe.get_doc dan frappe.db.sql selama blok berjalan."""
+    stats = {"get_doc": 0, "sql": 0}
+    orig_get_doc = frappe.get_doc
+    orig_sql = frappe.db.sql
+
+    def get_doc(*args, **kwargs):
+        stats["get_doc"] += 1
+        return orig_get_doc(*args, **kwargs)
+
+    def sql(*args, **kwargs):
+        stats["sql"] += 1
+        return orig_sql(*args, **kwargs)
+
+    frappe.get_doc = get_doc
+    frappe.db.sql = sql
+    try:
+        yield stats
+    finally:
+        frappe.get_doc = orig_get_doc
+        frappe.db.sql = orig_sql
+
+
+def _measure(fn, repeat=3, **kwargs):
+    """Jalankan fn beberapa kali, kembalikan waktu terbaik (ms) + hitungan call."""
+    best = None
+    stats = None
+    for _ in range(repeat):
+        with count_calls() as calls:
+            start = time.perf_counter()
+            fn(**kwargs)
+            elapsed = (time.perf_counter() - start) * 1000
+        if best is None or elapsed < best:
+            best, stats = elapsed, dict(calls)
+    return {"ms": round(best, 2), **stats}
+
+
+def _print_table(title, rows):
+    print(title)
+    for row in rows:
+        print("  " + "  ".join(f"{k}={v}" for k, v in row.items()))
+
+
+def _std_fields(name, ts):
+    return [name, ts, ts, "Administrator", "Administrator"]
+
+
+STD_COLUMNS = ["name", "creation", "modified", "owner", "modified_by"]
+
+
+# =====================================================
+# BRANCH MENU CATALOG
+# =====================================================
+def _seed_branch_menus(count, printers_per_menu=2, add_ons_per_menu=3):
+    branch = f"BENCH-{frappe.generate_hash(length=6)}"
+    ts = now()
+
+    menus, branch_menus, printers, add_ons = [], [], [], []
+    for i in range(count):
+        rm = f"{branch}-RM{i:05d}"
+        bm = f"{branch}-{rm}"
+        menus.append(_std_fields(rm, ts) + [f"Menu {i}", f"RM{i:05d}", 1])
+        branch_menus.append(_std_fields(bm, ts) + [branch, rm, 1, 10000 + i])
+
+        for p in range(printers_per_menu):
+            printers.append(
+                _std_fields(f"{bm}-P{p}", ts)
+                + [bm, "Branch Menu", "printers", p + 1, f"Station {p}", f"PRN-{p}", "Combine"]
+            )
+        for a in range(add_ons_per_menu):
+            add_ons.append(
+                _std_fields(f"{bm}-A{a}", ts)
+                + [bm, "Branch Menu", "add_ons", a + 1, f"Add On {a}", 1000 * a]
+            )
+
+    frappe.db.bulk_insert(
+        "Resto Menu", STD_COLUMNS + ["title", "menu_code", "enabled"], menus
+    )
+    frappe.db.bulk_insert(
+        "Branch Menu", STD_COLUMNS + ["branch", "menu_item", "enabled", "rate"], branch_menus
+    )
+    frappe.db.bulk_insert(
+        "Branch Kitchen Station",
+        STD_COLUMNS + ["parent", "parenttype", "parentfield", "idx",
+                       "kitchen_station", "printer_name", "printing_type"],
+        printers
+    )
+    frappe.db.bulk_insert(
+        "Menu Add Ons",
+        STD_COLUMNS + ["parent", "parenttype", "parentfield", "idx", "item_name", "price"],
+        add_ons
+    )
+
+    return branch
+
+
+def _legacy_branch_menu_catalog(branch):
+    """Implementasi lama: satu frappe.get_doc per Branch Menu (baseline)."""
+    branch_menus = frappe.get_all(
+        "Branch Menu",
+        filters={"enabled": 1, "branch": branch},
+        fields=["name", "menu_item", "rate"],
+        limit_page_length=0
+    )
+    menu_items = [bm.menu_item for bm in branch_menus if bm.menu_item]
+    resto_menus = {
+        rm.name: rm
+        for rm in frappe.get_all("Resto Menu", filters={"name": ["in", menu_items]}, fields=["name", "title"])
+    }
+    frappe.get_all(
+        "File",
+        filters={"attached_to_doctype": "Resto Menu", "attached_to_name": ["in", menu_items]},
+        fields=["attached_to_name", "file_url"]
+    )
+
+    result = []
+    for bm in branch_menus:
+        if bm.menu_item not in resto_menus:
+            continue
+        result.append(frappe.get_doc("Branch Menu", bm.name).as_dict())
+    return result
+
+
+def bench_branch_menu_catalog(sizes=(100, 500, 2000)):
+    """
+    Bandingkan jumlah document load, query dan latency
+    get_all_branch_menu_with_children lama vs build_branch_menu_catalog.
+    """
+    from resto.menu_catalog import build_branch_menu_catalog
+
+    if isinstance(sizes, str):
+        sizes = [int(s) for s in sizes.split(",")]
+
+    rows = []
+    try:
+        for size in sizes:
+            branch = _seed_branch_menus(int(size))
+
+            legacy = _measure(_legacy_branch_menu_catalog, branch=branch)
+            bulk = _measure(build_branch_menu_catalog, branch=branch)
+
+            rows.append({
+                "menus": size,
+                "legacy_ms": legacy["ms"],
+                "legacy_get_doc": legacy["get_doc"],
+                "legacy_sql": legacy["sql"],
+                "bulk_ms": bulk["ms"],
+                "bulk_get_doc": bulk["get_doc"],
+                "bulk_sql": bulk["sql"],
+            })
+    finally:
+        frappe.db.rollback()
+
+    _print_table("Branch Menu catalog", rows)
+    return rows
+
+
+# =====================================================
+# KITCHEN ROUTING
+# =====================================================
+def _seed_pos_invoice(branch, lines):
+    """POS Invoice sintetis dengan `lines` item yang menunjuk ke menu hasil _seed_branch_menus."""
+    ts = now()
+    invoice = f"{branch}-INV"
+
+    frappe.db.bulk_insert(
+        "POS Invoice",
+        STD_COLUMNS + ["branch", "docstatus", "posting_date"],
+        [_std_fields(invoice, ts) + [branch, 0, ts[:10]]]
+    )
+    frappe.db.bulk_insert(
+        "POS Invoice Item",
+        STD_COLUMNS + ["parent", "parenttype", "parentfield", "idx",
+                       "item_code", "item_name", "qty", "resto_menu"],
+        [
+            _std_fields(f"{invoice}-I{i:03d}", ts)
+            + [invoice, "POS Invoice", "items", i + 1,
+               f"RM{i:05d}", f"Menu {i}", 1, f"{branch}-RM{i:05d}"]
+            for i in range(lines)
+        ]
+    )
+
+    return invoice
+
+
+def _legacy_kitchen_routing(pos_name):
+    """Implementasi lama: get_value short_name + get_all Branch Menu + get_doc per item."""
+    branch = frappe.db.get_value("POS Invoice", pos_name, "branch")
+    pos_items = frappe.get_all(
+        "POS Invoice Item",
+        filters={"parent": pos_name},
+        fields=["name", "resto_menu", "item_name", "qty", "quick_notes", "add_ons"]
+    )
+
+    station_data = {}
+    for it in pos_items:
+        resto_menu = it.get("resto_menu")
+        short_name = frappe.db.get_value("Resto Menu", resto_menu, "short_name") or ""
+        for bm in frappe.get_all("Branch Menu", filters={"menu_item": resto_menu, "branch": branch}, fields=["name"]):
+            for printer_entry in frappe.get_doc("Branch Menu", bm.name).printers or []:
+                station_data.setdefault(printer_entry.kitchen_station, []).append({
+                    "name": it.name, "short_name": short_name
+                })
+    return station_data
+
+
+def bench_kitchen_routing(lines=50):
+    """Routing tiket kitchen untuk satu invoice `lines` baris: lama vs satu query join."""
+    from resto.api import get_branch_menu_for_kitchen_printing
+
+    lines = int(lines)
+    try:
+        branch = _seed_branch_menus(lines)
+        invoice = _seed_pos_invoice(branch, lines)
+
+        legacy = _measure(_legacy_kitchen_routing, pos_name=invoice)
+        joined = _measure(get_branch_menu_for_kitchen_printing, pos_name=invoice)
+    finally:
+        frappe.db.rollback()
+
+    rows = [
+        {"path": "legacy", "lines": lines, **legacy},
+        {"path": "joined", "lines": lines, **joined},
+    ]
+    _print_table("Kitchen routing", rows)
+    return rows
+
+
+# =====================================================
+# ESC/POS BUILDER
+# =====================================================
+def _bill_lines(lines):
+    return [
+        {"name": f"Menu {i:03d}", "qty": 1 + i % 3, "rate": 25000 + 500 * i, "add_ons": "Extra Keju (5000)"}
+        for i in range(lines)
+    ]
+
+
+def _legacy_bill_bytes(items):
+    """Pola lama: out += bytes (immutable) per baris."""
+    from resto.printing import (
+        LINE_WIDTH, _esc_align_center, _esc_align_left, _esc_bold, _esc_cut_full,
+        _esc_feed, _esc_font_a, _esc_init, _format_line, format_number
+    )
+
+    out = b""
+    out += _esc_init()
+    out += _esc_font_a()
+    out += _esc_align_center() + _esc_bold(True)
+    out += ("BENCH RESTO\n").encode("ascii", "ignore")
+    out += _esc_bold(False)
+    out += _esc_align_left()
+    out += ("-" * LINE_WIDTH + "\n").encode("ascii", "ignore")
+    total = 0
+    for item in items:
+        amount = item["qty"] * item["rate"]
+        total += amount
+        out += (item["name"] + "\n").encode("utf-8")
+        line = f"{item['qty']}x @{format_number(item['rate'])}".ljust(LINE_WIDTH - 12) + format_number(amount).rjust(12)
+        out += (line + "\n").encode("ascii", "ignore")
+        out += (f"  {item['add_ons']}\n").encode("utf-8")
+    out += ("-" * LINE_WIDTH + "\n").encode("ascii", "ignore")
+    out += _esc_bold(True)
+    out += (_format_line("Total:", format_number(total)) + "\n").encode("ascii", "ignore")
+    out += _esc_bold(False)
+    out += _esc_feed(8) + _esc_cut_full()
+    return out
+
+
+def _writer_bill_bytes(items):
+    """Pola baru: EscPosWriter (bytearray)."""
+    from resto.printing import LINE_WIDTH, EscPosWriter, format_number
+
+    out = EscPosWriter()
+    out.init()
+    out.font_a()
+    out.align("center").bold(True)
+    out.line("BENCH RESTO")
+    out.bold(False)
+    out.align("left")
+    out.separator()
+    total = 0
+    for item in items:
+        amount = item["qty"] * item["rate"]
+        total += amount
+        out.line(item["name"], "utf-8")
+        out.line(f"{item['qty']}x @{format_number(item['rate'])}".ljust(LINE_WIDTH - 12) + format_number(amount).rjust(12))
+        out.line(f"  {item['add_ons']}", "utf-8")
+    out.separator()
+    out.bold(True)
+    out.lr("Total:", format_number(total))
+    out.bold(False)
+    out.feed(8).cut()
+    return out.getvalue()
+
+
+def bench_escpos_writer(lines=100, repeat=200):
+    """Waktu build bill `lines` baris: bytes += vs EscPosWriter (tanpa database)."""
+    lines, repeat = int(lines), int(repeat)
+    items = _bill_lines(lines)
+
+    if _legacy_bill_bytes(items) != _writer_bill_bytes(items):
+        frappe.throw("Output EscPosWriter berbeda dengan builder lama")
+
+    rows = []
+    for path, fn in (("bytes_concat", _legacy_bill_bytes), ("escpos_writer", _writer_bill_bytes)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn(items)
+        elapsed = (time.perf_counter() - start) * 1000 / repeat
+        rows.append({"path": path, "lines": lines, "ms_per_bill": round(elapsed, 3)})
+
+    _print_table("ESC/POS bill builder", rows)
+    return rows
+
+
+# =====================================================
+# INVOICE PRINT CONTEXT
+# =====================================================
+def _build_bill_and_checker(name):
+    from resto.print_context import clear_invoice_print_context
+    from resto.printing import build_escpos_bill, build_escpos_checker
+
+    clear_invoice_print_context()
+    build_escpos_bill(name)
+    build_escpos_checker(name)
+
+
+def bench_invoice_print_context(sizes=(5, 20, 50)):
+    """Bill + checker satu invoice: jumlah query harus tetap, tidak naik per baris item."""
+    rows = []
+    try:
+        for lines in sizes:
+            lines = int(lines)
+            branch = _seed_branch_menus(lines)
+            invoice = _seed_pos_invoice(branch, lines)
+            rows.append({"lines": lines, **_measure(_build_bill_and_checker, name=invoice)})
+    finally:
+        frappe.db.rollback()
+
+    _print_table("Invoice print context (bill + checker)", rows)
+    return rows
+
+
+# =====================================================
+# SEND TO KITCHEN
+# =====================================================
+def _send_to_kitchen_payload(pos_profile, customer, item_codes, lines):
+    profile = frappe.get_cached_doc("POS Profile", pos_profile)
+    return {
+        "customer": customer or profile.customer,
+        "pos_profile": pos_profile,
+        "branch": profile.get("branch"),
+        "order_type": "Take Away",
+        "items": [
+            {
+                "item_code": item_codes[i % len(item_codes)],
+                "qty": 1,
+                "status_kitchen": "Already Send To Kitchen",
+                "quick_notes": f"bench {i}",
+            }
+            for i in range(lines)
+        ],
+    }
+
+
+def bench_send_to_kitchen(pos_profile, customer=None, table_name=None, sizes=(5, 20, 50)):
+    """
+    Latency end-to-end send_to_kitchen (buat invoice + update meja + antri
+    tiket kitchen) untuk order 5 / 20 / 50 baris, seperti yang dirasakan waiter.
+
+    Butuh POS Profile yang valid di site (item diambil dari Item penjualan yang
+    aktif). Memakai _send_to_kitchen supaya semua bisa di-rollback; satu commit
+    di akhir request asli tidak ikut terukur.
+    """
+    from resto.api import _send_to_kitchen
+
+    item_codes = frappe.get_all(
+        "Item",
+        filters={"is_sales_item": 1, "disabled": 0, "has_variants": 0, "is_stock_item": 0},
+        pluck="name",
+        limit=max(int(s) for s in sizes)
+    )
+    if not item_codes:
+        frappe.throw("Tidak ada Item penjualan non-stock untuk benchmark")
+
+    rows = []
+    try:
+        for lines in sizes:
+            lines = int(lines)
+            payload = _send_to_kitchen_payload(pos_profile, customer, item_codes, lines)
+            rows.append({
+                "lines": lines,
+                **_measure(_send_to_kitchen, payload=payload, table_name=table_name),
+            })
+    finally:
+        frappe.db.rollback()
+
+    _print_table("send_to_kitchen (tanpa commit)", rows)
+    return rows
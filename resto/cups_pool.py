@@ -0,0 +1,198 @@
+"""
+Koneksi CUPS yang dipakai ulang per worker.
+
+Membuka cups.Connection() + getPrinters() di setiap tiket memakan puluhan ms
+di server CUPS yang sibuk. Manager ini menyimpan satu koneksi per thread
+(pycups tidak thread-safe), menyimpan daftar printer dengan TTL pendek, dan
+membuka koneksi baru sekali saat panggilan gagal karena koneksi putus.
+
+Di test, ganti factory dengan stand-in:
+    set_connection_factory(lambda: FakeCups())
+"""
+import os
+import tempfile
+import threading
+import time
+
+import frappe
+
+from resto.print_metrics import timed
+
+PRINTER_LIST_TTL = 30   # detik
+CUPS_FORMAT_RAW = "application/vnd.cups-raw"
+CUPS_FORMAT_PDF = "application/pdf"
+
+
+def _default_factory():
+    import cups
+    return cups.Connection()
+
+
+def _reconnect_errors():
+    """Error yang berarti koneksi rusak (bukan error IPP dari printer/job)."""
+    try:
+        import cups
+        return (cups.HTTPError, RuntimeError, OSError)
+    except ImportError:
+        return (RuntimeError, OSError)
+
+
+class CupsConnectionManager:
+    def __init__(self, connection_factory=None, printer_ttl=PRINTER_LIST_TTL, clock=time.monotonic):
+        self.connection_factory = connection_factory or _default_factory
+        self.printer_ttl = printer_ttl
+        self.clock = clock
+        self._local = threading.local()
+        self._printers = None
+        self._printers_at = 0.0
+        self._lock = threading.Lock()
+        self.streaming = True
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self.connection_factory()
+            self._local.conn = conn
+        return conn
+
+    def reset(self):
+        """Buang koneksi thread ini dan cache daftar printer."""
+        self._local.conn = None
+        with self._lock:
+            self._printers = None
+
+    def call(self, fn):
+        """
+        Jalankan fn(conn). Kalau gagal karena koneksi, buka koneksi baru
+        dan ulangi sekali.
+        """
+        try:
+            return fn(self.connection())
+        except _reconnect_errors():
+            frappe.logger("pos_print").warning("Koneksi CUPS gagal, membuka koneksi baru")
+            self.reset()
+            return fn(self.connection())
+
+    def get_printers(self, refresh=False):
+        with self._lock:
+            fresh = (
+                self._printers is not None
+                and self.clock() - self._printers_at < self.printer_ttl
+            )
+            if fresh and not refresh:
+                return self._printers
+
+        printers = self.call(lambda conn: conn.getPrinters())
+        with self._lock:
+            self._printers = printers
+            self._printers_at = self.clock()
+        return printers
+
+    def ensure_printer(self, printer_name):
+        """
+        Validasi nama printer dari cache. Printer yang baru ditambahkan di
+        CUPS dicek ulang langsung ke server sebelum dinyatakan tidak ada.
+        """
+        if printer_name in self.get_printers():
+            return
+        if printer_name in self.get_printers(refresh=True):
+            return
+        raise frappe.ValidationError(f"Printer '{printer_name}' tidak ditemukan di CUPS")
+
+    def get_default_printer(self):
+        """Printer default CUPS, atau printer pertama bila tidak ada default."""
+        printer_name = self.call(lambda conn: conn.getDefault())
+        if not printer_name:
+            printers = self.get_printers()
+            printer_name = list(printers.keys())[0] if printers else None
+        return printer_name
+
+    def get_jobs(self, first_job_id, limit, attributes=None):
+        """Atribut job mulai first_job_id (termasuk yang sudah selesai) dalam satu panggilan IPP."""
+        return self.call(lambda conn: conn.getJobs(
+            which_jobs="all",
+            my_jobs=False,
+            limit=limit,
+            first_job_id=first_job_id,
+            requested_attributes=attributes,
+        ))
+
+    def print_file(self, printer_name, path, title, options=None):
+        return self.call(lambda conn: conn.printFile(printer_name, path, title, options or {}))
+
+    @timed("submit", printer=lambda args: args["printer_name"])
+    def print_bytes(self, printer_name, data, title, options=None, document_format=CUPS_FORMAT_RAW):
+        """
+        Kirim bytes langsung sebagai satu job CUPS tanpa file di disk
+        (createJob / startDocument / writeRequestData / finishDocument).
+        Kalau pycups/server tidak mendukung streaming, jatuh ke temp file
+        yang selalu dihapus setelah dikirim.
+        """
+        from resto.printer_health import track_job
+
+        job_id = self._submit_bytes(printer_name, data, title, options or {}, document_format)
+        # Status job dipantau resto.printer_health
+        track_job(printer_name, job_id)
+        return job_id
+
+    def _submit_bytes(self, printer_name, data, title, options, document_format):
+        if self.streaming:
+            try:
+                return self.call(
+                    lambda conn: _stream_job(conn, printer_name, data, title, options, document_format)
+                )
+            except AttributeError:
+                # pycups lama tanpa API streaming, jangan dicoba lagi di worker ini
+                self.streaming = False
+            except Exception:
+                frappe.logger("pos_print").warning(
+                    f"Streaming job CUPS ke {printer_name} gagal, pakai temp file"
+                )
+
+        return self._print_via_tempfile(printer_name, data, title, options)
+
+    def _print_via_tempfile(self, printer_name, data, title, options):
+        with tempfile.NamedTemporaryFile(delete=False) as tmp:
+            tmp.write(data)
+            tmp_path = tmp.name
+        try:
+            return self.print_file(printer_name, tmp_path, title, options)
+        finally:
+            # printFile sudah mengirim isi file ke server saat return
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+
+def _stream_job(conn, printer_name, data, title, options, document_format):
+    job_id = conn.createJob(printer_name, title, options)
+    try:
+        conn.startDocument(printer_name, job_id, title, document_format, 1)
+        conn.writeRequestData(data, len(data))
+        conn.finishDocument(printer_name)
+    except Exception:
+        # Jangan tinggalkan job setengah jadi sebelum fallback / retry
+        try:
+            conn.cancelJob(job_id)
+        except Exception:
+            pass
+        raise
+    return job_id
+
+
+_manager = None
+
+
+def get_cups():
+    global _manager
+    if _manager is None:
+        _manager = CupsConnectionManager()
+    return _manager
+
+
+def set_connection_factory(factory=None, printer_ttl=PRINTER_LIST_TTL):
+    """Pasang manager baru (mis. dengan fake CUPS di test). None = pycups asli."""
+    global _manager
+    _manager = CupsConnectionManager(factory, printer_ttl=printer_ttl)
+    return _manager
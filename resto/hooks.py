@@ -145,8 +145,64 @@ doc_events = {
             "resto.events.pos_invoice.exclude_void_items_from_total",
             "resto.events.pos_invoice.handle_kitchen_stock"
         ],
-        "on_submit": "resto.events.pos_invoice.lock_void_value_after_submit",
-        "on_cancel": "resto.events.pos_invoice.rollback_kitchen_stock_on_cancel"
+        "on_update": "resto.print_context.clear_invoice_print_context",
+        "on_submit": [
+            "resto.events.pos_invoice.lock_void_value_after_submit",
+            "resto.print_context.clear_invoice_print_context"
+        ],
+        "on_cancel": [
+            "resto.events.pos_invoice.rollback_kitchen_stock_on_cancel",
+            "resto.print_context.clear_invoice_print_context"
+        ]
+    },
+    "Resto Menu": {
+        "on_update": "resto.menu_catalog.invalidate_menu_catalog",
+        "after_rename": "resto.menu_catalog.invalidate_menu_catalog",
+        "on_trash": "resto.menu_catalog.invalidate_menu_catalog"
+    },
+    "Branch Menu": {
+        "on_update": [
+            "resto.menu_catalog.invalidate_menu_catalog",
+            "resto.kitchen_routing.invalidate_kitchen_routing"
+        ],
+        "after_rename": [
+            "resto.menu_catalog.invalidate_menu_catalog",
+            "resto.kitchen_routing.invalidate_kitchen_routing"
+        ],
+        "on_trash": [
+            "resto.menu_catalog.invalidate_menu_catalog",
+            "resto.kitchen_routing.invalidate_kitchen_routing"
+        ]
+    },
+    "Address": {
+        "on_update": "resto.printing.invalidate_print_header",
+        "on_trash": "resto.printing.invalidate_print_header"
+    },
+    "Branch": {
+        "on_update": "resto.printing.invalidate_print_header",
+        "after_rename": "resto.printing.invalidate_print_header",
+        "on_trash": "resto.printing.invalidate_print_header"
+    },
+    "Company": {
+        "on_update": "resto.printing.invalidate_print_header",
+        "after_rename": "resto.printing.invalidate_print_header",
+        "on_trash": "resto.printing.invalidate_print_header"
+    },
+    "Table": {
+        "on_update": [
+            "resto.table_feed.on_table_change",
+            "resto.table_lookup.invalidate_invoice_tables_for_table"
+        ],
+        "on_trash": [
+            "resto.table_feed.on_table_change",
+            "resto.table_lookup.invalidate_invoice_tables_for_table"
+        ],
+        "after_rename": "resto.table_lookup.invalidate_invoice_tables_for_table"
+    },
+    "File": {
+        "after_insert": "resto.menu_catalog.invalidate_menu_catalog_for_file",
+        "on_update": "resto.menu_catalog.invalidate_menu_catalog_for_file",
+        "on_trash": "resto.menu_catalog.invalidate_menu_catalog_for_file"
     }
 }
 
@@ -160,6 +216,15 @@ scheduler_events = {
 	"daily": [
 		"resto.resto_sopwer.doctype.resto_menu.resto_menu.reset_daily_resto_stock"
 	],
+	"cron": {
+		"*/5 * * * *": [
+			"resto.resto_sopwer.doctype.resto_menu.resto_menu.reset_branch_stock_on_opening"
+		],
+		"* * * * *": [
+			"resto.print_spooler.requeue_due_jobs",
+			"resto.printer_health.poll_printer_jobs"
+		]
+	},
 	# "hourly": [
 	# 	"resto.tasks.hourly"
 	# ],
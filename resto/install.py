@@ -410,5 +410,38 @@ def after_migrate():
                 "options": "Sales Taxes and Charges Template",
                 "insert_after": "taxes_and_charges"
             }).insert(ignore_permissions=True)
+
+        if not frappe.db.exists("Custom Field", {"dt": "Branch", "fieldname": "stock_reset_time"}):
+            frappe.get_doc({
+                "doctype": "Custom Field",
+                "dt": "Branch",
+                "fieldname": "stock_reset_time",
+                "label": "Stock Reset Time",
+                "fieldtype": "Time",
+                "insert_after": "phone",
+                "description": "Jam buka lokal cabang. Jika diisi, stok harian Resto Menu cabang ini direset pada jam ini, bukan di jadwal harian global."
+            }).insert(ignore_permissions=True)
+
+        if not frappe.db.exists("Custom Field", {"dt": "Branch", "fieldname": "stock_reset_time_zone"}):
+            frappe.get_doc({
+                "doctype": "Custom Field",
+                "dt": "Branch",
+                "fieldname": "stock_reset_time_zone",
+                "label": "Stock Reset Time Zone",
+                "fieldtype": "Data",
+                "insert_after": "stock_reset_time",
+                "description": "Contoh: Asia/Jakarta, Asia/Makassar. Kosong = time zone sistem."
+            }).insert(ignore_permissions=True)
+
+        if not frappe.db.exists("Custom Field", {"dt": "Branch", "fieldname": "last_stock_reset"}):
+            frappe.get_doc({
+                "doctype": "Custom Field",
+                "dt": "Branch",
+                "fieldname": "last_stock_reset",
+                "label": "Last Stock Reset",
+                "fieldtype": "Date",
+                "read_only": 1,
+                "insert_after": "stock_reset_time_zone"
+            }).insert(ignore_permissions=True)
             
     add_custom_field()
\ No newline at end of file
@@ -0,0 +1,135 @@
+"""
+Tabel routing kitchen per branch: resto_menu / sell_item -> printer station.
+
+Routing berubah jarang (saat Branch Menu disimpan), tapi dibaca di setiap
+send to kitchen, print void dan print ulang invoice. Tabel dibangun dengan
+satu query, disimpan di Redis, dan disalin ke memori proses. Salinan memori
+divalidasi dengan versi kecil di Redis supaya semua worker ikut ter-invalidate.
+"""
+import time
+
+import frappe
+
+ROUTING_CACHE_KEY = "resto_kitchen_routing"
+ROUTING_VERSION_KEY = "resto_kitchen_routing_version"
+ROUTING_MAX_AGE = 60 * 60   # batas aman: tabel dibangun ulang paling lambat tiap jam
+
+# (site, branch) -> tabel routing
+_local_tables = {}
+
+
+def _branch_key(branch):
+    return branch or "__all__"
+
+
+def _build_routing_table(branch=None):
+    conditions = ["IFNULL(bks.printer_name, '') != ''"]
+    params = {}
+    if branch:
+        conditions.append("bm.branch = %(branch)s")
+        params["branch"] = branch
+
+    rows = frappe.db.sql(f"""
+        SELECT
+            bm.name AS branch_menu,
+            bm.branch,
+            bm.menu_item,
+            bm.sell_item,
+            bks.kitchen_station,
+            bks.printer_name,
+            IFNULL(NULLIF(bks.printing_type, ''), 'Combine') AS printing_type
+        FROM `tabBranch Menu` bm
+        JOIN `tabBranch Kitchen Station` bks
+            ON bks.parent = bm.name
+            AND bks.parenttype = 'Branch Menu'
+            AND bks.parentfield = 'printers'
+        WHERE {" AND ".join(conditions)}
+        ORDER BY bm.name, bks.idx
+    """, params, as_dict=True)
+
+    by_menu, by_sell_item = {}, {}
+    # (branch, sell_item) -> Branch Menu pertama; void dicetak ke printer satu Branch Menu saja
+    sell_item_menus = {}
+    for row in rows:
+        entry = {
+            "kitchen_station": row.kitchen_station,
+            "printer_name": row.printer_name,
+            "printing_type": row.printing_type
+        }
+        if row.menu_item:
+            by_menu.setdefault(row.menu_item, []).append(entry)
+        if row.sell_item:
+            owner = sell_item_menus.setdefault((row.branch, row.sell_item), row.branch_menu)
+            if owner == row.branch_menu:
+                by_sell_item.setdefault(row.branch, {}).setdefault(row.sell_item, []).append(entry)
+
+    return {
+        "version": frappe.generate_hash(length=10),
+        "built_at": time.time(),
+        "by_menu": by_menu,
+        "by_sell_item": by_sell_item
+    }
+
+
+def get_routing_table(branch=None):
+    """Tabel routing untuk branch (None = semua branch)."""
+    key = _branch_key(branch)
+    local_key = (frappe.local.site, key)
+    cache = frappe.cache()
+
+    version = cache.hget(ROUTING_VERSION_KEY, key)
+    local = _local_tables.get(local_key)
+    if version and local and local["version"] == version:
+        return local
+
+    table = cache.hget(ROUTING_CACHE_KEY, key) if version else None
+    if (
+        not table
+        or table["version"] != version
+        or time.time() - table["built_at"] > ROUTING_MAX_AGE
+    ):
+        table = _build_routing_table(branch)
+        cache.hset(ROUTING_CACHE_KEY, key, table)
+        cache.hset(ROUTING_VERSION_KEY, key, table["version"])
+
+    _local_tables[local_key] = table
+    return table
+
+
+def get_menu_printers(branch, resto_menu):
+    """List entry {kitchen_station, printer_name, printing_type} untuk satu Resto Menu."""
+    if not resto_menu:
+        return []
+    return get_routing_table(branch)["by_menu"].get(resto_menu, [])
+
+
+def get_printers_for_sell_item(sell_item, branch):
+    """
+    Printer station Branch Menu untuk sell_item di satu branch. Tanpa branch
+    tidak ada routing: printer branch lain tidak boleh ikut mencetak.
+    """
+    if not sell_item or not branch:
+        return []
+    return get_routing_table(branch)["by_sell_item"].get(branch, {}).get(sell_item, [])
+
+
+def invalidate_kitchen_routing(doc=None, method=None, *args, **kwargs):
+    """
+    doc_events Branch Menu: drop tabel branch terkait + tabel gabungan setelah commit.
+    Branch Menu yang pindah branch juga men-drop tabel branch lamanya.
+    """
+    branches = [None]
+    if doc:
+        branches.append(doc.get("branch"))
+        before = doc.get_doc_before_save()
+        if before:
+            branches.append(before.get("branch"))
+    keys = list(dict.fromkeys(_branch_key(b) for b in branches))
+
+    def _flush():
+        cache = frappe.cache()
+        for key in keys:
+            cache.hdel(ROUTING_VERSION_KEY, key)
+            cache.hdel(ROUTING_CACHE_KEY, key)
+
+    frappe.db.after_commit.add(_flush)
@@ -0,0 +1,281 @@
+import hashlib
+
+import frappe
+from frappe.utils import cint, flt
+
+
+RESTO_MENU_CATALOG_FIELDS = [
+    "name",
+    "title",
+    "menu_category",
+    "sell_item",
+    "use_stock",
+    "description"
+]
+
+# Stok berubah tiap penjualan dan sudah dikirim lewat mirror Redis + realtime
+# (resto_menu.publish_resto_menu_stock), jadi tidak ikut snapshot / hash versi.
+STOCK_FIELDS = ("stock_limit", "stock_used", "is_sold_out")
+
+INT_FIELDTYPES = ("Check", "Int")
+FLOAT_FIELDTYPES = ("Currency", "Float", "Percent")
+
+
+def _row_as_doc_dict(meta, row):
+    """
+    Samakan hasil baris get_all dengan Document.as_dict():
+    tambah key doctype dan cast Check/Int/Currency seperti sanitize bawaan.
+    """
+    d = frappe._dict(row)
+    d["doctype"] = meta.name
+
+    for df in meta.fields:
+        if df.fieldname not in d:
+            continue
+        if df.fieldtype in INT_FIELDTYPES:
+            d[df.fieldname] = cint(d[df.fieldname])
+        elif df.fieldtype in FLOAT_FIELDTYPES and d[df.fieldname] is not None:
+            d[df.fieldname] = flt(d[df.fieldname])
+
+    return d
+
+
+def _get_child_rows(parent_doctype, table_field, parent_names):
+    """Ambil semua baris satu child table untuk banyak parent sekaligus."""
+    child_meta = frappe.get_meta(table_field.options)
+
+    rows = frappe.get_all(
+        table_field.options,
+        filters={
+            "parenttype": parent_doctype,
+            "parentfield": table_field.fieldname,
+            "parent": ["in", parent_names]
+        },
+        fields=child_meta.get_valid_columns(),
+        order_by="idx asc",
+        limit_page_length=0
+    )
+
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row.parent, []).append(_row_as_doc_dict(child_meta, row))
+
+    return grouped
+
+
+def build_branch_menu_catalog(branch=None):
+    """
+    Bangun katalog Branch Menu (+ child table, Resto Menu, gambar) dengan
+    query set-based: 1 query Branch Menu, 1 query per child table,
+    1 query Resto Menu dan 1 query File. Tidak ada frappe.get_doc per baris.
+
+    Bentuk hasil sama dengan Branch Menu.as_dict() + rate/resto_menu/image.
+    """
+    filters = {"enabled": 1}
+    if branch:
+        filters["branch"] = branch
+
+    meta = frappe.get_meta("Branch Menu")
+
+    branch_menus = frappe.get_all(
+        "Branch Menu",
+        filters=filters,
+        fields=meta.get_valid_columns(),
+        limit_page_length=0
+    )
+
+    if not branch_menus:
+        return []
+
+    menu_items = list({bm.menu_item for bm in branch_menus if bm.menu_item})
+
+    resto_menus = {
+        rm.name: rm
+        for rm in frappe.get_all(
+            "Resto Menu",
+            filters={"name": ["in", menu_items]},
+            fields=RESTO_MENU_CATALOG_FIELDS,
+            limit_page_length=0
+        )
+    } if menu_items else {}
+
+    files = frappe.get_all(
+        "File",
+        filters={
+            "attached_to_doctype": "Resto Menu",
+            "attached_to_name": ["in", menu_items]
+        },
+        fields=["attached_to_name", "file_url"],
+        limit_page_length=0
+    ) if menu_items else []
+    image_map = {f.attached_to_name: f.file_url for f in files}
+
+    # Hanya Branch Menu yang Resto Menu-nya masih ada yang ikut dikirim
+    branch_menus = [bm for bm in branch_menus if bm.menu_item in resto_menus]
+    bm_names = [bm.name for bm in branch_menus]
+
+    children = {}
+    if bm_names:
+        for table_field in meta.get_table_fields():
+            children[table_field.fieldname] = _get_child_rows("Branch Menu", table_field, bm_names)
+
+    result = []
+
+    for bm in branch_menus:
+        branch_dict = _row_as_doc_dict(meta, bm)
+
+        for fieldname, grouped in children.items():
+            branch_dict[fieldname] = grouped.get(bm.name, [])
+
+        branch_dict.update({
+            "rate": bm.rate,
+            "resto_menu": resto_menus.get(bm.menu_item),
+            "image": image_map.get(bm.menu_item)
+        })
+
+        result.append(branch_dict)
+
+    return result
+
+
+
+# =====================================================
+# SNAPSHOT CACHE + VERSION (ETag / DELTA SYNC)
+# =====================================================
+CATALOG_CACHE_PREFIX = "resto:menu_catalog:"
+CATALOG_SNAPSHOT_TTL = 6 * 60 * 60      # snapshot dibangun ulang paling lambat tiap 6 jam
+CATALOG_HISTORY_TTL = 24 * 60 * 60      # hash per versi disimpan 1 hari untuk delta
+CATALOG_BUILD_LOCK_TIMEOUT = 30
+
+
+def _branch_key(branch):
+    return branch or "__all__"
+
+
+def _snapshot_key(branch):
+    return f"{CATALOG_CACHE_PREFIX}snapshot:{_branch_key(branch)}"
+
+
+def _history_key(branch, version):
+    return f"{CATALOG_CACHE_PREFIX}history:{_branch_key(branch)}:{version}"
+
+
+def _hash_json(obj):
+    return hashlib.md5(frappe.as_json(obj).encode()).hexdigest()
+
+
+def _build_snapshot(branch):
+    items = build_branch_menu_catalog(branch)
+    hashes = {item.name: _hash_json(item) for item in items}
+
+    # Versi = hash isi katalog, jadi write yang tidak mengubah isi tidak memaksa download ulang
+    version = _hash_json(sorted(hashes.items()))[:16]
+
+    snapshot = {"version": version, "items": items, "hashes": hashes}
+
+    cache = frappe.cache()
+    cache.set_value(_snapshot_key(branch), snapshot, expires_in_sec=CATALOG_SNAPSHOT_TTL)
+    cache.set_value(_history_key(branch, version), hashes, expires_in_sec=CATALOG_HISTORY_TTL)
+
+    return snapshot
+
+
+def get_catalog_snapshot(branch=None):
+    """
+    Ambil snapshot katalog per branch dari Redis.
+    Saat cache kosong hanya satu worker yang membangun ulang (redis lock),
+    worker lain menunggu lalu membaca hasil yang sama.
+    """
+    cache = frappe.cache()
+    snapshot = cache.get_value(_snapshot_key(branch))
+    if snapshot:
+        return snapshot
+
+    lock = cache.lock(
+        cache.make_key(_snapshot_key(branch) + ":lock"),
+        timeout=CATALOG_BUILD_LOCK_TIMEOUT,
+        blocking_timeout=CATALOG_BUILD_LOCK_TIMEOUT
+    )
+
+    if not lock.acquire():
+        # Lock tidak didapat dalam batas waktu, bangun sendiri daripada gagal
+        return _build_snapshot(branch)
+
+    try:
+        snapshot = cache.get_value(_snapshot_key(branch))
+        if snapshot:
+            return snapshot
+        return _build_snapshot(branch)
+    finally:
+        try:
+            lock.release()
+        except Exception:
+            pass
+
+
+def attach_stock(items):
+    """Salinan item katalog dengan stok terkini dari mirror Redis (satu HMGET)."""
+    from resto.resto_sopwer.doctype.resto_menu.resto_menu import get_stock_states
+
+    states = get_stock_states([item.menu_item for item in items])
+
+    result = []
+    for item in items:
+        item = frappe._dict(item)
+        state = states.get(item.menu_item)
+        if item.resto_menu and state:
+            item.resto_menu = frappe._dict(item.resto_menu, **{f: state[f] for f in STOCK_FIELDS})
+        result.append(item)
+    return result
+
+
+def get_catalog_delta(branch, since_version):
+    """
+    Return dict response sync untuk client yang memegang since_version:
+    not_modified, delta (changed + removed) atau full.
+    """
+    snapshot = get_catalog_snapshot(branch)
+    version = snapshot["version"]
+
+    if since_version and since_version == version:
+        return {"status": "not_modified", "version": version}
+
+    old_hashes = frappe.cache().get_value(_history_key(branch, since_version)) if since_version else None
+
+    if not old_hashes:
+        return {"status": "full", "version": version, "items": attach_stock(snapshot["items"])}
+
+    new_hashes = snapshot["hashes"]
+    changed = [
+        item for item in snapshot["items"]
+        if old_hashes.get(item.name) != new_hashes.get(item.name)
+    ]
+    removed = [name for name in old_hashes if name not in new_hashes]
+
+    return {
+        "status": "delta",
+        "version": version,
+        "base_version": since_version,
+        "changed": attach_stock(changed),
+        "removed": removed
+    }
+
+
+def invalidate_menu_catalog(doc=None, method=None, *args, **kwargs):
+    """
+    Hapus semua snapshot katalog. Dipanggil dari doc_events Resto Menu /
+    Branch Menu (perubahan child Menu Add Ons ikut tersimpan lewat parent).
+    Resto Menu dipakai banyak branch, jadi semua snapshot di-drop sekaligus;
+    client tetap dapat delta karena history hash per versi tidak ikut dihapus.
+
+    Dihapus setelah commit: kalau dihapus di dalam transaksi, request lain
+    bisa membangun ulang snapshot dari data lama dan menyimpannya 6 jam.
+    """
+    frappe.db.after_commit.add(
+        lambda: frappe.cache().delete_keys(f"{CATALOG_CACHE_PREFIX}snapshot:")
+    )
+
+
+def invalidate_menu_catalog_for_file(doc, method=None):
+    if doc.get("attached_to_doctype") == "Resto Menu":
+        invalidate_menu_catalog()
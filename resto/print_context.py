@@ -0,0 +1,280 @@
+"""
+Snapshot POS Invoice untuk semua builder tiket (bill, receipt, checker, kitchen, void).
+
+Sebelumnya tiap builder memuat ulang invoice, lalu per item query Item Price
+dan Resto Menu, plus query terpisah untuk alamat Company, nama meja, pax,
+waiter dan kasir. InvoicePrintContext memuat semua itu dengan jumlah query
+tetap (tidak tergantung jumlah item), secara lazy per bagian, dan di-memo per
+request di frappe.local supaya bill + kitchen + checker dalam satu request
+berbagi satu snapshot.
+"""
+from typing import Any, Dict
+
+import frappe
+
+STANDARD_PRICE_LIST = "Standard Selling"
+
+
+class InvoicePrintContext:
+    def __init__(self, name: str):
+        self.name = name
+        self._data = None
+        self._menus = None
+        self._tables = None
+        self._company_address = None
+        self._company_logo = None
+        self._cashier_name = None
+        self._full_names = {}
+
+    # ===== INVOICE =====
+    @property
+    def doc(self):
+        return self.data["doc"]
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        """Dict normalisasi invoice (bentuk sama dengan _collect_pos_invoice lama)."""
+        if self._data is None:
+            self._data = self._load_invoice()
+        return self._data
+
+    def _load_invoice(self) -> Dict[str, Any]:
+        doc = frappe.get_doc("POS Invoice", self.name)
+
+        doc_items = doc.get("items", [])
+        item_codes = list({it.get("item_code") for it in doc_items if it.get("item_code")})
+        prices = self._standard_prices(item_codes)
+        menus = self._load_menus(item_codes + [it.get("resto_menu") for it in doc_items])
+
+        items = []
+        for it in doc_items:
+            item_code = it.get("item_code")
+            standard_price = prices.get(item_code) or it.get("rate")
+            short_name = (menus.get(item_code) or {}).get("short_name") or it.get("item_name") or item_code
+
+            items.append({
+                "name": it.get("name"),
+                "item_code": it.get("item_code"),
+                "item_name": it.get("item_name") or it.get("item_code"),
+                "short_name": short_name,
+                "resto_menu": it.get("resto_menu"),
+                "qty": float(it.get("qty") or 0),
+                "rate": float(standard_price or 0),
+                "amount": float(it.get("amount") or 0),
+                "uom": it.get("uom") or it.get("stock_uom"),
+                "discount_percentage": float(it.get("discount_percentage") or 0),
+                "discount_amount": float(it.get("discount_amount") or 0),
+                "description": it.get("description") or "",
+                "add_ons" : it.get("add_ons") or "",
+                "quick_notes": it.get("quick_notes") or "",
+                "status_kitchen": it.get("status_kitchen") or "",
+                "is_checked": int(it.get("is_checked") or 0),
+                "is_print_kitchen": int(it.get("is_print_kitchen") or 0),
+            })
+
+        taxes = []
+        for tx in doc.get("taxes", []):
+            taxes.append({
+                "description": tx.get("description") or "Tax",
+                "amount": float(tx.get("tax_amount") or 0),
+                "rate": int(tx.get("rate") or 0),
+            })
+
+        payments = []
+        total_paid = 0.0
+        for p in doc.get("payments", []):
+            amt = float(p.get("amount") or 0)
+            total_paid += amt
+            payments.append({
+                "mode_of_payment": p.get("mode_of_payment") or "Payment",
+                "amount": amt,
+            })
+
+        branch_detail = {}
+        if doc.get("branch"):
+            try:
+                branch_detail = frappe.get_cached_doc("Branch", doc.get("branch")).as_dict()
+            except frappe.DoesNotExistError:
+                branch_detail = {}
+
+        grand_total = float(doc.get("rounded_total") or doc.get("grand_total") or 0)
+        change_amount = doc.get("change_amount")
+        if change_amount is None:
+            change_amount = max(0.0, total_paid - grand_total)
+
+        return {
+            "name": doc.get("name"),
+            "posting_date": str(doc.get("posting_date") or ""),
+            "posting_time": str(doc.get("posting_time") or ""),
+            "branch": doc.get("branch") or "",
+            "branch_detail": branch_detail,
+            "company": doc.get("company") or "",
+            "customer": doc.get("customer") or "",
+            "customer_name": doc.get("customer_name") or "",
+            "order_type": doc.get("order_type") or "",
+            "queue": doc.get("queue") or "",
+            "currency": doc.get("currency") or "IDR",
+            "total": float(doc.get("total") or 0),
+            "discount_for_bank": doc.get("discount_for_bank") or "",
+            "discount_name": doc.get("discount_name") or "",
+            "discount_amount": float(doc.get("discount_amount") or 0),
+            "total_taxes_and_charges": float(doc.get("total_taxes_and_charges") or 0),
+            "grand_total": float(doc.get("grand_total") or 0),
+            "rounded_total": float(doc.get("rounded_total") or 0),
+            "paid_amount": float(doc.get("paid_amount") or 0),
+            "change_amount": float(change_amount or 0),
+            "loyalty_points": doc.get("loyalty_points"),
+            "loyalty_amount": float(doc.get("loyalty_amount") or 0),
+            "remarks": (doc.get("remarks") or "").strip(),
+            "items": items,
+            "taxes": taxes,
+            "payments": payments,
+            "pos_profile": doc.get("pos_profile") or "",
+            "owner": doc.get("owner") or "",
+            "doc": doc,  # original doc kalau mau ambil field lain
+        }
+
+    # ===== ITEM PRICE & RESTO MENU (BULK) =====
+    def _standard_prices(self, item_codes) -> Dict[str, float]:
+        if not item_codes:
+            return {}
+
+        prices = {}
+        for row in frappe.get_all(
+            "Item Price",
+            filters={"item_code": ["in", item_codes], "price_list": STANDARD_PRICE_LIST},
+            fields=["item_code", "price_list_rate"],
+            order_by="creation asc"
+        ):
+            prices.setdefault(row.item_code, row.price_list_rate)
+        return prices
+
+    def _load_menus(self, names) -> Dict[str, Dict]:
+        names = list({n for n in names if n})
+        self._menus = {}
+        if names:
+            for row in frappe.get_all(
+                "Resto Menu",
+                filters={"name": ["in", names]},
+                fields=["name", "short_name", "custom_mandarin_name"]
+            ):
+                self._menus[row.name] = row
+        return self._menus
+
+    @property
+    def mandarin_map(self) -> Dict[str, str]:
+        """resto_menu -> custom_mandarin_name untuk semua item invoice."""
+        if self._menus is None:
+            self.data
+        return {name: row.custom_mandarin_name for name, row in self._menus.items()}
+
+    # ===== MEJA & PAX =====
+    def _load_tables(self):
+        if self._tables is None:
+            from resto.table_lookup import get_invoice_tables
+            self._tables = get_invoice_tables(self.name)
+        return self._tables
+
+    @property
+    def table_names(self) -> str:
+        return self._load_tables()["table_names"]
+
+    @property
+    def total_pax(self) -> int:
+        return self._load_tables()["pax"]
+
+    # ===== USER =====
+    def full_name(self, user: str) -> str:
+        if user not in self._full_names:
+            self._full_names[user] = frappe.db.get_value("User", user, "full_name") or user
+        return self._full_names[user]
+
+    def created_by(self, user: str = None) -> str:
+        """Nama petugas tiket: user pembuat job (spooler) atau user sesi."""
+        return self.full_name(user or frappe.session.user)
+
+    @property
+    def owner(self) -> str:
+        if self._data is not None:
+            return self._data["owner"]
+        return frappe.db.get_value("POS Invoice", self.name, "owner") or ""
+
+    @property
+    def waiter_name(self) -> str:
+        return self.full_name(self.owner)
+
+    @property
+    def cashier_name(self) -> str:
+        """User POS Opening Entry yang masih Open untuk POS Profile invoice, fallback owner."""
+        if self._cashier_name is None:
+            rows = frappe.db.sql("""
+                SELECT poe.user, u.full_name
+                FROM `tabPOS Opening Entry` poe
+                LEFT JOIN `tabUser` u ON u.name = poe.user
+                WHERE poe.pos_profile = %s AND poe.status = 'Open' AND poe.docstatus = 1
+                ORDER BY poe.creation DESC
+                LIMIT 1
+            """, self.data["pos_profile"], as_dict=True)
+
+            if rows:
+                self._cashier_name = rows[0].full_name or rows[0].user
+            else:
+                self._cashier_name = self.waiter_name
+        return self._cashier_name
+
+    # ===== COMPANY =====
+    @property
+    def company_address(self) -> Dict[str, str]:
+        if self._company_address is None:
+            self._company_address = get_company_address(self.data["company"])
+        return self._company_address
+
+    @property
+    def company_logo(self) -> str:
+        if self._company_logo is None:
+            self._company_logo = ""
+            company = self.data["company"]
+            if company:
+                logo = frappe.db.get_value("Company", company, ["custom_company_logo", "company_logo"])
+                if logo:
+                    self._company_logo = logo[0] or logo[1] or ""
+        return self._company_logo
+
+
+def get_company_address(company: str) -> Dict[str, str]:
+    """Alamat utama Company (Address pertama yang di-link), satu query join."""
+    if not company:
+        return {}
+
+    rows = frappe.db.sql("""
+        SELECT addr.address_line1, addr.address_line2, addr.city, addr.pincode, addr.phone
+        FROM `tabDynamic Link` dl
+        JOIN `tabAddress` addr ON addr.name = dl.parent
+        WHERE dl.parenttype = 'Address'
+            AND dl.link_doctype = 'Company' AND dl.link_name = %s
+        ORDER BY dl.creation ASC
+        LIMIT 1
+    """, company, as_dict=True)
+    return {k: v or "" for k, v in rows[0].items()} if rows else {}
+
+
+def get_invoice_print_context(name: str) -> InvoicePrintContext:
+    """Context invoice, di-memo per request (frappe.local dibersihkan tiap request/job)."""
+    memo = getattr(frappe.local, "invoice_print_context", None)
+    if memo is None:
+        memo = frappe.local.invoice_print_context = {}
+
+    if name not in memo:
+        memo[name] = InvoicePrintContext(name)
+    return memo[name]
+
+
+def clear_invoice_print_context(doc=None, method=None):
+    """Buang memo (satu invoice kalau doc diberikan); dipanggil setelah invoice/flag berubah."""
+    memo = getattr(frappe.local, "invoice_print_context", None)
+    if not memo:
+        return
+    if doc is not None:
+        memo.pop(doc.name, None)
+    else:
+        memo.clear()
@@ -0,0 +1,207 @@
+"""
+Instrumentasi jalur cetak: durasi route / build / submit / flag / job / complete.
+
+Setiap span dicatat ke histogram per (stage, printer, jenis tiket) di Redis,
+jadi angka dari semua worker web dan RQ terkumpul di satu tempat. Label yang
+tidak diisi diwarisi dari span luar (mis. submit di dalam job spooler ikut
+label printer + jenis tiket job).
+
+Hasilnya bisa dibaca lewat get_print_stats (JSON) atau print_metrics_prometheus
+(format teks Prometheus).
+"""
+import functools
+import inspect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import frappe
+
+METRICS_CACHE_KEY = "resto_print_metrics"
+STAGES = ("route", "build", "submit", "flag", "job", "complete")
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_labels = ContextVar("resto_print_labels", default=None)
+
+
+def _bucket(ms):
+    for le in BUCKETS_MS:
+        if ms <= le:
+            return str(le)
+    return "+Inf"
+
+
+def observe(stage, ms, printer=None, ticket_type=None, failed=False):
+    """Catat satu durasi (ms). Gagal menulis metrik tidak boleh menggagalkan print."""
+    series = f"{stage}|{printer or '-'}|{ticket_type or '-'}"
+    try:
+        cache = frappe.cache()
+        key = cache.make_key(METRICS_CACHE_KEY)
+        pipe = cache.pipeline()
+        pipe.hincrby(key, f"{series}|{_bucket(ms)}", 1)
+        pipe.hincrby(key, f"{series}|count", 1)
+        pipe.hincrbyfloat(key, f"{series}|sum", round(ms, 3))
+        if failed:
+            pipe.hincrby(key, f"{series}|errors", 1)
+        pipe.execute()
+    except Exception:
+        frappe.logger("pos_print").warning({"message": "Gagal mencatat metrik print", "series": series})
+
+
+@contextmanager
+def span(stage, printer=None, ticket_type=None):
+    """
+    Ukur durasi blok. Yield dict label yang masih boleh diubah di dalam blok
+    (mis. printer baru diketahui setelah routing, atau labels["failed"] = True
+    untuk kegagalan yang tidak dilempar sebagai exception).
+    """
+    parent = _labels.get() or {}
+    labels = {
+        "printer": printer or parent.get("printer"),
+        "ticket_type": ticket_type or parent.get("ticket_type"),
+    }
+    token = _labels.set(labels)
+    failed = False
+    start = time.perf_counter()
+    try:
+        yield labels
+    except Exception:
+        failed = True
+        raise
+    finally:
+        elapsed = (time.perf_counter() - start) * 1000
+        _labels.reset(token)
+        observe(stage, elapsed, labels["printer"], labels["ticket_type"], failed or labels.get("failed"))
+
+
+def timed(stage, printer=None, ticket_type=None):
+    """
+    Decorator span. printer / ticket_type boleh string tetap atau fungsi yang
+    menerima argumen pemanggilan (dict nama -> nilai).
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        def resolve(label, args, kwargs):
+            if not callable(label):
+                return label
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return label(bound.arguments)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(
+                stage,
+                printer=resolve(printer, args, kwargs),
+                ticket_type=resolve(ticket_type, args, kwargs),
+            ):
+                return fn(*args, **kwargs)
+
+        return wrapper
+    return decorator
+
+
+# ========== Baca Metrik ==========
+def _quantile(buckets, count, q):
+    """Perkiraan kuantil: batas atas bucket pertama yang mencapai q * count."""
+    target = q * count
+    for le, cumulative in buckets:
+        if cumulative >= target:
+            return le
+    return "+Inf"
+
+
+def collect_stats():
+    """List series {stage, printer, ticket_type, count, sum_ms, avg_ms, errors, p50_ms, p95_ms, buckets}."""
+    cache = frappe.cache()
+    # Lewat pipeline: hgetall milik RedisWrapper meng-unpickle nilai, counter hincrby bukan pickle
+    pipe = cache.pipeline()
+    pipe.hgetall(cache.make_key(METRICS_CACHE_KEY))
+    raw = pipe.execute()[0] or {}
+
+    series = {}
+    for field, value in raw.items():
+        parts = frappe.safe_decode(field).rsplit("|", 3)
+        if len(parts) != 4:
+            continue
+        stage, printer, ticket_type, name = parts
+        entry = series.setdefault((stage, printer, ticket_type), {"counts": {}, "count": 0, "sum": 0.0, "errors": 0})
+        value = float(frappe.safe_decode(value))
+        if name in ("count", "errors"):
+            entry[name] = int(value)
+        elif name == "sum":
+            entry["sum"] = value
+        else:
+            entry["counts"][name] = int(value)
+
+    stats = []
+    for (stage, printer, ticket_type), entry in sorted(series.items()):
+        cumulative, buckets = 0, []
+        for le in [*map(str, BUCKETS_MS), "+Inf"]:
+            cumulative += entry["counts"].get(le, 0)
+            buckets.append((le, cumulative))
+
+        count = entry["count"]
+        stats.append({
+            "stage": stage,
+            "printer": printer,
+            "ticket_type": ticket_type,
+            "count": count,
+            "errors": entry["errors"],
+            "sum_ms": round(entry["sum"], 3),
+            "avg_ms": round(entry["sum"] / count, 3) if count else 0,
+            "p50_ms": _quantile(buckets, count, 0.5),
+            "p95_ms": _quantile(buckets, count, 0.95),
+            "buckets": dict(buckets),
+        })
+    return stats
+
+
+def render_prometheus(stats):
+    lines = [
+        "# HELP resto_print_duration_ms Durasi tahap cetak (ms)",
+        "# TYPE resto_print_duration_ms histogram",
+    ]
+    for s in stats:
+        labels = f'stage="{s["stage"]}",printer="{s["printer"]}",ticket_type="{s["ticket_type"]}"'
+        for le, cumulative in s["buckets"].items():
+            lines.append(f'resto_print_duration_ms_bucket{{{labels},le="{le}"}} {cumulative}')
+        lines.append(f"resto_print_duration_ms_sum{{{labels}}} {s['sum_ms']}")
+        lines.append(f"resto_print_duration_ms_count{{{labels}}} {s['count']}")
+
+    lines.append("# HELP resto_print_errors_total Span cetak yang gagal")
+    lines.append("# TYPE resto_print_errors_total counter")
+    for s in stats:
+        labels = f'stage="{s["stage"]}",printer="{s["printer"]}",ticket_type="{s["ticket_type"]}"'
+        lines.append(f"resto_print_errors_total{{{labels}}} {s['errors']}")
+
+    return "\n".join(lines) + "\n"
+
+
+@frappe.whitelist()
+def get_print_stats(stage=None, printer=None, ticket_type=None):
+    """Statistik latency cetak, bisa difilter per stage / printer / jenis tiket."""
+    frappe.only_for("System Manager")
+    return [
+        s for s in collect_stats()
+        if (not stage or s["stage"] == stage)
+        and (not printer or s["printer"] == printer)
+        and (not ticket_type or s["ticket_type"] == ticket_type)
+    ]
+
+
+@frappe.whitelist()
+def print_metrics_prometheus():
+    """Dump teks Prometheus untuk di-scrape."""
+    from werkzeug.wrappers import Response
+
+    frappe.only_for("System Manager")
+    return Response(render_prometheus(collect_stats()), mimetype="text/plain; version=0.0.4")
+
+
+@frappe.whitelist()
+def reset_print_stats():
+    frappe.only_for("System Manager")
+    frappe.cache().delete_value(METRICS_CACHE_KEY)
+    return {"ok": True}
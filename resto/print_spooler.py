@@ -0,0 +1,426 @@
+"""
+Print spooler: job cetak disimpan di doctype Print Job lalu dikirim worker.
+
+- Request (send to kitchen) hanya insert Print Job lalu langsung return.
+- Satu lane per printer: setiap job baru membangunkan lane lewat RQ, redis
+  lock memastikan hanya satu worker yang mencetak ke printer itu, jadi
+  printer bar yang macet tidak menahan printer grill.
+- Gagal kirim -> retry dengan backoff eksponensial; setelah max_attempts
+  job masuk status Dead (dead-letter) dan dicatat di Error Log.
+- Job Kitchen bisa ditahan sebentar (coalesce window, opt-in per branch):
+  send berulang untuk invoice + station yang sama digabung ke job yang masih
+  antri. Lane tidak menunggu job yang ditahan; kick tertunda dijadwalkan
+  lewat RQ scheduler.
+- Backend printer bisa diganti (set_print_backend) untuk test.
+"""
+import base64
+import json
+from datetime import timedelta
+
+import frappe
+from frappe.utils import add_to_date, now_datetime
+
+from resto.print_metrics import span
+from resto.printer_health import get_failover_printer
+
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 5 * 60
+LANE_LOCK_TIMEOUT = 10 * 60
+# Harus lebih lama dari lock lane: job Printing di bawah lock yang masih dipegang tidak boleh diantrikan ulang
+STUCK_PRINTING_MINUTES = LANE_LOCK_TIMEOUT // 60 + 5
+LANE_QUEUE = "short"
+DEFAULT_COALESCE_SECONDS = 0   # opt-in lewat Printer Settings
+MAX_COALESCE_SECONDS = 30
+
+
+# =====================================================
+# BACKEND PRINTER
+# =====================================================
+class CupsPrintBackend:
+    def send(self, printer_name, data, title):
+        from resto.cups_pool import get_cups
+
+        cups_conn = get_cups()
+        cups_conn.ensure_printer(printer_name)
+        return cups_conn.print_bytes(printer_name, data, title, {"raw": "true"})
+
+
+_backend = None
+
+
+def get_print_backend():
+    global _backend
+    if _backend is None:
+        _backend = CupsPrintBackend()
+    return _backend
+
+
+def set_print_backend(backend=None):
+    """Ganti backend (mis. fake printer di test). None = CUPS."""
+    global _backend
+    _backend = backend
+
+
+# =====================================================
+# RENDER PER JENIS JOB
+# =====================================================
+def _render_kitchen(job, payload):
+    from resto.printing import build_kitchen_receipt_from_payload
+
+    raw = build_kitchen_receipt_from_payload(payload)
+    title = f"KITCHEN_{payload.get('kitchen_station')}_{payload.get('pos_invoice')}"
+    return raw, title
+
+
+def _render_raw(job, payload):
+    return base64.b64decode(payload["data"]), payload.get("title") or f"PRINT_JOB_{job.name}"
+
+
+JOB_RENDERERS = {
+    "Kitchen": _render_kitchen,
+    "Raw": _render_raw,
+}
+
+
+def _merge_kitchen(payload, new_payload):
+    """Gabung item tiket baru ke tiket yang masih antri (tanpa item ganda)."""
+    known = {it.get("name") for it in payload.get("items", [])}
+    payload.setdefault("items", []).extend(
+        it for it in new_payload.get("items", []) if it.get("name") not in known
+    )
+    return payload
+
+
+JOB_MERGERS = {
+    "Kitchen": _merge_kitchen,
+}
+
+
+def _kitchen_printed(job):
+    from resto.resto_sopwer.doctype.kitchen_print_ledger.kitchen_print_ledger import (
+        flag_fully_printed,
+        get_job_items,
+        mark_printed,
+    )
+
+    mark_printed(print_job=job.name)
+    flag_fully_printed(get_job_items(job.name))
+
+
+def _kitchen_dead(job):
+    from resto.resto_sopwer.doctype.kitchen_print_ledger.kitchen_print_ledger import release_claims
+
+    release_claims(job.name)
+
+
+# Dipanggil di transaksi yang sama dengan status Done / Dead
+JOB_DONE_HOOKS = {
+    "Kitchen": _kitchen_printed,
+}
+JOB_DEAD_HOOKS = {
+    "Kitchen": _kitchen_dead,
+}
+
+
+# =====================================================
+# ENQUEUE
+# =====================================================
+def _coalesce_into_pending(printer_name, job_type, payload, pos_invoice, kitchen_station):
+    """
+    Cari job yang belum pernah dicoba untuk (invoice, station, printer) yang sama
+    dan gabungkan payload ke sana. Row dikunci FOR UPDATE, jadi lane yang
+    mau claim menunggu commit ini dan mencetak payload gabungan.
+    """
+    rows = frappe.db.sql("""
+        SELECT name, payload FROM `tabPrint Job`
+        WHERE printer_name = %(printer)s
+            AND job_type = %(job_type)s
+            AND pos_invoice = %(pos_invoice)s
+            AND kitchen_station = %(station)s
+            AND status = 'Queued'
+            AND attempts = 0
+        ORDER BY creation DESC
+        LIMIT 1
+        FOR UPDATE
+    """, {
+        "printer": printer_name,
+        "job_type": job_type,
+        "pos_invoice": pos_invoice,
+        "station": kitchen_station
+    }, as_dict=True)
+
+    if not rows:
+        return None
+
+    merged = JOB_MERGERS[job_type](json.loads(rows[0].payload or "{}"), payload)
+    frappe.db.set_value("Print Job", rows[0].name, "payload", frappe.as_json(merged), update_modified=True)
+    return rows[0].name
+
+
+def enqueue_print_job(printer_name, job_type, payload, pos_invoice=None, kitchen_station=None,
+                      max_attempts=None, coalesce_seconds=0):
+    """
+    Simpan Print Job (ikut transaksi pemanggil) dan bangunkan lane printer
+    setelah commit. Tidak menyentuh printer sama sekali.
+
+    coalesce_seconds > 0: job ditahan selama itu, dan send berikutnya untuk
+    invoice + station yang sama digabung ke job ini selama belum dicetak.
+    """
+    if not printer_name:
+        frappe.throw("Printer wajib diisi untuk Print Job")
+    if job_type not in JOB_RENDERERS:
+        frappe.throw(f"Jenis Print Job tidak dikenal: {job_type}")
+
+    coalesce_seconds = min(max(int(coalesce_seconds or 0), 0), MAX_COALESCE_SECONDS)
+
+    if coalesce_seconds and job_type in JOB_MERGERS and pos_invoice and kitchen_station:
+        merged_into = _coalesce_into_pending(printer_name, job_type, payload, pos_invoice, kitchen_station)
+        if merged_into:
+            return merged_into
+
+    job = frappe.get_doc({
+        "doctype": "Print Job",
+        "printer_name": printer_name,
+        "job_type": job_type,
+        "pos_invoice": pos_invoice,
+        "kitchen_station": kitchen_station,
+        "payload": frappe.as_json(payload),
+        "next_attempt_at": add_to_date(now_datetime(), seconds=coalesce_seconds) if coalesce_seconds else None,
+        **({"max_attempts": max_attempts} if max_attempts else {})
+    })
+    # Invoice / station berasal dari kode sendiri, tidak perlu query validasi link
+    job.flags.ignore_links = True
+    job.insert(ignore_permissions=True)
+
+    kick_lane(printer_name, delay=coalesce_seconds)
+    return job.name
+
+
+def get_kitchen_coalesce_seconds(branch):
+    """Coalesce window dari Printer Settings branch (default 0 = langsung cetak)."""
+    if not branch:
+        return DEFAULT_COALESCE_SECONDS
+    value = frappe.db.get_value("Printer Settings", {"branch": branch}, "kitchen_coalesce_seconds")
+    return DEFAULT_COALESCE_SECONDS if value is None else int(value)
+
+
+def enqueue_raw_print_job(printer_name, data, title=None, **kwargs):
+    payload = {"data": base64.b64encode(data).decode(), "title": title}
+    return enqueue_print_job(printer_name, "Raw", payload, **kwargs)
+
+
+def kick_lane(printer_name, delay=0):
+    """
+    Bangunkan worker lane printer setelah commit. Sengaja tanpa deduplicate:
+    kick yang datang saat lane masih jalan tidak boleh hilang; kalau lock
+    dipegang lane lain, kick ini selesai dan lane itu mengecek ulang antrian.
+
+    delay > 0 (job ditahan di coalesce window): lane dibangunkan saat job
+    jatuh tempo, bukan sekarang.
+    """
+    if delay:
+        frappe.db.after_commit.add(lambda: _kick_lane_in(printer_name, delay))
+        return
+
+    frappe.enqueue(
+        "resto.print_spooler.run_lane",
+        queue=LANE_QUEUE,
+        enqueue_after_commit=True,
+        printer_name=printer_name
+    )
+
+
+def _kick_lane_in(printer_name, seconds):
+    """
+    Kick tertunda lewat RQ scheduler, tidak ada worker yang tidur menunggu.
+    Tanpa worker ber-scheduler, cron requeue_due_jobs tetap membangunkan lane.
+    """
+    from frappe.utils.background_jobs import execute_job, get_queue
+
+    get_queue(LANE_QUEUE).enqueue_in(
+        timedelta(seconds=seconds),
+        execute_job,
+        kwargs={
+            "site": frappe.local.site,
+            "user": frappe.session.user,
+            "method": "resto.print_spooler.run_lane",
+            "event": None,
+            "job_name": "resto.print_spooler.run_lane",
+            "is_async": True,
+            "kwargs": {"printer_name": printer_name},
+        }
+    )
+
+
+# =====================================================
+# LANE WORKER
+# =====================================================
+def _next_due_job(printer_name):
+    rows = frappe.db.sql("""
+        SELECT name FROM `tabPrint Job`
+        WHERE printer_name = %(printer)s
+            AND status = 'Queued'
+            AND (next_attempt_at IS NULL OR next_attempt_at <= %(now)s)
+        ORDER BY creation
+        LIMIT 1
+    """, {"printer": printer_name, "now": now_datetime()})
+    return rows[0][0] if rows else None
+
+
+def _claim(job_name):
+    frappe.db.sql("""
+        UPDATE `tabPrint Job`
+        SET status = 'Printing', modified = %(now)s
+        WHERE name = %(name)s AND status = 'Queued'
+    """, {"name": job_name, "now": now_datetime()})
+    return frappe.db._cursor.rowcount == 1
+
+
+def _retry_delay(attempts):
+    return min(RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0)), RETRY_MAX_SECONDS)
+
+
+def _mark_done(job, cups_job_id, printed_on=None):
+    frappe.db.set_value("Print Job", job.name, {
+        "status": "Done",
+        "cups_job_id": cups_job_id or 0,
+        "printed_at": now_datetime(),
+        "printed_on": printed_on or job.printer_name,
+        "last_error": None
+    }, update_modified=True)
+
+    hook = JOB_DONE_HOOKS.get(job.job_type)
+    if hook:
+        hook(job)
+
+
+def _mark_failed(job, error, dead=False):
+    attempts = (job.attempts or 0) + 1
+    dead = dead or attempts >= (job.max_attempts or 1)
+
+    values = {"attempts": attempts, "last_error": str(error)[:1000]}
+    if dead:
+        values["status"] = "Dead"
+        frappe.log_error(
+            f"{job.job_type} ke {job.printer_name} gagal {attempts}x: {error}",
+            f"Print Job Dead: {job.name}"
+        )
+    else:
+        delay = _retry_delay(attempts)
+        values["status"] = "Queued"
+        values["next_attempt_at"] = add_to_date(now_datetime(), seconds=delay)
+        # Lane dibangunkan tepat saat backoff habis, tidak menunggu cron per menit
+        kick_lane(job.printer_name, delay=delay)
+
+    frappe.db.set_value("Print Job", job.name, values, update_modified=True)
+
+    hook = JOB_DEAD_HOOKS.get(job.job_type) if dead else None
+    if hook:
+        hook(job)
+    return dead
+
+
+def process_job(job_name):
+    """
+    Kirim satu Print Job yang sudah di-claim. Return True kalau tercetak.
+    Error render = data rusak, langsung Dead; error printer = retry.
+    """
+    job = frappe.get_doc("Print Job", job_name)
+    # Span job: build + submit di dalamnya ikut label printer dan jenis job
+    with span("job", printer=job.printer_name, ticket_type=job.job_type) as labels:
+        try:
+            raw, title = JOB_RENDERERS[job.job_type](job, json.loads(job.payload or "{}"))
+        except Exception:
+            labels["failed"] = True
+            _mark_failed(job, frappe.get_traceback(), dead=True)
+            return False
+
+        if not raw:
+            _mark_done(job, None)
+            return True
+
+        # Printer degraded menurut monitor -> printer cadangan Kitchen Station
+        printer_name = get_failover_printer(job.printer_name, job.kitchen_station)
+        try:
+            cups_job_id = get_print_backend().send(printer_name, raw, title)
+        except Exception as e:
+            labels["failed"] = True
+            _mark_failed(job, e)
+            return False
+
+        _mark_done(job, cups_job_id, printer_name)
+        return True
+
+
+def _drain(printer_name):
+    while True:
+        frappe.db.commit()  # snapshot baru supaya job yang baru masuk terlihat
+        job_name = _next_due_job(printer_name)
+        if not job_name:
+            # Job yang masih di coalesce window dibangunkan oleh kick tertundanya
+            return
+        if not _claim(job_name):
+            continue
+        frappe.db.commit()
+
+        printed = process_job(job_name)
+        frappe.db.commit()
+
+        if not printed:
+            # Printer kemungkinan offline: lane berhenti, lanjut saat retry jatuh tempo
+            return False
+
+
+def run_lane(printer_name):
+    """Worker satu printer. Hanya satu worker per printer yang aktif (redis lock)."""
+    cache = frappe.cache()
+
+    while True:
+        lock = cache.lock(
+            cache.make_key(f"print_lane:{printer_name}"),
+            timeout=LANE_LOCK_TIMEOUT,
+            blocking_timeout=0
+        )
+        if not lock.acquire():
+            return
+
+        try:
+            drained = _drain(printer_name) is not False
+        finally:
+            try:
+                lock.release()
+            except Exception:
+                pass
+
+        # Job yang masuk saat lane keluar dari _drain: kick-nya kalah lock dan
+        # sudah selesai, jadi cek ulang setelah lock dilepas
+        frappe.db.commit()
+        if not drained or not _next_due_job(printer_name):
+            return
+
+
+# =====================================================
+# SCHEDULER
+# =====================================================
+def requeue_due_jobs():
+    """
+    Cron tiap menit: kembalikan job yang macet di status Printing
+    (worker mati di tengah jalan) lalu bangunkan lane yang punya job jatuh tempo.
+    """
+    now = now_datetime()
+    frappe.db.sql("""
+        UPDATE `tabPrint Job`
+        SET status = 'Queued', modified = %(now)s
+        WHERE status = 'Printing' AND modified < %(stuck_before)s
+    """, {"now": now, "stuck_before": add_to_date(now, minutes=-STUCK_PRINTING_MINUTES)})
+
+    printers = frappe.db.sql_list("""
+        SELECT DISTINCT printer_name FROM `tabPrint Job`
+        WHERE status = 'Queued'
+            AND (next_attempt_at IS NULL OR next_attempt_at <= %(now)s)
+    """, {"now": now})
+
+    for printer_name in printers:
+        kick_lane(printer_name)
+
+    frappe.db.commit()
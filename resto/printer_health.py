@@ -0,0 +1,220 @@
+"""
+Monitor kesehatan printer dari status job CUPS.
+
+cups_print_raw / print_bytes hanya mengembalikan job id; job yang macet atau
+dibatalkan di CUPS tidak pernah ketahuan. Setiap job yang dikirim dicatat di
+Redis, lalu scheduler tiap menit menanyakan status job ke CUPS per rentang
+job id (satu getJobs per rentang, maksimal batch_size id), mencatat latency selesai ke print_metrics, dan
+menandai printer "degraded" bila job gagal berturut-turut, macet, atau
+printer berhenti. Spooler memakai status ini untuk fail-over ke printer
+cadangan Kitchen Station.
+"""
+import time
+
+import frappe
+
+from resto.print_metrics import observe
+
+PENDING_JOBS_KEY = "resto_cups_pending_jobs"
+PRINTER_HEALTH_KEY = "resto_printer_health"
+
+POLL_BATCH_SIZE = 50
+STUCK_SECONDS = 120                 # job belum selesai selama ini = printer bermasalah
+DEGRADED_AFTER_FAILURES = 3         # job gagal berturut-turut sebelum degraded
+FORGET_AFTER_SECONDS = 60 * 60      # job yang sudah hilang dari histori CUPS
+PENDING_MAX_AGE_SECONDS = 15 * 60   # job held / tidak pernah selesai: berhenti dipantau, dihitung gagal
+RECOVERY_SECONDS = 5 * 60           # printer degraded tanpa job baru dicoba lagi setelah ini
+
+# IPP job-state
+JOB_PENDING, JOB_HELD, JOB_PROCESSING = 3, 4, 5
+JOB_STOPPED, JOB_CANCELED, JOB_ABORTED, JOB_COMPLETED = 6, 7, 8, 9
+JOB_FAILED_STATES = {JOB_STOPPED: "stopped", JOB_CANCELED: "canceled", JOB_ABORTED: "aborted"}
+# IPP printer-state
+PRINTER_STOPPED = 5
+
+JOB_ATTRIBUTES = ["job-id", "job-state", "time-at-creation", "time-at-completed", "job-printer-state-message"]
+
+
+def track_job(printer_name, job_id, submitted_at=None):
+    """Catat job yang baru dikirim ke CUPS supaya statusnya dipantau."""
+    if not job_id:
+        return
+    try:
+        frappe.cache().hset(PENDING_JOBS_KEY, str(job_id), {
+            "job_id": int(job_id),
+            "printer": printer_name,
+            "submitted_at": submitted_at or time.time(),
+        })
+    except Exception:
+        frappe.logger("pos_print").warning({"message": "Gagal mencatat job CUPS", "job_id": job_id})
+
+
+# ========== Status Printer ==========
+def _default_health(printer_name):
+    return {
+        "printer": printer_name,
+        "status": "ok",
+        "consecutive_failures": 0,
+        "reason": "",
+        "last_completed_at": None,
+        "last_latency_ms": None,
+        "degraded_since": None,
+        "updated_at": None,
+    }
+
+
+def get_health(printer_name):
+    return frappe.cache().hget(PRINTER_HEALTH_KEY, printer_name) or _default_health(printer_name)
+
+
+def is_printer_degraded(printer_name):
+    return bool(printer_name) and get_health(printer_name)["status"] == "degraded"
+
+
+def get_failover_printer(printer_name, kitchen_station=None):
+    """
+    Printer tujuan job: printer asli, atau backup_printer_name Kitchen Station
+    kalau printer asli degraded dan backup sehat.
+    """
+    if not kitchen_station or not is_printer_degraded(printer_name):
+        return printer_name
+
+    backup = frappe.get_cached_value("Kitchen Station", kitchen_station, "backup_printer_name")
+    if backup and backup != printer_name and not is_printer_degraded(backup):
+        return backup
+    return printer_name
+
+
+@frappe.whitelist()
+def get_printer_health(printer_name=None):
+    """Status semua printer yang pernah dipantau (atau satu printer)."""
+    if printer_name:
+        return get_health(printer_name)
+
+    health = frappe.cache().hgetall(PRINTER_HEALTH_KEY) or {}
+    return sorted(health.values(), key=lambda h: h["printer"])
+
+
+# ========== Poll CUPS ==========
+def _evaluate(health, printer_state, completed, failures, stuck, now):
+    """Update status satu printer dari hasil satu putaran poll."""
+    for latency_ms in completed:
+        health["consecutive_failures"] = 0
+        health["last_completed_at"] = now
+        health["last_latency_ms"] = round(latency_ms, 1)
+
+    for failure in failures:
+        health["consecutive_failures"] += 1
+        health["reason"] = failure
+
+    reason = None
+    if printer_state is None:
+        reason = "printer tidak ditemukan di CUPS"
+    elif printer_state.get("printer-state") == PRINTER_STOPPED:
+        reason = printer_state.get("printer-state-message") or "printer stopped"
+    elif stuck and not completed:
+        # Job lain di printer ini selesai: printer jalan, yang macet job itu saja
+        reason = f"{stuck} job belum selesai > {STUCK_SECONDS} detik"
+    elif health["consecutive_failures"] >= DEGRADED_AFTER_FAILURES:
+        if not (completed or failures) and now - (health.get("degraded_since") or now) >= RECOVERY_SECONDS:
+            # Tidak ada job baru (semua fail-over): coba lagi, satu kegagalan lagi langsung degraded
+            health["consecutive_failures"] = DEGRADED_AFTER_FAILURES - 1
+        else:
+            reason = health["reason"] or f"{health['consecutive_failures']} job gagal berturut-turut"
+
+    status = "degraded" if reason else "ok"
+    if health["status"] != status:
+        frappe.logger("pos_print").warning({"printer": health["printer"], "status": status, "reason": reason})
+        health["degraded_since"] = now if reason else None
+
+    health["status"] = status
+    health["reason"] = reason or ""
+    health["updated_at"] = now
+    return health
+
+
+def _job_windows(pending, batch_size):
+    """
+    Kelompokkan job (urut job_id) per rentang id <= batch_size: (first_id, limit, entries).
+    Ukuran request IPP mengikuti rentang, jadi satu job lama tidak membuat
+    getJobs meminta semua id di antaranya.
+    """
+    window = []
+    for entry in pending:
+        if window and entry["job_id"] - window[0]["job_id"] >= batch_size:
+            yield window[0]["job_id"], window[-1]["job_id"] - window[0]["job_id"] + 1, window
+            window = []
+        window.append(entry)
+    if window:
+        yield window[0]["job_id"], window[-1]["job_id"] - window[0]["job_id"] + 1, window
+
+
+def poll_printer_jobs(batch_size=POLL_BATCH_SIZE, now=None):
+    """Scheduler: cek status job CUPS yang masih dipantau, update kesehatan printer."""
+    from resto.cups_pool import get_cups
+
+    cache = frappe.cache()
+    pending = sorted((cache.hgetall(PENDING_JOBS_KEY) or {}).values(), key=lambda j: j["job_id"])
+
+    # Printer yang sedang degraded tetap dinilai walau tidak ada job (supaya bisa pulih)
+    results = {
+        h["printer"]: {"completed": [], "failures": [], "stuck": 0}
+        for h in (cache.hgetall(PRINTER_HEALTH_KEY) or {}).values()
+        if h["status"] == "degraded"
+    }
+    if not pending and not results:
+        return results
+
+    now = now or time.time()
+    cups_conn = get_cups()
+    printers = cups_conn.get_printers(refresh=True)
+
+    for first, limit, batch in _job_windows(pending, batch_size):
+        # Satu panggilan IPP per rentang job id (job id CUPS berurutan)
+        states = cups_conn.get_jobs(first, limit, JOB_ATTRIBUTES)
+
+        for entry in batch:
+            result = results.setdefault(entry["printer"], {"completed": [], "failures": [], "stuck": 0})
+            attrs = states.get(entry["job_id"])
+            age = now - entry["submitted_at"]
+
+            if attrs is None:
+                # Sudah dibuang dari histori CUPS; tidak bisa dinilai
+                if age > FORGET_AFTER_SECONDS:
+                    cache.hdel(PENDING_JOBS_KEY, str(entry["job_id"]))
+                continue
+
+            state = attrs.get("job-state")
+            finished_at = attrs.get("time-at-completed") or now
+            latency_ms = max(finished_at - entry["submitted_at"], 0) * 1000
+
+            if state == JOB_COMPLETED:
+                observe("complete", latency_ms, entry["printer"])
+                result["completed"].append(latency_ms)
+            elif state in JOB_FAILED_STATES:
+                observe("complete", latency_ms, entry["printer"], failed=True)
+                result["failures"].append(
+                    attrs.get("job-printer-state-message") or f"job {entry['job_id']} {JOB_FAILED_STATES[state]}"
+                )
+            elif age > PENDING_MAX_AGE_SECONDS:
+                # Held / tidak pernah selesai: satu kegagalan, lalu berhenti dipantau
+                result["failures"].append(f"job {entry['job_id']} tidak selesai > {PENDING_MAX_AGE_SECONDS // 60} menit")
+            else:
+                if age > STUCK_SECONDS:
+                    result["stuck"] += 1
+                continue
+
+            cache.hdel(PENDING_JOBS_KEY, str(entry["job_id"]))
+
+    for printer_name, result in results.items():
+        health = _evaluate(
+            get_health(printer_name),
+            printers.get(printer_name),
+            result["completed"],
+            result["failures"],
+            result["stuck"],
+            now,
+        )
+        cache.hset(PRINTER_HEALTH_KEY, printer_name, health)
+
+    return results
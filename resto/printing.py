@@ -1,7 +1,8 @@
 # apps/your_app/your_app/pos_receipt.py
 from __future__ import annotations
+import hashlib
 import math
-import tempfile
+import os
 import frappe
 from typing import List, Dict, Any
 from frappe.utils import now_datetime
@@ -10,6 +11,15 @@ from io import BytesIO
 import requests
 import re
 
+from resto.cups_pool import CUPS_FORMAT_PDF, get_cups
+from resto.print_context import (
+    clear_invoice_print_context,
+    get_company_address,
+    get_invoice_print_context,
+)
+from resto.print_metrics import timed
+from resto.ticket_layout import get_line_width, get_ticket_plan, render
+
 
 # ========== Konstanta & Util ==========
 LINE_WIDTH = 32           # ganti ke 42 jika printer 42 kolom
@@ -17,6 +27,7 @@ ITEM_HEIGHT_MULT = 4      # 2 = aman di banyak printer; coba 3 kalau masih kecil
 
 ESC = b"\x1b"
 GS  = b"\x1d"
+OPEN_DRAWER_COMMAND = b'\x1B\x70\x00\x19\xFA'   # ESC p 0: kick laci kasir
 
 def _esc_init() -> bytes:
     return ESC + b'@'
@@ -148,61 +159,171 @@ def _esc_char_size_dotmatrix(width_mul: int = 1, height_mul: int = 1) -> bytes:
     n = ((h-1) << 3) | ((w-1) << 4)
     return ESC + b'!' + bytes([n])
 
-def _esc_print_image(image_path):
+# ========== Writer ESC/POS ==========
+ALIGN_COMMANDS = {
+    "left": _esc_align_left,
+    "center": _esc_align_center,
+    "right": _esc_align_right,
+}
+
+class EscPosWriter:
     """
-    Convert logo ke ESC/POS format (bitmap)
+    Buffer tiket ESC/POS di atas bytearray (append tanpa menyalin ulang).
+    Semua method return self supaya bisa dirangkai:
+        out.align("center").bold(True).line(title).bold(False)
+    `out += raw_bytes` tetap bisa dipakai untuk perintah khusus.
     """
-    # URL absolut jika path logo berupa /files/...
-    if image_path.startswith("/"):
-        image_url = frappe.utils.get_url(image_path)
+
+    def __init__(self, width: int = LINE_WIDTH):
+        self.width = width
+        self._buf = bytearray()
+
+    def __iadd__(self, data: bytes):
+        self._buf += data
+        return self
+
+    def __len__(self):
+        return len(self._buf)
+
+    def write(self, data: bytes):
+        self._buf += data
+        return self
+
+    def init(self):
+        return self.write(_esc_init())
+
+    def font_a(self):
+        return self.write(_esc_font_a())
+
+    def align(self, position: str = "left"):
+        return self.write(ALIGN_COMMANDS[position]())
+
+    def bold(self, on: bool = True):
+        return self.write(_esc_bold(on))
+
+    def size(self, width_mul: int = 0, height_mul: int = 0):
+        return self.write(_esc_char_size(width_mul, height_mul))
+
+    def size_dotmatrix(self, width_mul: int = 1, height_mul: int = 1):
+        return self.write(_esc_char_size_dotmatrix(width_mul, height_mul))
+
+    def line(self, text: str = "", encoding: str = "ascii"):
+        return self.write((text + "\n").encode(encoding, "ignore"))
+
+    def wrap(self, text: str, width: int | None = None, encoding: str = "ascii", indent: int = 0):
+        """Teks panjang dipecah per kata; indent = spasi di depan setiap baris."""
+        pad = " " * indent if indent > 0 else ""
+        for w in _wrap_text(text, (width or self.width) - len(pad)):
+            self.line(pad + w, encoding)
+        return self
+
+    def lr(self, left: str, right: str, width: int | None = None):
+        """Baris dua kolom: kiri rata kiri, kanan rata kanan."""
+        return self.line(_format_line(left, right, width or self.width))
+
+    def separator(self, char: str = "-"):
+        return self.line(char * self.width)
+
+    def qr(self, data: str):
+        return self.write(_esc_qr(data))
+
+    def feed(self, n: int = 1):
+        return self.write(_esc_feed(n))
+
+    def cut(self):
+        return self.write(_esc_cut_full())
+
+    def getvalue(self) -> bytes:
+        return bytes(self._buf)
+
+# ========== Logo: raster GS v 0 + cache ==========
+LOGO_MAX_WIDTH = 384      # 58mm; printer 80mm biasanya 576
+LOGO_CACHE_DIR = "escpos_logo_cache"
+
+# (sumber, mtime, lebar) -> bytes ESC/POS
+_logo_cache: Dict[tuple, bytes] = {}
+
+def _resolve_logo_file(image_path: str) -> str | None:
+    """Path lokal untuk /files/..., /private/files/... atau path absolut."""
+    if os.path.isabs(image_path) and os.path.exists(image_path):
+        return image_path
+    if image_path.startswith("/private/files/"):
+        path = frappe.get_site_path("private", "files", image_path[len("/private/files/"):])
+    elif image_path.startswith("/files/"):
+        path = frappe.get_site_path("public", "files", image_path[len("/files/"):])
     else:
-        image_url = image_path
+        return None
+    return path if os.path.exists(path) else None
 
-    # Ambil file gambar
-    response = requests.get(image_url)
-    image = Image.open(BytesIO(response.content)).convert("L")  # ubah ke grayscale
+def _rasterize_logo(content: bytes, max_width: int) -> bytes:
+    image = Image.open(BytesIO(content)).convert("L")  # ubah ke grayscale
 
-    # Resize agar muat di kertas 58mm (lebar sekitar 384 pixel)
-    max_width = 384
     if image.width > max_width:
         ratio = max_width / image.width
-        image = image.resize((max_width, int(image.height * ratio)))
+        image = image.resize((max_width, max(1, int(image.height * ratio))))
 
-    # Convert ke hitam putih
-    image = image.point(lambda x: 0 if x < 128 else 255, '1')
+    # Mode "1" dengan bit 1 = titik hitam; tobytes() sudah packed per baris (MSB dulu)
+    bitmap = image.point(lambda x: 255 if x < 128 else 0).convert("1")
+    data = bitmap.tobytes()
 
-    # Konversi ke byte ESC/POS
-    bytes_out = b""
-    width_bytes = (image.width + 7) // 8
+    width_bytes = (bitmap.width + 7) // 8
+    height = bitmap.height
+    header = GS + b"v0\x00" + bytes([
+        width_bytes % 256, width_bytes // 256,
+        height % 256, height // 256
+    ])
+    return _esc_align_center() + header + data + b"\n"
 
-    for y in range(image.height):
-        line = b""
-        for x in range(0, image.width, 8):
-            byte = 0
-            for bit in range(8):
-                if x + bit < image.width and image.getpixel((x + bit, y)) == 0:
-                    byte |= (1 << (7 - bit))
-            line += bytes([byte])
-        bytes_out += b"\x1b*\x21" + bytes([width_bytes % 256, width_bytes // 256]) + line + b"\n"
+def _esc_print_image(image_path, max_width: int = LOGO_MAX_WIDTH):
+    """
+    Convert logo ke ESC/POS (satu blok raster GS v 0).
+    Hasil di-cache per (file, mtime, lebar) di memori dan di disk site,
+    jadi struk berikutnya tidak mengolah gambar lagi.
+    """
+    local_path = _resolve_logo_file(image_path)
+    mtime = os.path.getmtime(local_path) if local_path else None
+    key = (local_path or image_path, mtime, max_width)
 
-    # Reset align ke tengah
-    return _esc_align_center() + bytes_out + b"\n"
+    cached = _logo_cache.get(key)
+    if cached is not None:
+        return cached
 
-def cups_print_pdf(pdf_bytes: bytes, printer_name: str) -> int:
-    import cups
-    import tempfile
+    digest = hashlib.md5(repr(key).encode()).hexdigest()
+    cache_dir = frappe.get_site_path(LOGO_CACHE_DIR)
+    cache_file = os.path.join(cache_dir, f"{digest}.bin")
+
+    if os.path.exists(cache_file):
+        with open(cache_file, "rb") as f:
+            raw = f.read()
+    else:
+        if local_path:
+            with open(local_path, "rb") as f:
+                content = f.read()
+        else:
+            # Logo eksternal: download sekali, selanjutnya dari cache
+            image_url = frappe.utils.get_url(image_path) if image_path.startswith("/") else image_path
+            response = requests.get(image_url, timeout=10)
+            response.raise_for_status()
+            content = response.content
+
+        raw = _rasterize_logo(content, max_width)
 
-    conn = cups.Connection()
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_file = f"{cache_file}.{os.getpid()}"
+        with open(tmp_file, "wb") as f:
+            f.write(raw)
+        os.replace(tmp_file, cache_file)
 
-    printers = conn.getPrinters()
-    if printer_name not in printers:
-        raise frappe.ValidationError(f"Printer '{printer_name}' tidak ditemukan")
+    _logo_cache[key] = raw
+    return raw
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-        tmp.write(pdf_bytes)
-        tmp_path = tmp.name
+def cups_print_pdf(pdf_bytes: bytes, printer_name: str) -> int:
+    cups_conn = get_cups()
+    cups_conn.ensure_printer(printer_name)
 
-    job_id = conn.printFile(printer_name, tmp_path, "POS_Invoice", {})
+    job_id = cups_conn.print_bytes(
+        printer_name, pdf_bytes, "POS_Invoice", document_format=CUPS_FORMAT_PDF
+    )
     return job_id
 
 def sanitize_kitchen_payload(items):
@@ -224,105 +345,8 @@ def sanitize_kitchen_payload(items):
 
 # ========== Normalisasi POS Invoice ==========
 def _collect_pos_invoice(name: str) -> Dict[str, Any]:
-    """Ambil POS Invoice + items/payments/taxes lewat frappe.get_doc."""
-    doc = frappe.get_doc("POS Invoice", name).reload()
-
-    currency = doc.get("currency") or "IDR"
-    items = []
-
-    for it in doc.get("items", []):
-        item_code = it.get("item_code")
-
-        standard_price = frappe.db.get_value(
-            "Item Price",
-            {"item_code": item_code, "price_list": "Standard Selling"},
-            "price_list_rate"
-        ) or it.get("rate") 
-
-        short_name = frappe.db.get_value("Resto Menu", item_code, "short_name") or it.get("item_name") or item_code
-
-        items.append({
-            "name": it.get("name"),
-            "item_code": it.get("item_code"),
-            "item_name": it.get("item_name") or it.get("item_code"),
-            "short_name": short_name,
-            "resto_menu": it.get("resto_menu"),
-            "qty": float(it.get("qty") or 0),
-            "rate": float(standard_price or 0),
-            "amount": float(it.get("amount") or 0),
-            "uom": it.get("uom") or it.get("stock_uom"),
-            "discount_percentage": float(it.get("discount_percentage") or 0),
-            "discount_amount": float(it.get("discount_amount") or 0),
-            "description": it.get("description") or "",
-            "add_ons" : it.get("add_ons") or "",
-            "quick_notes": it.get("quick_notes") or "",
-            "status_kitchen": it.get("status_kitchen") or "",
-            "is_checked": int(it.get("is_checked") or 0),
-            "is_print_kitchen": int(it.get("is_print_kitchen") or 0),
-        })
-
-    taxes = []
-    for tx in doc.get("taxes", []):
-        taxes.append({
-            "description": tx.get("description") or "Tax",
-            "amount": float(tx.get("tax_amount") or 0),
-            "rate": int(tx.get("rate") or 0),
-        })
-
-    payments = []
-    total_paid = 0.0
-    for p in doc.get("payments", []):
-        amt = float(p.get("amount") or 0)
-        total_paid += amt
-        payments.append({
-            "mode_of_payment": p.get("mode_of_payment") or "Payment",
-            "amount": amt,
-        })
-
-    branch_detail = {}
-    if doc.get("branch"):
-        try:
-            branch_doc = frappe.get_doc("Branch", doc.get("branch"))
-            branch_detail = branch_doc.as_dict()
-        except frappe.DoesNotExistError:
-            branch_detail = {}
-
-
-    grand_total = float(doc.get("rounded_total") or doc.get("grand_total") or 0)
-    change_amount = doc.get("change_amount")
-    if change_amount is None:
-        change_amount = max(0.0, total_paid - grand_total)
-
-    return {
-        "name": doc.get("name"),
-        "posting_date": str(doc.get("posting_date") or ""),
-        "posting_time": str(doc.get("posting_time") or ""),
-        "branch": doc.get("branch") or "",
-        "branch_detail": branch_detail, 
-        "company": doc.get("company") or "",
-        "customer": doc.get("customer") or "",
-        "customer_name": doc.get("customer_name") or "",
-        "order_type": doc.get("order_type") or "",
-        "queue": doc.get("queue") or "",
-        "currency": currency,
-        "total": float(doc.get("total") or 0),
-        "discount_for_bank": doc.get("discount_for_bank") or "",
-        "discount_name": doc.get("discount_name") or "",
-        "discount_amount": float(doc.get("discount_amount") or 0),
-        "total_taxes_and_charges": float(doc.get("total_taxes_and_charges") or 0),
-        "grand_total": float(doc.get("grand_total") or 0),
-        "rounded_total": float(doc.get("rounded_total") or 0),
-        "paid_amount": float(doc.get("paid_amount") or 0),
-        "change_amount": float(change_amount or 0),
-        "loyalty_points": doc.get("loyalty_points"),
-        "loyalty_amount": float(doc.get("loyalty_amount") or 0),
-        "remarks": (doc.get("remarks") or "").strip(),
-        "items": items,
-        "taxes": taxes,
-        "payments": payments,
-        "pos_profile": doc.get("pos_profile") or "",
-        "doc": doc,  # original doc kalau mau ambil field lain
-    }
+    """Ambil POS Invoice + items/payments/taxes dari InvoicePrintContext (memo per request)."""
+    return get_invoice_print_context(name).data
 
 # ========== Formatter Teks ke Baris ==========
 def _format_receipt_lines(data: Dict[str, Any]) -> List[str]:
@@ -413,78 +437,87 @@ def build_escpos_from_pos_invoice(name: str, add_qr: bool = False, qr_data: str
     data = _collect_pos_invoice(name)
     lines = _format_receipt_lines(data)
 
-    out = b""
-    out += _esc_init()
-    out += _esc_font_a()
-    out += _esc_align_left()
-    out += _esc_bold(False)
+    out = EscPosWriter()
+    out.init()
+    out.font_a()
+    out.align("left")
+    out.bold(False)
 
     # Header bold tengah utk judul toko & nomor invoice
     if data["company"]:
-        out += _esc_align_center() + _esc_bold(True)
-        for h in _wrap_text(data["company"], LINE_WIDTH):
-            out += (h + "\n").encode("ascii", "ignore")
-        out += _esc_bold(False)
+        out.align("center").bold(True)
+        out.wrap(data["company"])
+        out.bold(False)
 
     title = f"POS INVOICE {data['name'] or ''}".strip()
-    out += _esc_align_center() + _esc_bold(True) + (title + "\n").encode("ascii", "ignore") + _esc_bold(False)
-    out += _esc_align_left()
+    out.align("center").bold(True).line(title).bold(False)
+    out.align("left")
 
     for ln in lines:
-        out += (ln + "\n").encode("ascii", "ignore")
+        out.line(ln)
 
     # Tambah QR (opsional)
     if add_qr and qr_data:
-        out += _esc_align_center()
-        out += _esc_qr(qr_data)
-        out += _esc_align_left()
-        out += _esc_feed(1)
+        out.align("center")
+        out.qr(qr_data)
+        out.align("left")
+        out.feed(1)
 
     # Feed bawah + cut
-    out += _esc_feed(3) + _esc_cut_full()
-    return out
+    out.feed(3).cut()
+    return out.getvalue()
 
 # ========== CUPS RAW PRINT ==========
 def cups_print_raw(raw_bytes: bytes, printer_name: str) -> int:
     try:
-        import cups
-        conn = cups.Connection()
-        printers = conn.getPrinters()
-        if printer_name not in printers:
-            raise frappe.ValidationError(f"Printer '{printer_name}' tidak ditemukan di CUPS")
-
+        cups_conn = get_cups()
+        cups_conn.ensure_printer(printer_name)
 
         if printer_name == "Kasir":
-            # Kirim perintah buka laci
-            open_drawer_command = b'\x1B\x70\x00\x19\xFA'
-            with tempfile.NamedTemporaryFile(delete=False) as tmp:
-                tmp.write(open_drawer_command)
-                tmp_path_drawer = tmp.name
-            conn.printFile(printer_name, tmp_path_drawer, "Open Drawer", {"raw": "true"})
-            
-        with tempfile.NamedTemporaryFile(delete=False) as tmp:
-            tmp.write(raw_bytes)
-            tmp_path = tmp.name
-
-        job_id = conn.printFile(printer_name, tmp_path, "POS_Receipt", {"raw": "true"})
+            # Perintah buka laci ikut di awal job yang sama
+            raw_bytes = OPEN_DRAWER_COMMAND + raw_bytes
+
+        job_id = cups_conn.print_bytes(printer_name, raw_bytes, "POS_Receipt", {"raw": "true"})
         return job_id
     except Exception as e:
         frappe.log_error(frappe.get_traceback(), f"CUPS Print Error: {printer_name}")
         raise
 
-def get_item_printers(item: Dict) -> List[str]:
-    branch_menu = item.get("resto_menu")
-    if not branch_menu:
-        return []
-    doc = frappe.get_doc("Branch Menu", branch_menu)
-    printers = []
-    for ks in doc.get("printers") or []:
-        if ks.get("printer_name"):
-            printers.append(ks["printer_name"])
-    return printers
-
+def get_item_printers(item: Dict, branch: str | None = None) -> List[str]:
+    from resto.kitchen_routing import get_menu_printers
+
+    return [p["printer_name"] for p in get_menu_printers(branch, item.get("resto_menu"))]
+
+# ========== Flag cetak POS Invoice Item (bulk) ==========
+PRINT_FLAGS = ("is_print_kitchen", "is_checked", "is_void_printed")
+# Label jenis tiket untuk metrik update flag
+FLAG_TICKET_TYPES = {"is_print_kitchen": "Kitchen", "is_checked": "Checker", "is_void_printed": "Void"}
+
+def _check_print_flag(flag: str):
+    if flag not in PRINT_FLAGS:
+        frappe.throw(f"Flag cetak tidak dikenal: {flag}")
+
+@timed("flag", ticket_type=lambda args: FLAG_TICKET_TYPES.get(args["flag"]))
+def flag_items(names, flag: str) -> int:
+    """Satu UPDATE untuk set flag = 1 (pengganti loop set_value per baris)."""
+    _check_print_flag(flag)
+    names = list({n for n in names or [] if n})
+    if not names:
+        return 0
+
+    frappe.db.sql(f"""
+        UPDATE `tabPOS Invoice Item`
+        SET `{flag}` = 1, modified = %(now)s, modified_by = %(user)s
+        WHERE name IN %(names)s
+    """, {"names": names, "now": frappe.utils.now(), "user": frappe.session.user})
+    rowcount = frappe.db._cursor.rowcount
+    # Snapshot invoice di memo request sudah tidak sesuai flag terbaru
+    clear_invoice_print_context()
+    return rowcount
+
+@timed("build", ticket_type="Kitchen")
 def build_kitchen_receipt(data: Dict[str, Any], station_name: str, items: List[Dict], created_by=None) -> bytes:
-    out = b""
+    out = EscPosWriter()
 
     # ===== FILTER ITEM YANG BELUM PERNAH DI PRINT =====
     filtered_items = [
@@ -497,49 +530,31 @@ def build_kitchen_receipt(data: Dict[str, Any], station_name: str, items: List[D
     if not filtered_items:
         return b""
 
-    out += _esc_init()
-    out += _esc_font_a()
-    out += _esc_char_size(0, )
+    out.init()
+    out.font_a()
+    out.size(0, 0)
 
-    out += _esc_align_center() + _esc_bold(True)
-    out += (f"{station_name}\n").encode("ascii", "ignore")
-    out += _esc_bold(False) + _esc_align_left()
+    out.align("center").bold(True)
+    out.line(f"{station_name}")
+    out.bold(False).align("left")
 
-    out += (f"Invoice: {data['name']}\n").encode("ascii", "ignore")
-    out += (f"Tanggal: {data['posting_date']} {data['posting_time']}\n").encode("ascii", "ignore")
-    out += (f"Petugas: {created_by}\n").encode("ascii", "ignore")
+    out.line(f"Invoice: {data['name']}")
+    out.line(f"Tanggal: {data['posting_date']} {data['posting_time']}")
+    out.line(f"Petugas: {created_by}")
 
-    table_names = get_table_names_from_pos_invoice(data["name"])
+    ctx = get_invoice_print_context(data["name"])
+    table_names = ctx.table_names
     if table_names:
-        out += _esc_bold(True)
-        out += (f"Table: {table_names}\n").encode("ascii", "ignore")
-        out += _esc_bold(False)
-
-    out += (f"Purpose : {data['order_type']}\n").encode("ascii", "ignore")
-
-    out += _line("-").encode() + b"\n"
-
-    # ===== PREPARE MANDARIN MAP (HANYA ITEM YANG DI PRINT) =====
-    resto_menus = list(set([
-        i.get("resto_menu")
-        for i in filtered_items
-        if i.get("resto_menu")
-    ]))
+        out.bold(True)
+        out.line(f"Table: {table_names}")
+        out.bold(False)
 
-    mandarin_map = {}
+    out.line(f"Purpose : {data['order_type']}")
 
-    if resto_menus:
-        menu_data = frappe.get_all(
-            "Resto Menu",
-            filters={"name": ["in", resto_menus]},
-            fields=["name", "custom_mandarin_name"]
-        )
+    out.separator()
 
-        mandarin_map = {
-            d.name: d.custom_mandarin_name
-            for d in menu_data
-            if d.custom_mandarin_name
-        }
+    # ===== PREPARE MANDARIN MAP =====
+    mandarin_map = ctx.mandarin_map
 
     # ===== PRINT ITEM =====
     for it in filtered_items:
@@ -560,8 +575,7 @@ def build_kitchen_receipt(data: Dict[str, Any], station_name: str, items: List[D
         # else:
         line = f"{qty} x {item_name}"
 
-        for w in _wrap_text(line, LINE_WIDTH):
-            out += (w + "\n").encode("utf-8")
+        out.wrap(line, encoding="utf-8")
 
         # ===== ADD ONS =====
         add_ons_str = it.get("add_ons", "")
@@ -577,27 +591,25 @@ def build_kitchen_receipt(data: Dict[str, Any], station_name: str, items: List[D
 
                 add_line = f"  {name}"
 
-                for w in _wrap_text(add_line, LINE_WIDTH):
-                    out += (w + "\n").encode("utf-8")
+                out.wrap(add_line, encoding="utf-8")
 
         # ===== NOTES =====
         notes = it.get("quick_notes", "")
         if notes:
             note_line = f"  # {notes}"
 
-            for w in _wrap_text(note_line, LINE_WIDTH):
-                out += (w + "\n").encode("utf-8")
+            out.wrap(note_line, encoding="utf-8")
 
         # Spasi antar item
-        out += b"\n"
+        out.line("")
 
-    out += _line("-").encode() + b"\n"
+    out.separator()
 
-    out += _esc_char_size(0, 0)
-    out += _esc_feed(3)
-    out += _esc_cut_full()
+    out.size(0, 0)
+    out.feed(3)
+    out.cut()
 
-    return out
+    return out.getvalue()
 
 # ========== API: cetak sekarang (sync) ==========
 @frappe.whitelist()
@@ -621,7 +633,7 @@ def pos_invoice_print_now(name: str, printer_name: str, add_qr: int = 0, qr_data
 
         kitchen_groups: Dict[str, List[Dict]] = {}
         for it in data["items"]:
-            for printer in get_item_printers(it):
+            for printer in get_item_printers(it, data.get("branch")):
                 kitchen_groups.setdefault(printer, []).append(it)
 
         for kprinter, items in kitchen_groups.items():
@@ -644,14 +656,10 @@ def pos_invoice_print_now(name: str, printer_name: str, add_qr: int = 0, qr_data
             kitchen_job = cups_print_raw(raw_kitchen, kprinter)
 
             # ===== UPDATE STATUS PRINT =====
-            for it in items:
-                if int(it.get("is_print_kitchen") or 0) == 0:
-                    frappe.db.set_value(
-                        "POS Invoice Item",
-                        it.get("name"),
-                        "is_print_kitchen",
-                        1
-                    )
+            flag_items(
+                [it.get("name") for it in items if int(it.get("is_print_kitchen") or 0) == 0],
+                "is_print_kitchen"
+            )
 
             results.append({
                 "printer": kprinter,
@@ -679,61 +687,48 @@ def _fmt_qty(val: float | int) -> str:
 def _safe_str(v) -> str:
     return (v or "").strip()
 
-def _append_wrapped(out: bytes, text: str, indent: int = 0) -> bytes:
-    pad = " " * indent if indent > 0 else ""
-    for w in _wrap_text(text, LINE_WIDTH - indent):
-        out += (pad + w + "\n").encode("ascii", "ignore")
-    return out
-
+@timed("build", printer=lambda args: args["entry"].get("printer_name"), ticket_type="Kitchen")
 def build_kitchen_receipt_from_payload(entry: Dict[str, Any], title_prefix: str = "") -> bytes:
     printer_name = _safe_str(entry.get("printer_name")) or ""
     # # Daftar kata kunci untuk mendeteksi printer dot matrix
     # dotmatrix_keywords = ["U220", "BAR", "PANTRY", "DOT", "MATRIX", "EPSON"]
     # is_dotmatrix = any(kw in printer_name.upper() for kw in dotmatrix_keywords)
     
-    current_user = frappe.session.user
-    full_name = frappe.db.get_value("User", current_user, "full_name")
     station = _safe_str(entry.get("kitchen_station")) or "-"
     inv     = _safe_str(entry.get("pos_invoice")) or "-"
     tdate   = _safe_str(entry.get("transaction_date")) or frappe.utils.now_datetime().strftime("%Y-%m-%d %H:%M:%S")
     items = entry.get("items") or []
-    
-    resto_menus = list(set([i.get("resto_menu") for i in items if i.get("resto_menu")]))
-    mandarin_map = {}
-    if resto_menus:
-        menu_data = frappe.get_all(
-            "Resto Menu",
-            filters={"name": ["in", resto_menus]},
-            fields=["name", "custom_mandarin_name"]
-        )
-        mandarin_map = {d.name: d.custom_mandarin_name for d in menu_data if d.custom_mandarin_name}
 
-    out = b""
-    out += _esc_init()
-    out += _esc_font_a()
+    ctx = get_invoice_print_context(inv)
+    # Job dari print spooler membawa user pembuat tiket
+    full_name = ctx.created_by(entry.get("owner"))
+
+    out = EscPosWriter()
+    out.init()
+    out.font_a()
 
-    table_name = get_table_names_from_pos_invoice(inv)
+    table_name = ctx.table_names
 
     # HEADER
-    out += _esc_char_size_dotmatrix(3, 3) + _esc_bold(True) 
-    out += _esc_align_center() + _esc_bold(True)
-    out += (f"{station}\n").encode("ascii", "ignore")
-    out += _esc_bold(False) + _esc_align_left()
-    out += _esc_char_size_dotmatrix(0, 0)
-
-    out += _esc_char_size_dotmatrix(2, 2) + _esc_bold(True)   # double both (0x18)
-    out += (f"No Meja : {table_name}\n").encode("ascii", "ignore")
-    pax = get_total_pax_from_pos_invoice(inv)
+    out.size_dotmatrix(3, 3).bold(True)
+    out.align("center").bold(True)
+    out.line(f"{station}")
+    out.bold(False).align("left")
+    out.size_dotmatrix(0, 0)
+
+    out.size_dotmatrix(2, 2).bold(True)  # double both (0x18)
+    out.line(f"No Meja : {table_name}")
+    pax = ctx.total_pax
     if pax:
         pax_int = int(pax) if isinstance(pax, (int, float)) else pax
-        out += _esc_bold(True)
-        out += (f"Pax     : {pax_int}\n").encode("ascii", "ignore")
-        out += _esc_bold(False)
-    out += _esc_char_size_dotmatrix(0, 0)
+        out.bold(True)
+        out.line(f"Pax     : {pax_int}")
+        out.bold(False)
+    out.size_dotmatrix(0, 0)
 
-    out += (f"Tanggal : {tdate}\n").encode("ascii", "ignore")
-    out += (f"Petugas : {full_name}\n").encode("ascii", "ignore")
-    out += (_line("-") + "\n").encode("ascii", "ignore")
+    out.line(f"Tanggal : {tdate}")
+    out.line(f"Petugas : {full_name}")
+    out.separator()
 
     # ITEMS
     for it in items:
@@ -750,21 +745,21 @@ def build_kitchen_receipt_from_payload(entry: Dict[str, Any], title_prefix: str
 
         # Pilih ukuran font berdasarkan jenis printer
         # if is_dotmatrix:
-        out += _esc_char_size_dotmatrix(3, 3) + _esc_bold(True)   # double both (0x18)
+        out.size_dotmatrix(3, 3).bold(True)  # double both (0x18)
         # else:
             # out += _esc_char_size(1, 6) + _esc_bold(True)             # tinggi 6x untuk thermal
 
         big_line = _fit(display_line, LINE_WIDTH)
-        out += (big_line + "\n").encode("ascii", "ignore")
+        out.line(big_line)
 
         # Reset ukuran dan bold
         # if is_dotmatrix:
-        out += _esc_bold(False) + _esc_char_size_dotmatrix(1, 1)  # normal
+        out.bold(False).size_dotmatrix(1, 1)  # normal
         # else:
         #     out += _esc_bold(False) + _esc_char_size(0, 0)            # normal
 
         # Add-ons
-        out += _esc_char_size_dotmatrix(2, 3)
+        out.size_dotmatrix(2, 3)
         add_ons_str = it.get("add_ons", "")
         if add_ons_str:
             add_ons_list = [a.strip() for a in add_ons_str.split(",")]
@@ -774,27 +769,26 @@ def build_kitchen_receipt_from_payload(entry: Dict[str, Any], title_prefix: str
                     price = price.replace(")", "").strip()
                     name = name.strip()
                     add_line = f"  {name}".ljust(LINE_WIDTH - 12)
-                    out += (add_line + "\n").encode("ascii", "ignore")
+                    out.line(add_line)
                 else:
-                    out += (f"  {add}\n").encode("ascii", "ignore")
+                    out.line(f"  {add}")
 
         # Notes
         notes = it.get("quick_notes", "")
         if notes:
-            out += (f"  # {notes}\n").encode("ascii", "ignore")
+            out.line(f"  # {notes}")
 
-        out += b"\n"  # spacer antar item
-        out += _esc_char_size_dotmatrix(1, 1)
+        out.line("")  # spacer antar item
+        out.size_dotmatrix(1, 1)
 
-    out += (_line("-") + "\n").encode("ascii", "ignore")
-    out += _esc_feed(5)
-    out += _esc_cut_full()
-    return out
+    out.separator()
+    out.feed(5)
+    out.cut()
+    return out.getvalue()
 
 @frappe.whitelist()
 def kitchen_print_from_payload(payload, title_prefix: str = "") -> dict:
     import json
-    import cups
     try:
         # ===== NORMALIZE PAYLOAD =====
         if isinstance(payload, list):
@@ -810,8 +804,7 @@ def kitchen_print_from_payload(payload, title_prefix: str = "") -> dict:
         else:
             raise TypeError(f"payload bertipe {type(payload).__name__} tidak didukung")
 
-        conn = cups.Connection()
-        printers = conn.getPrinters()
+        cups_conn = get_cups()
 
         results = []
         for entry in entries:
@@ -823,10 +816,7 @@ def kitchen_print_from_payload(payload, title_prefix: str = "") -> dict:
             if not printer_name:
                 raise ValueError("Setiap entry wajib memiliki 'printer_name'")
 
-            if printer_name not in printers:
-                raise frappe.ValidationError(
-                    f"Printer '{printer_name}' tidak ditemukan di CUPS"
-                )
+            cups_conn.ensure_printer(printer_name)
 
             entry.setdefault("transaction_date", frappe.utils.now_datetime().strftime("%Y-%m-%d %H:%M:%S"))
             entry.setdefault("items", [])
@@ -864,29 +854,15 @@ def kitchen_print_from_payload(payload, title_prefix: str = "") -> dict:
                 })
                 continue
 
-            # ===== WRITE TEMP FILE =====
-            with tempfile.NamedTemporaryFile(delete=False) as tmp:
-                tmp.write(raw)
-                tmp_path = tmp.name
-
-            # ===== PRINT KE CUPS =====
-            job_id = conn.printFile(
+            # ===== PRINT KE CUPS (tanpa temp file) =====
+            job_id = cups_conn.print_bytes(
                 printer_name,
-                tmp_path,
+                raw,
                 f"KITCHEN_{station}_{pos_invoice}",
                 {"raw": "true"}
             )
 
-            # ===== UPDATE STATUS PRINT UNTUK SEMUA ITEM =====
-            for item in items_to_print:
-                if item.get("name"):
-                    frappe.db.set_value(
-                        "POS Invoice Item",
-                        item.get("name"),
-                        "is_print_kitchen",
-                        1
-                    )
-            frappe.db.commit()
+            # is_print_kitchen di-set pemanggil lewat ledger, setelah semua station tercetak
 
             # ===== LOG PRINT =====
             frappe.logger("pos_print").info({
@@ -943,272 +919,119 @@ def format_number(val) -> str:
 # function print bill
 
 def get_table_names_from_pos_invoice(pos_invoice_name: str) -> str:
-    tables = frappe.get_all(
-        "Table Order",
-        filters={"invoice_name": pos_invoice_name},
-        fields=["parent"],
-        distinct=True
-    )
-
-    return ", ".join([t["parent"] for t in tables])
+    return get_invoice_print_context(pos_invoice_name).table_names
 
 def get_total_pax_from_pos_invoice(pos_invoice_name: str) -> int:
-    table_orders = frappe.get_all(
-        "Table Order",
-        filters={"invoice_name": pos_invoice_name},
-        fields=["parent"]
-    )
-
-    total_pax = 0
-    for t in table_orders:
-        pax = frappe.db.get_value("Table", t["parent"], "pax") or 0
-        total_pax += pax
-    return total_pax
+    return get_invoice_print_context(pos_invoice_name).total_pax
 
 
 def get_waiter_name(pos_invoice_name: str) -> str:
-    invoice = frappe.get_doc("POS Invoice", pos_invoice_name)
-    owner = invoice.owner
-    user = frappe.get_doc("User", owner)
-    return user.full_name or owner  
+    return get_invoice_print_context(pos_invoice_name).waiter_name
 
 def get_cashier_name(pos_invoice_name: str) -> str:
-    # Ambil POS Invoice
-    invoice = frappe.get_doc("POS Invoice", pos_invoice_name)
-    
-    # Ambil POS Profile dari invoice
-    pos_profile_name = invoice.pos_profile
-    pos_profile = frappe.get_doc("POS Profile", pos_profile_name)
-
-    # Cari POS Opening Entry yang masih "Open" untuk POS Profile ini
-    opening_entries = frappe.get_all(
-        "POS Opening Entry",
-        filters={
-            "pos_profile": pos_profile.name,
-            "status": "Open",  # Hanya yang sedang aktif
-            "docstatus": 1
-        },
-        fields=["user", "name"],
-        order_by="creation desc",
-        limit_page_length=1
-    )
+    # User POS Opening Entry yang masih Open, fallback owner invoice
+    return get_invoice_print_context(pos_invoice_name).cashier_name
 
-    if opening_entries:
-        opening_user = opening_entries[0].user
-        user_doc = frappe.get_doc("User", opening_user)
-        return user_doc.full_name or opening_user
+# ========== Header Bill / Receipt (cache) ==========
+# Byte header (nama company, alamat, telepon) per (company, branch). Alamat
+# jarang berubah, jadi bill/receipt cukup satu HGET tanpa query dan encode.
+PRINT_HEADER_CACHE_KEY = "resto_print_header"
 
-    # fallback: jika tidak ada POS Opening Entry aktif, pakai owner invoice
-    owner_user_doc = frappe.get_doc("User", invoice.owner)
-    return owner_user_doc.full_name or invoice.owner
 
-def build_escpos_bill(name: str) -> bytes:
-    data = _collect_pos_invoice(name)
+def _print_header_key(company: str, branch: str, width: int) -> str:
+    return f"{company}::{branch}::{width}"
 
-    items = data.get("items", [])
-    payments = data.get("payments", [])
-    taxes = data.get("taxes", [])
 
-    company = data.get("company") or ""
-    order_type = data.get("order_type") or ""
-    customer = data.get("customer_name") or data.get("customer") or ""
-    total = data.get("total", 0)
-    discount_for_bank = data.get("discount_for_bank", "")
-    discount_name = data.get("discount_name", "")
-    discount = data.get("discount_amount", 0)
-    tax_total = data.get("total_taxes_and_charges", 0)
-    grand_total = data.get("grand_total", 0)
-    paid = data.get("paid_amount", 0)
-    change = data.get("change_amount", 0)
-    queue_no = data.get("queue") or ""
-    branch = data.get("branch") or ""
-    branch_detail = data.get("branch_detail") or {}
-
-    address1 = branch_detail.get("address_line1") or ""
-    address2 = branch_detail.get("address_line2") or ""
-    city = branch_detail.get("city") or ""
-    pincode = branch_detail.get("pincode") or ""
-    phone = branch_detail.get("phone") or ""
-    
-    # Ambil alamat utama Company
-    address1 = address2 = city = pincode = phone = ""
-
-    if company:
-        addr_links = frappe.get_all(
-            "Dynamic Link",
-            filters={"link_doctype": "Company", "link_name": company},
-            fields=["parent"],
-            order_by="creation asc"
-        )
-
-        if addr_links:
-            address_doc = frappe.get_doc("Address", addr_links[0].parent)
-            address1 = address_doc.address_line1 or ""
-            address2 = address_doc.address_line2 or ""
-            city = address_doc.city or ""
-            pincode = address_doc.pincode or ""
-            phone = address_doc.phone or ""
-
-    # Hitung total qty semua items
-    total_qty = sum(int(item.get("qty", 0)) for item in items)
+def build_print_header(company: str, branch: str = "", width: int = LINE_WIDTH) -> bytes:
+    address = get_company_address(company)
+    city = address.get("city") or ""
 
-    # Format waktu cetak
-    print_time = now_datetime().strftime("%d/%m/%Y %H:%M")
-    
-    # ===== PREPARE MANDARIN MAP =====
-    resto_menus = list(set([
-        i.get("resto_menu")
-        for i in items
-        if i.get("resto_menu")
-    ]))
-
-    mandarin_map = {}
-    
-    if resto_menus:
-        menu_data = frappe.get_all(
-            "Resto Menu",
-            filters={"name": ["in", resto_menus]},
-            fields=["name", "custom_mandarin_name"]
-        )
-        mandarin_map = {
-            d.name: d.custom_mandarin_name
-            for d in menu_data
-        }
-
-    separator = "-" * LINE_WIDTH
-
-    out = b""
-    out += _esc_init()
-    out += _esc_font_a()
-
-    # ===== HEADER =====
-    out += _esc_align_center() + _esc_bold(True)
+    out = EscPosWriter(width=width)
+    out.init()
+    out.font_a()
+    out.align("center").bold(True)
 
     # Nama company + city
     company_city_line = f"{company} {city}".strip()
     if company_city_line:
-        out += (company_city_line + "\n").encode("ascii", "ignore")
+        out.line(company_city_line)
 
     # Alamat lengkap
-    if address1:
-        out += (address1 + "\n").encode("ascii", "ignore")
-    if address2:
-        out += (address2 + "\n").encode("ascii", "ignore")
-    if phone:
-        out += (f"Tlp. {phone}\n").encode("ascii", "ignore")
-
-    # if company or branch:
-    #     header_line = f"{company}"
-    #     if branch:
-    #         header_line += f" - {branch}"
-    #     out += (header_line + "\n").encode("ascii", "ignore")
-
-    out += _esc_bold(False)
-
-    # Alamat branch
-    # if address1 or address2 or city or pincode or phone:
-    #     out += _esc_align_center()
-    #     if address1:
-    #         out += (f"{address1}\n").encode("ascii", "ignore")
-    #     if address2:
-    #         out += (f"{address2}\n").encode("ascii", "ignore")
-    #     if city or pincode:
-    #         out += (f"{city} - {pincode}\n").encode("ascii", "ignore")
-    #     if phone:
-    #         out += (f"Phone: {phone}\n").encode("ascii", "ignore")
-
-
-    out += _esc_align_left()
-    out += (separator + "\n").encode("ascii", "ignore")
+    if address.get("address_line1"):
+        out.line(address["address_line1"])
+    if address.get("address_line2"):
+        out.line(address["address_line2"])
+    if address.get("phone"):
+        out.line(f"Tlp. {address['phone']}")
 
-    # ===== INFORMASI INVOICE =====
-    out += (f"No : {data['name']}\n").encode("ascii", "ignore")
-    out += (f"Date : {print_time}\n").encode("ascii", "ignore")
+    out.bold(False)
+    out.align("left")
+    out.separator()
+    return out.getvalue()
 
-    # Nama table
-    table_names = get_table_names_from_pos_invoice(data["name"])
-    if table_names:
-        out += _esc_bold(True)
-        out += (f"Table: {table_names}\n").encode("ascii", "ignore")
-        out += _esc_bold(False)
 
-    out += (f"Purpose : {order_type}\n").encode("ascii", "ignore")
-    pax = get_total_pax_from_pos_invoice(data["name"])
-    if pax:
-        pax_int = int(pax) if isinstance(pax, (int, float)) else pax
-        out += _esc_bold(True)
-        out += (f"Pax : {pax_int}\n").encode("ascii", "ignore")
-        out += _esc_bold(False)
+def get_print_header(company: str, branch: str = "", width: int = LINE_WIDTH) -> bytes:
+    key = _print_header_key(company, branch, width)
+    cache = frappe.cache()
 
+    header = cache.hget(PRINT_HEADER_CACHE_KEY, key)
+    if header is None:
+        header = build_print_header(company, branch, width)
+        cache.hset(PRINT_HEADER_CACHE_KEY, key, header)
+    return header
 
-    # Nama kasir
-    # cashier_name = get_cashier_name(data["name"])
-    cashier_name = get_waiter_name(data["name"])
-    out += (f"Cashier : {cashier_name}\n").encode("ascii", "ignore")
 
-    # Customer
-    if customer:
-        out += (f"Customer: {customer}\n").encode("ascii", "ignore")
+def invalidate_print_header(doc=None, method=None, *args, **kwargs):
+    """doc_events Address/Branch/Company: buang semua header setelah commit (jarang terjadi)."""
+    frappe.db.after_commit.add(lambda: frappe.cache().delete_value(PRINT_HEADER_CACHE_KEY))
 
-    out += (separator + "\n").encode("ascii", "ignore")
 
-    # ===== ITEMS =====
-    for item in items:
+# ========== Layout Bill / Receipt ==========
+# Urutan dan visibilitas bagian tiket diatur template per branch
+# (resto.ticket_layout); fungsi di bawah mengisi bagian yang butuh loop.
+def _section_header(out: EscPosWriter, ctx, ticket_type: str):
+    data = ctx.data
+    out += get_print_header(data.get("company") or "", data.get("branch") or "", out.width)
+
+
+def _section_items(out: EscPosWriter, ctx, ticket_type: str):
+    width = out.width
+    # Bill menampilkan nama utf-8 + add-on tanpa harga; receipt hanya add-on berharga
+    is_bill = ticket_type == "Bill"
+
+    for item in ctx.data.get("items", []):
         if item.get("status_kitchen") == "Void Menu":
             continue
-        
+
         item_name = (item.get("short_name") or "").strip()
         qty = int(item.get("qty") or 0)
         rate = float(item.get("rate") or 0)
         amount = qty * rate
-        resto_menu = item.get("resto_menu")
-
-        # mandarin_name = mandarin_map.get(resto_menu) or ""
-
-        # # ===== NAMA ITEM =====
-        # if mandarin_name:
-        #     display_name = f"{item_name} ({mandarin_name})"
-        # else:
-        display_name = item_name
 
-        out += (display_name + "\n").encode("utf-8")
+        out.line(item_name, "utf-8" if is_bill else "ascii")
 
         # ===== BARIS HARGA =====
-        left_part = f"{qty}x @{format_number(rate)}"
-        right_part = format_number(amount)
-
-        line = left_part.ljust(LINE_WIDTH - 12) + right_part.rjust(12)
-        out += (line + "\n").encode("ascii", "ignore")
+        out.line(f"{qty}x @{format_number(rate)}".ljust(width - 12) + format_number(amount).rjust(12))
 
         # ===== ADD ONS =====
         add_ons_str = item.get("add_ons") or ""
-        if add_ons_str:
-            add_ons_list = [a.strip() for a in add_ons_str.split(",") if a.strip()]
-            for add in add_ons_list:
-                if "(" in add and ")" in add:
-                    name, price = add.rsplit("(", 1)
-                    price = price.replace(")", "").strip()
-                    name = name.strip()
-                    add_line = f"  {name}".ljust(LINE_WIDTH - 12) + \
-                            f"{format_number(float(price)).rjust(12)}"
-                    out += (add_line + "\n").encode("ascii", "ignore")
-                else:
-                    out += (f"  {add}\n").encode("utf-8")
+        for add in [a.strip() for a in add_ons_str.split(",") if a.strip()]:
+            if "(" in add and ")" in add:
+                add_name, price = add.rsplit("(", 1)
+                price = price.replace(")", "").strip()
+                out.line(f"  {add_name.strip()}".ljust(width - 12) + format_number(float(price)).rjust(12))
+            elif is_bill:
+                out.line(f"  {add}", "utf-8")
 
-        # ===== NOTES =====
-        # notes = (item.get("quick_notes") or "").strip()
-        # if notes:
-        #     out += (f"  # {notes}\n").encode("utf-8")
 
-    # ===== TOTAL QTY =====
-    out += (separator + "\n").encode("ascii", "ignore")
-    # out += (f"{total_qty} items\n").encode("ascii", "ignore")
+def _section_totals(out: EscPosWriter, ctx, ticket_type: str):
+    data = ctx.data
+    discount = data.get("discount_amount", 0)
+    discount_name = data.get("discount_name", "")
 
-    # ===== TOTALS =====
     sc_amount = 0
     tax_amount = 0
-
-    for tax in taxes:
+    for tax in data.get("taxes", []):
         tax_name = tax.get("description", "")
         amount = tax.get("amount", 0)
 
@@ -1217,65 +1040,100 @@ def build_escpos_bill(name: str) -> bytes:
         elif "VAT" in tax_name:
             tax_amount += amount
 
-    out += (_format_line(f"Total Item:", format_number(total)) + "\n").encode("ascii", "ignore")
-    
+    out.lr("Total Item:", format_number(data.get("total", 0)))
+
     if discount:
-        if discount_name:
-            label = f"Discount {discount_name}"
-        else:
-            label = "Discount"
+        label = f"Discount {discount_name}" if discount_name else "Discount"
+        out.lr(f"{label}:", f"-{format_number(discount)}")
 
-        out += (_format_line(f"{label}:", f"-{format_number(discount)}") + "\n").encode("ascii", "ignore")
-        
     if sc_amount:
-        out += (_format_line("Sc:", format_number(sc_amount)) + "\n").encode("ascii", "ignore")
+        out.lr("Sc:", format_number(sc_amount))
 
     if tax_amount:
-        out += (_format_line("Tax:", format_number(tax_amount)) + "\n").encode("ascii", "ignore")
-    
-    out += (separator + "\n").encode("ascii", "ignore")
-    out += _esc_bold(True)
-    out += (_format_line("Total:", format_number(grand_total)) + "\n").encode("ascii", "ignore")
-    out += _esc_bold(False)
+        out.lr("Tax:", format_number(tax_amount))
 
+    out.separator()
+    out.bold(True)
+    out.lr("Total:", format_number(data.get("grand_total", 0)))
+    out.bold(False)
 
-    # ===== PAYMENT =====
-    # for pay in payments:
-    #     mop = pay.get("mode_of_payment") or "-"
-    #     amt = pay.get("amount") or 0
-    #     out += (f"{mop}:".rjust(LINE_WIDTH - 12) + f"{format_number(amt).rjust(12)}\n").encode("ascii", "ignore")
 
-    # if change:
-    #     out += (f"Change:".rjust(LINE_WIDTH - 12) + f"{format_number(change).rjust(12)}\n").encode("ascii", "ignore")
+def _section_payments(out: EscPosWriter, ctx, ticket_type: str):
+    for pay in ctx.data.get("payments", []):
+        mop = pay.get("mode_of_payment") or "-"
+        amt = pay.get("amount") or 0
+        out.line(f"{mop}:".rjust(out.width - 12) + format_number(amt).rjust(12))
 
-    # ===== FOOTER =====
-    out += (separator + "\n").encode("ascii", "ignore")
-    out += _esc_align_center()
-    out += b"Terima kasih!\n"
-    out += b"Selamat menikmati hidangan Anda!\n"
 
-    # ===== QUEUE NUMBER (Take Away) =====
-    order_type_value = (order_type or "").lower()
-    if order_type_value in ["take away", "takeaway"]:
-        queue_no = data.get("queue") or ""
-        if queue_no:
-            out += _esc_feed(2)
-            out += _esc_align_center()
-            out += _esc_bold(True)
-            out += b"Your Queue Number:\n"
-            out += _esc_bold(False)
+def _section_queue(out: EscPosWriter, ctx, ticket_type: str):
+    # Nomor antrian hanya untuk Take Away
+    data = ctx.data
+    queue_no = data.get("queue") or ""
+    if (data.get("order_type") or "").lower() not in ["take away", "takeaway"] or not queue_no:
+        return
+
+    out.feed(2)
+    out.align("center")
+    out.bold(True)
+    out.line("Your Queue Number:")
+    out.bold(False)
+
+    # --- Font besar + center untuk nomor antrian ---
+    out.align("center")
+    out += b"\x1b!\x38"                 # ESC ! 56 → double height & width
+    out.line(f"{queue_no}")
+    out += b"\x1b!\x00"                 # reset font ke normal
+    out.feed(2)
+
+
+TICKET_SECTIONS = {
+    "header": _section_header,
+    "items": _section_items,
+    "totals": _section_totals,
+    "payments": _section_payments,
+    "queue": _section_queue,
+}
+
+# Field template -> nilai (lazy: hanya field yang dipakai plan yang dihitung)
+TICKET_VALUES = {
+    "name": lambda ctx: ctx.data["name"],
+    "print_time": lambda ctx: now_datetime().strftime("%d/%m/%Y %H:%M"),
+    "posting_date": lambda ctx: ctx.data["posting_date"],
+    "posting_time": lambda ctx: ctx.data["posting_time"],
+    "company": lambda ctx: ctx.data["company"],
+    "branch": lambda ctx: ctx.data["branch"],
+    "order_type": lambda ctx: ctx.data["order_type"],
+    "customer": lambda ctx: ctx.data["customer_name"] or ctx.data["customer"],
+    "queue": lambda ctx: ctx.data["queue"],
+    "table_names": lambda ctx: ctx.table_names,
+    "pax": lambda ctx: int(ctx.total_pax or 0),
+    "waiter": lambda ctx: ctx.waiter_name,
+    "cashier": lambda ctx: ctx.cashier_name,
+}
+
+
+@timed("build", ticket_type=lambda args: args["ticket_type"])
+def build_invoice_ticket(name: str, ticket_type: str) -> bytes:
+    """Render Bill/Receipt invoice dengan layout branch (lebar kolom + template)."""
+    ctx = get_invoice_print_context(name)
+    width, plan = get_ticket_plan(ctx.data.get("branch"), ticket_type)
+
+    values = {}
+    for field in plan.fields:
+        getter = TICKET_VALUES.get(field)
+        if getter is None:
+            value = ctx.data.get(field)
+            values[field] = "" if value is None or isinstance(value, (dict, list)) else value
+        else:
+            values[field] = getter(ctx)
 
-            # --- Font besar + center untuk nomor antrian ---
-            out += _esc_align_center()          # pastikan tetap di tengah
-            out += b"\x1b!\x38"                 # ESC ! 56 → double height & width
-            out += f"{queue_no}\n".encode("ascii", "ignore")
-            out += b"\x1b!\x00"                 # reset font ke normal
-            out += _esc_feed(2)
+    out = EscPosWriter(width=width)
+    render(plan, out, values, TICKET_SECTIONS, ctx, ticket_type)
+    return out.getvalue()
 
 
-    # Feed bawah + cut
-    out += _esc_feed(8) + _esc_cut_full()
-    return out
+def build_escpos_bill(name: str) -> bytes:
+    return build_invoice_ticket(name, "Bill")
 
 def _enqueue_bill_worker(name: str, printer_name: str):
     raw = build_escpos_bill(name)
@@ -1291,222 +1149,7 @@ def _enqueue_bill_worker(name: str, printer_name: str):
     return job_id
 
 def build_escpos_receipt(name: str) -> bytes:
-    data = _collect_pos_invoice(name)
-
-    items = data.get("items", [])
-    payments = data.get("payments", [])
-    taxes = data.get("taxes", [])
-
-    company = data.get("company") or ""
-    order_type = data.get("order_type") or ""
-    customer = data.get("customer_name") or data.get("customer") or ""
-    total = data.get("total", 0)
-    discount_for_bank = data.get("discount_for_bank", "")
-    discount_name = data.get("discount_name", "")
-    discount = data.get("discount_amount", 0)
-    tax_total = data.get("total_taxes_and_charges", 0)
-    grand_total = data.get("grand_total", 0)
-    paid = data.get("paid_amount", 0)
-    change = data.get("change_amount", 0)
-    queue_no = data.get("queue") or ""
-    branch = data.get("branch") or ""
-    branch_detail = data.get("branch_detail") or {}
-
-    address1 = branch_detail.get("address_line1") or ""
-    address2 = branch_detail.get("address_line2") or ""
-    city = branch_detail.get("city") or ""
-    pincode = branch_detail.get("pincode") or ""
-    phone = branch_detail.get("phone") or ""
-    
-    # Ambil alamat utama Company
-    address1 = address2 = city = pincode = phone = ""
-
-    if company:
-        addr_links = frappe.get_all(
-            "Dynamic Link",
-            filters={"link_doctype": "Company", "link_name": company},
-            fields=["parent"],
-            order_by="creation asc"
-        )
-
-        if addr_links:
-            address_doc = frappe.get_doc("Address", addr_links[0].parent)
-            address1 = address_doc.address_line1 or ""
-            address2 = address_doc.address_line2 or ""
-            city = address_doc.city or ""
-            pincode = address_doc.pincode or ""
-            phone = address_doc.phone or ""
-
-    # Hitung total qty semua items
-    total_qty = sum(int(item.get("qty", 0)) for item in items)
-
-    # Format waktu cetak
-    print_time = now_datetime().strftime("%d/%m/%Y %H:%M")
-
-    separator = "-" * LINE_WIDTH
-
-    out = b""
-    out += _esc_init()
-    out += _esc_font_a()
-
-    # ===== HEADER =====
-    logo = frappe.db.get_value("Company", company, "custom_company_logo") or frappe.db.get_value("Company", company, "company_logo")
-    out += _esc_align_center() + _esc_bold(True)
-
-    # Nama company + city
-    company_city_line = f"{company} {city}".strip()
-    if company_city_line:
-        out += (company_city_line + "\n").encode("ascii", "ignore")
-
-    # Alamat lengkap
-    if address1:
-        out += (address1 + "\n").encode("ascii", "ignore")
-    if address2:
-        out += (address2 + "\n").encode("ascii", "ignore")
-    if phone:
-        out += (f"Tlp. {phone}\n").encode("ascii", "ignore")
-
-    out += _esc_bold(False)
-    out += _esc_align_left()
-    out += (separator + "\n").encode("ascii", "ignore")
-
-    # ===== INFORMASI INVOICE =====
-    out += (f"No : {data['name']}\n").encode("ascii", "ignore")
-    out += (f"Date : {print_time}\n").encode("ascii", "ignore")
-
-    # Nama table
-    table_names = get_table_names_from_pos_invoice(data["name"])
-    if table_names:
-        out += _esc_bold(True)
-        out += (f"Table: {table_names}\n").encode("ascii", "ignore")
-        out += _esc_bold(False)
-
-    out += (f"Purpose : {order_type}\n").encode("ascii", "ignore")
-    pax = get_total_pax_from_pos_invoice(data["name"])
-    if pax:
-        pax_int = int(pax) if isinstance(pax, (int, float)) else pax
-        out += _esc_bold(True)
-        out += (f"Pax : {pax_int}\n").encode("ascii", "ignore")
-        out += _esc_bold(False)
-
-
-    # Nama kasir
-    cashier_name = get_cashier_name(data["name"])
-    out += (f"Cashier : {cashier_name}\n").encode("ascii", "ignore")
-
-    # Customer
-    if customer:
-        out += (f"Customer: {customer}\n").encode("ascii", "ignore")
-
-    out += (separator + "\n").encode("ascii", "ignore")
-
-    # ===== ITEMS =====
-    for item in items:
-        if item.get("status_kitchen") == "Void Menu":
-            continue
-        
-        item_name = item.get("short_name", "")
-        qty = int(item.get("qty", 0))
-        rate = item.get("rate", 0)
-        amount = rate * qty
-
-        # Item utama
-        out += (f"{item_name}\n").encode("ascii", "ignore")
-        line = f"{qty}x @{format_number(rate)}".ljust(LINE_WIDTH - 12) + f"{format_number(amount).rjust(12)}"
-        out += (line + "\n").encode("ascii", "ignore")
-
-        # Add-ons
-        add_ons_str = item.get("add_ons", "")
-        if add_ons_str:
-            add_ons_list = [a.strip() for a in add_ons_str.split(",")]
-            for add in add_ons_list:
-                if "(" in add and ")" in add:
-                    name, price = add.rsplit("(", 1)
-                    price = price.replace(")", "").strip()
-                    name = name.strip()
-                    add_line = f"  {name}".ljust(LINE_WIDTH - 12) + f"{format_number(float(price)).rjust(12)}"
-                    out += (add_line + "\n").encode("ascii", "ignore")
-
-        # Notes
-        # notes = item.get("quick_notes", "")
-        # if notes:
-        #     out += (f"  # {notes}\n").encode("ascii", "ignore")
-
-    # ===== TOTAL QTY =====
-    out += (separator + "\n").encode("ascii", "ignore")
-    # out += (f"{total_qty} items\n").encode("ascii", "ignore")
-
-    # ===== TOTALS =====
-    sc_amount = 0
-    tax_amount = 0
-
-    for tax in taxes:
-        tax_name = tax.get("description", "")
-        amount = tax.get("amount", 0)
-
-        if "Pendapatan Service" in tax_name:
-            sc_amount += amount
-        elif "VAT" in tax_name:
-            tax_amount += amount
-
-    out += (_format_line(f"Total Item:", format_number(total)) + "\n").encode("ascii", "ignore")
-    
-    if discount:
-        if discount_name:
-            label = f"Discount {discount_name}"
-        else:
-            label = "Discount"
-
-        out += (_format_line(f"{label}:", f"-{format_number(discount)}") + "\n").encode("ascii", "ignore")
-            
-    if sc_amount:
-        out += (_format_line("Sc:", format_number(sc_amount)) + "\n").encode("ascii", "ignore")
-
-    if tax_amount:
-        out += (_format_line("Tax:", format_number(tax_amount)) + "\n").encode("ascii", "ignore")
-    
-    out += (separator + "\n").encode("ascii", "ignore")
-    out += _esc_bold(True)
-    out += (_format_line("Total:", format_number(grand_total)) + "\n").encode("ascii", "ignore")
-    out += _esc_bold(False)
-    
-    # ===== PAYMENT =====
-    for pay in payments:
-        mop = pay.get("mode_of_payment") or "-"
-        amt = pay.get("amount") or 0
-        out += (f"{mop}:".rjust(LINE_WIDTH - 12) + f"{format_number(amt).rjust(12)}\n").encode("ascii", "ignore")
-
-    # if change:
-    #     out += (f"Change:".rjust(LINE_WIDTH - 12) + f"{format_number(change).rjust(12)}\n").encode("ascii", "ignore")
-
-    # ===== FOOTER =====
-    out += (separator + "\n").encode("ascii", "ignore")
-    out += _esc_align_center()
-    out += b"Terima kasih!\n"
-    out += b"Selamat menikmati hidangan Anda!\n"
-
-    # ===== QUEUE NUMBER (Take Away) =====
-    order_type_value = (order_type or "").lower()
-    if order_type_value in ["take away", "takeaway"]:
-        queue_no = data.get("queue") or ""
-        if queue_no:
-            out += _esc_feed(2)
-            out += _esc_align_center()
-            out += _esc_bold(True)
-            out += b"Your Queue Number:\n"
-            out += _esc_bold(False)
-
-            # --- Font besar + center untuk nomor antrian ---
-            out += _esc_align_center()          # pastikan tetap di tengah
-            out += b"\x1b!\x38"                 # ESC ! 56 → double height & width
-            out += f"{queue_no}\n".encode("ascii", "ignore")
-            out += b"\x1b!\x00"                 # reset font ke normal
-            out += _esc_feed(2)
-
-
-    # Feed bawah + cut
-    out += _esc_feed(8) + _esc_cut_full()
-    return out
+    return build_invoice_ticket(name, "Receipt")
 
 def _enqueue_receipt_worker(name: str, printer_name: str):
     raw = build_escpos_receipt(name)
@@ -1521,8 +1164,10 @@ def _enqueue_receipt_worker(name: str, printer_name: str):
 
     return job_id
 
+@timed("build", ticket_type="Checker")
 def build_escpos_checker(name: str) -> bytes:
-    data = _collect_pos_invoice(name)
+    ctx = get_invoice_print_context(name)
+    data = ctx.data
 
     items = sanitize_kitchen_payload([
         item for item in data.get("items", [])
@@ -1566,62 +1211,45 @@ def build_escpos_checker(name: str) -> bytes:
     print_time = now_datetime().strftime("%d/%m/%Y %H:%M")
     
     # ===== PREPARE MANDARIN MAP =====
-    resto_menus = list(set([
-        i.get("resto_menu")
-        for i in items
-        if i.get("resto_menu")
-    ]))
-
-    mandarin_map = {}
-    
-    if resto_menus:
-        menu_data = frappe.get_all(
-            "Resto Menu",
-            filters={"name": ["in", resto_menus]},
-            fields=["name", "custom_mandarin_name"]
-        )
-        mandarin_map = {
-            d.name: d.custom_mandarin_name
-            for d in menu_data
-        }
+    mandarin_map = ctx.mandarin_map
 
     separator = "-" * LINE_WIDTH
 
-    out = b""
-    out += _esc_init()
-    out += _esc_font_a()
+    out = EscPosWriter()
+    out.init()
+    out.font_a()
 
     # ===== HEADER =====
-    out += _esc_align_center() + _esc_bold(True)
-    out += (f"CHECKER\n").encode("ascii", "ignore")
+    out.align("center").bold(True)
+    out.line("CHECKER")
 
     if company or branch:
         header_line = f"{company}"
         if branch:
             header_line += f" - {branch}"
-        out += (header_line + "\n").encode("ascii", "ignore")
+        out.line(header_line)
 
-    out += _esc_bold(False)
+    out.bold(False)
 
-    out += _esc_align_left()
-    out += (separator + "\n").encode("ascii", "ignore")
+    out.align("left")
+    out.line(separator)
     
     # Nama table
-    table_names = get_table_names_from_pos_invoice(data["name"])
+    table_names = ctx.table_names
 
     # ===== INFORMASI INVOICE =====
-    out += (f"No Meja : {table_names}\n").encode("ascii", "ignore")
-    out += (f"Date : {print_time}\n").encode("ascii", "ignore")
-    out += (f"Purpose : {order_type}\n").encode("ascii", "ignore")
-    out += (f"Waiter : {get_waiter_name(data['name'])}\n").encode("ascii", "ignore")
-    pax = get_total_pax_from_pos_invoice(data["name"])
+    out.line(f"No Meja : {table_names}")
+    out.line(f"Date : {print_time}")
+    out.line(f"Purpose : {order_type}")
+    out.line(f"Waiter : {ctx.waiter_name}")
+    pax = ctx.total_pax
     if pax:
         pax_int = int(pax) if isinstance(pax, (int, float)) else pax
-        out += _esc_bold(True)
-        out += (f"Pax : {pax_int}\n").encode("ascii", "ignore")
-        out += _esc_bold(False)
+        out.bold(True)
+        out.line(f"Pax : {pax_int}")
+        out.bold(False)
 
-    out += (separator + "\n").encode("ascii", "ignore")
+    out.line(separator)
 
     # ===== ITEMS =====
     for item in items:
@@ -1640,50 +1268,50 @@ def build_escpos_checker(name: str) -> bytes:
         line = f"{qty_str.ljust(5)}{full_item_name}"
 
         # ===== CETAK ITEM UTAMA DENGAN FONT LEBIH BESAR =====
-        out += _esc_char_size(0, 1)   # double-height, lebar normal
-        out += (line + "\n").encode("utf-8")
-        out += _esc_char_size(0, 0)   # reset ke ukuran normal
+        out.size(0, 1)  # double-height, lebar normal
+        out.line(line, "utf-8")
+        out.size(0, 0)  # reset ke ukuran normal
 
         # ===== ADD ONS =====
         add_ons_str = item.get("add_ons") or ""
         if add_ons_str:
             add_ons_list = [a.strip() for a in add_ons_str.split(",") if a.strip()]
             for add in add_ons_list:
-                out += (" " * 7 + add + "\n").encode("utf-8")
+                out.line(" " * 7 + add, "utf-8")
 
         # ===== QUICK NOTES =====
         notes = (item.get("quick_notes") or "").strip()
         if notes:
-            out += (" " * 7 + f"# {notes}\n").encode("utf-8")
+            out.line(" " * 7 + f"# {notes}", "utf-8")
 
         # ===== SPASI ANTAR ITEM =====
-        out += b"\n"
+        out.line("")
 
     # ===== TOTAL QTY =====
-    out += (separator + "\n").encode("ascii", "ignore")
-    out += (f"{total_qty} items\n").encode("ascii", "ignore")
+    out.line(separator)
+    out.line(f"{total_qty} items")
 
     # ===== QUEUE NUMBER (Take Away) =====
     order_type_value = (order_type or "").lower()
     if order_type_value in ["take away", "takeaway"]:
         queue_no = data.get("queue") or ""
         if queue_no:
-            out += _esc_feed(2)
-            out += _esc_align_center()
-            out += _esc_bold(True)
-            out += b"Your Queue Number:\n"
-            out += _esc_bold(False)
+            out.feed(2)
+            out.align("center")
+            out.bold(True)
+            out.line("Your Queue Number:")
+            out.bold(False)
 
             # --- Font besar + center untuk nomor antrian ---
-            out += _esc_align_center()
-            out += _esc_char_size(2, 2)   # double width & height
-            out += f"{queue_no}\n".encode("ascii", "ignore")
-            out += _esc_char_size(0, 0)
-            out += _esc_feed(2)
+            out.align("center")
+            out.size(2, 2)  # double width & height
+            out.line(f"{queue_no}")
+            out.size(0, 0)
+            out.feed(2)
 
     # Feed bawah + cut
-    out += _esc_feed(8) + _esc_cut_full()
-    return out
+    out.feed(8).cut()
+    return out.getvalue()
 
 def _enqueue_checker_worker(name: str, printer_name: str):
     raw = build_escpos_checker(name)
@@ -1704,8 +1332,7 @@ def _enqueue_checker_worker(name: str, printer_name: str):
     )
 
     if items_to_update:
-        for item_name in items_to_update:
-            frappe.db.set_value("POS Invoice Item", item_name, "is_checked", 1)
+        flag_items(items_to_update, "is_checked")
 
         frappe.db.commit()
         frappe.logger("pos_print").info({
@@ -1724,9 +1351,6 @@ def _enqueue_checker_worker(name: str, printer_name: str):
     return job_id
 
 
-import cups
-import tempfile
-import os
 from frappe import _
 import frappe
 from frappe.utils import flt
@@ -1869,11 +1493,7 @@ def print_shift_report(closing_name, printer_name=None):
     try:
         # Jika printer_name tidak diberikan, gunakan default
         if not printer_name:
-            conn = cups.Connection()
-            printer_name = conn.getDefault()
-            if not printer_name:
-                printers = conn.getPrinters()
-                printer_name = list(printers.keys())[0] if printers else None
+            printer_name = get_cups().get_default_printer()
             if not printer_name:
                 frappe.throw(_("Tidak ada printer terdeteksi."))
         
@@ -1888,10 +1508,11 @@ def print_shift_report(closing_name, printer_name=None):
 def print_end_day_report_v2(report_data, printer_name=None):
     """
     Print End Day Report dari API get_end_day_report_v2
-    Layout aman untuk printer thermal 58mm (32 char)
+    Lebar kolom mengikuti Ticket Layout outlet (bawaan 58mm / 32 char)
     """
 
-    WIDTH = 32
+    WIDTH = get_line_width(report_data.get("outlet"))
+    NAME_WIDTH = WIDTH - 14
 
     def fmt_amt(v):
         return f"{round(flt(v)):,}".replace(",", ".")
@@ -1913,12 +1534,12 @@ def print_end_day_report_v2(report_data, printer_name=None):
         return left + (" " * space) + right
 
     # FORMAT ITEM TABLE
-    # 18 char item | 4 qty | 9 amount
+    # (WIDTH - 14) char item | 4 qty | 9 amount
     def format_item(name, qty, amt):
-        name = str(name)[:18]
+        name = str(name)[:NAME_WIDTH]
         qty = str(int(qty))[:4]
         amt = fmt_amt(amt)
-        return f"{name:<18}{qty:>4} {amt:>9}"
+        return f"{name:<{NAME_WIDTH}}{qty:>4} {amt:>9}"
 
     lines = []
 
@@ -1981,7 +1602,7 @@ def print_end_day_report_v2(report_data, printer_name=None):
 
         lines.append("DINE IN SALES")
         lines.append(line())
-        lines.append(f"{'Item':<18}{'Qty':>4} {'Amount':>9}")
+        lines.append(f"{'Item':<{NAME_WIDTH}}{'Qty':>4} {'Amount':>9}")
         lines.append(line())
 
         total_qty = 0
@@ -2009,7 +1630,7 @@ def print_end_day_report_v2(report_data, printer_name=None):
 
         lines.append("TAKE AWAY SALES")
         lines.append(line())
-        lines.append(f"{'Item':<18}{'Qty':>4} {'Amount':>9}")
+        lines.append(f"{'Item':<{NAME_WIDTH}}{'Qty':>4} {'Amount':>9}")
         lines.append(line())
 
         total_qty = 0
@@ -2106,12 +1727,7 @@ def print_end_day_report_v2(report_data, printer_name=None):
 
         if not printer_name:
 
-            conn = cups.Connection()
-            printer_name = conn.getDefault()
-
-            if not printer_name:
-                printers = conn.getPrinters()
-                printer_name = list(printers.keys())[0] if printers else None
+            printer_name = get_cups().get_default_printer()
 
             if not printer_name:
                 frappe.throw("Tidak ada printer terdeteksi")
@@ -2124,52 +1740,53 @@ def print_end_day_report_v2(report_data, printer_name=None):
         frappe.log_error(str(e), "Print End Day Report Error")
         raise
     
+@timed("build", printer=lambda args: args["printer_name"], ticket_type="Void")
 def build_void_item_receipt(pos_invoice: str, items: list[dict], printer_name=None) -> bytes:
     """
     Build ESC/POS print data untuk Void Menu
     """
     
-    current_user = frappe.session.user
-    full_name = frappe.db.get_value("User", current_user, "full_name") or current_user
-    table_name = get_table_names_from_pos_invoice(pos_invoice)
-    pax = get_total_pax_from_pos_invoice(pos_invoice)
-    out = b""
-    out += _esc_init()
-    out += _esc_font_a()
-    out += _esc_align_center() + _esc_bold(True)
-    out += b"VOID MENU\n"
-    out += _esc_bold(False)
-    out += _esc_align_left()
-    out += (_line("-") + "\n").encode("ascii", "ignore")
-    out += (f"Invoice : {pos_invoice}\n").encode("ascii", "ignore")
-    out += (f"Table : {table_name}\n").encode("ascii", "ignore")
-    out += (f"Pax : {pax}\n").encode("ascii", "ignore")
-    out += (f"Petugas : {full_name}\n").encode("ascii", "ignore")
-    out += (_line("-") + "\n").encode("ascii", "ignore")
+    ctx = get_invoice_print_context(pos_invoice)
+    full_name = ctx.created_by()
+    table_name = ctx.table_names
+    pax = ctx.total_pax
+    out = EscPosWriter()
+    out.init()
+    out.font_a()
+    out.align("center").bold(True)
+    out.line("VOID MENU")
+    out.bold(False)
+    out.align("left")
+    out.separator()
+    out.line(f"Invoice : {pos_invoice}")
+    out.line(f"Table : {table_name}")
+    out.line(f"Pax : {pax}")
+    out.line(f"Petugas : {full_name}")
+    out.separator()
 
     for it in items:
         qty_s = str(it.get("qty") or 0)
         item_name = it.get("item_name") or it.get("resto_menu") or "-"
 
-        out += _esc_char_size(0, 1)   # double-height, lebar normal
+        out.size(0, 1)  # double-height, lebar normal
         display_line = f"{int(flt(qty_s))} x {item_name}"
-        out += (display_line + "\n").encode("ascii", "ignore")
-        out += _esc_char_size(0, 0)   # reset ke ukuran normal
+        out.line(display_line)
+        out.size(0, 0)  # reset ke ukuran normal
 
         # Add-ons
         add_ons = it.get("add_ons") or ""
         if add_ons:
             add_ons_list = [a.strip() for a in add_ons.split(",")]
             for a in add_ons_list:
-                out += (f"  + {a}\n").encode("ascii", "ignore")
+                out.line(f"  + {a}")
 
         # Notes
         notes = it.get("quick_notes") or ""
         if notes:
-            out += (f"  # {notes}\n").encode("ascii", "ignore")
+            out.line(f"  # {notes}")
 
-    out += (_line("-") + "\n").encode("ascii", "ignore")
-    out += _esc_feed(5)
-    out += _esc_cut_full()
+    out.separator()
+    out.feed(5)
+    out.cut()
 
-    return out
\ No newline at end of file
+    return out.getvalue()
\ No newline at end of file
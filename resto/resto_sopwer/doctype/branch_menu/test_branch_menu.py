@@ -1,9 +1,77 @@
 # Copyright (c) 2025, PT Sopwer Teknologi Indonesia and Contributors
 # See license.txt
 
-# import frappe
+import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from resto.kitchen_routing import (
+	ROUTING_VERSION_KEY,
+	_branch_key,
+	_build_routing_table,
+	get_printers_for_sell_item,
+)
+from resto.menu_catalog import RESTO_MENU_CATALOG_FIELDS, STOCK_FIELDS, _snapshot_key, invalidate_menu_catalog
+
+
+def make_branch_menu(branch, sell_item, printer_name):
+	doc = frappe.get_doc({
+		"doctype": "Branch Menu",
+		"branch": branch,
+		"menu_item": f"_Test Menu {sell_item}",
+		"sell_item": sell_item,
+		"enabled": 1,
+		"printers": [{"kitchen_station": "_Test Station", "printer_name": printer_name}],
+	})
+	doc.flags.ignore_links = True
+	return doc.insert()
+
 
 class TestBranchMenu(FrappeTestCase):
-	pass
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def test_catalog_snapshot_dropped_only_after_commit(self):
+		cache = frappe.cache()
+		cache.set_value(_snapshot_key("_Test Branch"), {"version": "v1", "items": [], "hashes": {}})
+
+		invalidate_menu_catalog()
+		self.assertIsNotNone(cache.get_value(_snapshot_key("_Test Branch")))
+
+		frappe.db.after_commit.run()
+		self.assertIsNone(cache.get_value(_snapshot_key("_Test Branch")))
+
+	def test_catalog_snapshot_has_no_stock_fields(self):
+		self.assertFalse(set(STOCK_FIELDS) & set(RESTO_MENU_CATALOG_FIELDS))
+
+	def test_void_routing_stays_in_invoice_branch(self):
+		make_branch_menu("_Test Branch A", "_TEST-SELL", "_Test Printer A")
+		make_branch_menu("_Test Branch B", "_TEST-SELL", "_Test Printer B")
+
+		table = _build_routing_table("_Test Branch A")
+		self.assertEqual(
+			[p["printer_name"] for p in table["by_sell_item"]["_Test Branch A"]["_TEST-SELL"]],
+			["_Test Printer A"]
+		)
+		self.assertNotIn("_Test Branch B", table["by_sell_item"])
+
+		all_branches = _build_routing_table()
+		self.assertEqual(
+			[p["printer_name"] for p in all_branches["by_sell_item"]["_Test Branch B"]["_TEST-SELL"]],
+			["_Test Printer B"]
+		)
+		self.assertEqual(get_printers_for_sell_item("_TEST-SELL", None), [])
+
+	def test_moving_branch_menu_drops_previous_branch_routing(self):
+		doc = make_branch_menu("_Test Branch A", "_TEST-SELL", "_Test Printer A")
+		frappe.db.after_commit.run()
+
+		cache = frappe.cache()
+		for branch in ("_Test Branch A", "_Test Branch B"):
+			cache.hset(ROUTING_VERSION_KEY, _branch_key(branch), "v1")
+
+		doc.branch = "_Test Branch B"
+		doc.save()
+		frappe.db.after_commit.run()
+
+		for branch in ("_Test Branch A", "_Test Branch B"):
+			self.assertIsNone(cache.hget(ROUTING_VERSION_KEY, _branch_key(branch)))
@@ -0,0 +1,165 @@
+# Copyright (c) 2026, PT Sopwer Teknologi Indonesia and contributors
+# For license information, please see license.txt
+
+import hashlib
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import add_to_date, now_datetime
+
+# Claim tanpa Print Job (jalur cetak sync) atau dengan Print Job yang sudah Dead
+# yang belum Printed setelah ini dianggap ditinggal dan boleh di-claim ulang.
+STALE_CLAIM_MINUTES = 5
+
+
+class KitchenPrintLedger(Document):
+	pass
+
+
+def ledger_name(pos_invoice_item, kitchen_station):
+	"""Nama deterministik per (invoice item, station): primary key = kunci idempotensi."""
+	return hashlib.md5(f"{pos_invoice_item}::{kitchen_station}".encode()).hexdigest()
+
+
+def claim_kitchen_items(pos_invoice, pairs):
+	"""
+	Claim atomik pasangan (pos_invoice_item, kitchen_station).
+	Return set pasangan yang dimiliki pemanggil; pasangan yang sudah di-claim
+	proses lain (atau sudah tercetak) tidak ikut.
+
+	INSERT IGNORE pada primary key: transaksi kedua menunggu lock baris
+	transaksi pertama, lalu di-skip. Claim basi (tanpa Print Job, atau Print
+	Job-nya Dead) diambil alih dengan UPDATE bersyarat.
+	"""
+	pairs = {(item, station) for item, station in pairs if item and station}
+	if not pairs:
+		return set()
+
+	token = frappe.generate_hash(length=12)
+	now = now_datetime()
+	user = frappe.session.user
+	# Urutan insert tetap supaya claim yang overlap tidak saling deadlock
+	names = dict(sorted((ledger_name(item, station), (item, station)) for item, station in pairs))
+
+	values = []
+	params = {"token": token, "now": now, "user": user, "pos_invoice": pos_invoice}
+	for i, (name, (item, station)) in enumerate(names.items()):
+		values.append(
+			f"(%(n{i})s, %(now)s, %(now)s, %(user)s, %(user)s, 0, 0,"
+			f" %(pos_invoice)s, %(i{i})s, %(s{i})s, 'Claimed', %(token)s)"
+		)
+		params.update({f"n{i}": name, f"i{i}": item, f"s{i}": station})
+
+	frappe.db.sql(f"""
+		INSERT IGNORE INTO `tabKitchen Print Ledger`
+			(name, creation, modified, owner, modified_by, docstatus, idx,
+			pos_invoice, pos_invoice_item, kitchen_station, status, claim_token)
+		VALUES {", ".join(values)}
+	""", params)
+
+	frappe.db.sql("""
+		UPDATE `tabKitchen Print Ledger`
+		SET claim_token = %(token)s, print_job = NULL, modified = %(now)s, modified_by = %(user)s
+		WHERE name IN %(names)s
+			AND status = 'Claimed'
+			AND (
+				IFNULL(print_job, '') = ''
+				OR print_job IN (SELECT name FROM `tabPrint Job` WHERE status = 'Dead')
+			)
+			AND claim_token != %(token)s
+			AND modified < %(stale_before)s
+	""", {
+		"token": token,
+		"now": now,
+		"user": user,
+		"names": list(names),
+		"stale_before": add_to_date(now, minutes=-STALE_CLAIM_MINUTES)
+	})
+
+	owned = frappe.db.sql_list("""
+		SELECT name FROM `tabKitchen Print Ledger`
+		WHERE name IN %(names)s AND claim_token = %(token)s
+	""", {"names": list(names), "token": token})
+
+	return {names[name] for name in owned}
+
+
+def attach_print_job(pairs, print_job):
+	"""Tautkan claim ke Print Job spooler (claim tidak lagi dianggap basi)."""
+	names = [ledger_name(item, station) for item, station in pairs]
+	if names:
+		frappe.db.sql("""
+			UPDATE `tabKitchen Print Ledger`
+			SET print_job = %(job)s, modified = %(now)s
+			WHERE name IN %(names)s
+		""", {"job": print_job, "names": names, "now": now_datetime()})
+
+
+def mark_printed(pairs=None, print_job=None):
+	"""Tandai Printed per pasangan (jalur sync) atau per Print Job (spooler)."""
+	if print_job:
+		condition, params = "print_job = %(job)s", {"job": print_job}
+	else:
+		names = [ledger_name(item, station) for item, station in pairs or []]
+		if not names:
+			return
+		condition, params = "name IN %(names)s", {"names": names}
+
+	frappe.db.sql(f"""
+		UPDATE `tabKitchen Print Ledger`
+		SET status = 'Printed', modified = %(now)s
+		WHERE {condition}
+	""", {**params, "now": now_datetime()})
+
+
+def release_claims(print_job):
+	"""Print Job Dead: claim yang belum tercetak dilepas supaya item bisa dikirim ulang."""
+	frappe.db.sql("""
+		DELETE FROM `tabKitchen Print Ledger`
+		WHERE print_job = %s AND status = 'Claimed'
+	""", print_job)
+
+
+def get_job_items(print_job):
+	return frappe.db.sql_list("""
+		SELECT DISTINCT pos_invoice_item FROM `tabKitchen Print Ledger`
+		WHERE print_job = %s
+	""", print_job)
+
+
+def get_fully_printed_items(pos_invoice_items):
+	"""Item yang semua pasangan (item, station)-nya di ledger sudah Printed."""
+	items = list({i for i in pos_invoice_items or [] if i})
+	if not items:
+		return []
+
+	return frappe.db.sql_list("""
+		SELECT pos_invoice_item FROM `tabKitchen Print Ledger`
+		WHERE pos_invoice_item IN %(items)s
+		GROUP BY pos_invoice_item
+		HAVING SUM(status != 'Printed') = 0
+	""", {"items": items})
+
+
+def get_printed_before_ledger(pos_invoice_items):
+	"""Item ber-flag is_print_kitchen tanpa baris ledger: sudah dicetak sebelum ledger ada."""
+	items = list({i for i in pos_invoice_items or [] if i})
+	if not items:
+		return set()
+
+	return set(frappe.db.sql_list("""
+		SELECT pii.name FROM `tabPOS Invoice Item` pii
+		WHERE pii.name IN %(items)s
+			AND IFNULL(pii.is_print_kitchen, 0) = 1
+			AND NOT EXISTS (
+				SELECT 1 FROM `tabKitchen Print Ledger` kpl
+				WHERE kpl.pos_invoice_item = pii.name
+			)
+	""", {"items": items}))
+
+
+def flag_fully_printed(pos_invoice_items):
+	"""Set is_print_kitchen hanya untuk item yang sudah tercetak di semua station."""
+	from resto.printing import flag_items
+
+	return flag_items(get_fully_printed_items(pos_invoice_items), "is_print_kitchen")
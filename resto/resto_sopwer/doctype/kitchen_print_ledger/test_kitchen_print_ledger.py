@@ -0,0 +1,90 @@
+# Copyright (c) 2026, PT Sopwer Teknologi Indonesia and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_to_date, now_datetime
+
+from resto.resto_sopwer.doctype.kitchen_print_ledger.kitchen_print_ledger import (
+	STALE_CLAIM_MINUTES,
+	attach_print_job,
+	claim_kitchen_items,
+	get_fully_printed_items,
+	ledger_name,
+	mark_printed,
+	release_claims,
+)
+from resto.tests.utils import run_concurrently
+
+TEST_INVOICE = "_Test Ledger Invoice"
+
+
+class TestKitchenPrintLedger(FrappeTestCase):
+	def tearDown(self):
+		frappe.db.delete("Kitchen Print Ledger", {"pos_invoice": TEST_INVOICE})
+		frappe.db.commit()
+
+	def age_claims(self, pairs, minutes=10):
+		frappe.db.sql("""
+			UPDATE `tabKitchen Print Ledger` SET modified = %(old)s WHERE name IN %(names)s
+		""", {
+			"old": add_to_date(now_datetime(), minutes=-minutes),
+			"names": [ledger_name(item, station) for item, station in pairs]
+		})
+
+	def test_pair_is_claimed_once(self):
+		pairs = [("ITEM-1", "Grill"), ("ITEM-1", "Bar"), ("ITEM-2", "Grill")]
+
+		self.assertEqual(claim_kitchen_items(TEST_INVOICE, pairs), set(pairs))
+		self.assertEqual(claim_kitchen_items(TEST_INVOICE, pairs), set())
+
+		# Item baru di invoice yang sama tetap bisa di-claim
+		self.assertEqual(
+			claim_kitchen_items(TEST_INVOICE, pairs + [("ITEM-3", "Grill")]),
+			{("ITEM-3", "Grill")}
+		)
+
+	def test_stale_claim_without_job_is_taken_over(self):
+		stale, queued, fresh = [("ITEM-1", "Grill")], [("ITEM-2", "Grill")], [("ITEM-3", "Grill")]
+		claim_kitchen_items(TEST_INVOICE, stale + queued + fresh)
+		attach_print_job(queued, "_Test Print Job")
+		self.age_claims(stale + queued)
+		# Belum lewat batas stale: worker pemiliknya mungkin masih mencetak
+		self.age_claims(fresh, minutes=STALE_CLAIM_MINUTES - 1)
+
+		# Claim yang sudah punya Print Job diurus spooler, tidak diambil alih
+		self.assertEqual(claim_kitchen_items(TEST_INVOICE, stale + queued + fresh), set(stale))
+
+	def test_item_fully_printed_only_after_every_station(self):
+		pairs = [("ITEM-1", "Grill"), ("ITEM-1", "Bar")]
+		claim_kitchen_items(TEST_INVOICE, pairs)
+
+		# Grill tercetak, Bar gagal / crash: item belum boleh dikunci
+		mark_printed([("ITEM-1", "Grill")])
+		self.assertEqual(get_fully_printed_items(["ITEM-1"]), [])
+
+		# Retry hanya mendapat station yang belum tercetak
+		self.age_claims([("ITEM-1", "Bar")])
+		self.assertEqual(claim_kitchen_items(TEST_INVOICE, pairs), {("ITEM-1", "Bar")})
+
+		mark_printed([("ITEM-1", "Bar")])
+		self.assertEqual(get_fully_printed_items(["ITEM-1"]), ["ITEM-1"])
+
+	def test_dead_print_job_releases_claims(self):
+		pairs = [("ITEM-1", "Grill")]
+		claim_kitchen_items(TEST_INVOICE, pairs)
+		attach_print_job(pairs, "_Test Dead Job")
+		self.assertEqual(claim_kitchen_items(TEST_INVOICE, pairs), set())
+
+		release_claims("_Test Dead Job")
+		self.assertEqual(claim_kitchen_items(TEST_INVOICE, pairs), set(pairs))
+
+	def test_parallel_claims_never_duplicate(self):
+		pairs = [(f"ITEM-{i}", "Grill") for i in range(10)]
+		workers = 8
+
+		results = run_concurrently(claim_kitchen_items, workers, TEST_INVOICE, pairs)
+
+		claimed = [pair for owned in results for pair in owned]
+		self.assertEqual(len(results), workers)
+		self.assertCountEqual(claimed, pairs)
@@ -0,0 +1,223 @@
+# Copyright (c) 2026, PT Sopwer Teknologi Indonesia and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_to_date, now_datetime
+
+from resto import print_spooler, printer_health
+from resto.print_spooler import (
+	enqueue_print_job,
+	enqueue_raw_print_job,
+	run_lane,
+	set_print_backend,
+)
+
+
+class FakePrinterBackend:
+	"""Printer palsu: printer di `offline` selalu gagal, sisanya mencatat job."""
+
+	def __init__(self, offline=()):
+		self.offline = set(offline)
+		self.sent = []
+
+	def send(self, printer_name, data, title):
+		if printer_name in self.offline:
+			raise ConnectionError(f"{printer_name} offline")
+		self.sent.append((printer_name, data))
+		return len(self.sent)
+
+
+class TestPrintJob(FrappeTestCase):
+	def setUp(self):
+		self.backend = FakePrinterBackend()
+		set_print_backend(self.backend)
+		self.jobs = []
+
+		# Lane dijalankan langsung di test, bukan lewat worker RQ
+		kick = patch.object(print_spooler, "kick_lane")
+		kick.start()
+		self.addCleanup(kick.stop)
+
+	def tearDown(self):
+		set_print_backend(None)
+		frappe.db.delete("Print Job", {"name": ["in", self.jobs]})
+		frappe.db.commit()
+
+	def enqueue(self, printer_name, data, **kwargs):
+		name = enqueue_raw_print_job(printer_name, data, **kwargs)
+		self.jobs.append(name)
+		frappe.db.commit()
+		return name
+
+	def test_enqueue_does_not_touch_printer(self):
+		job = self.enqueue("_Test Grill", b"ticket")
+
+		self.assertEqual(self.backend.sent, [])
+		self.assertEqual(frappe.db.get_value("Print Job", job, "status"), "Queued")
+
+	def test_offline_printer_does_not_block_other_lane(self):
+		self.backend.offline.add("_Test Bar")
+		bar = self.enqueue("_Test Bar", b"bar")
+		grill = self.enqueue("_Test Grill", b"grill")
+
+		run_lane("_Test Bar")
+		run_lane("_Test Grill")
+
+		self.assertEqual(self.backend.sent, [("_Test Grill", b"grill")])
+		self.assertEqual(frappe.db.get_value("Print Job", grill, "status"), "Done")
+
+		status, attempts, next_attempt_at = frappe.db.get_value(
+			"Print Job", bar, ["status", "attempts", "next_attempt_at"]
+		)
+		self.assertEqual((status, attempts), ("Queued", 1))
+		self.assertGreater(next_attempt_at, now_datetime())
+		# Retry dijadwalkan sesuai backoff
+		print_spooler.kick_lane.assert_called_with("_Test Bar", delay=print_spooler._retry_delay(1))
+
+	def test_retry_backoff_then_dead_letter(self):
+		self.assertEqual(
+			[print_spooler._retry_delay(n) for n in (1, 2, 3, 4)],
+			[5, 10, 20, 40]
+		)
+
+		self.backend.offline.add("_Test Bar")
+		job = self.enqueue("_Test Bar", b"bar", max_attempts=2)
+
+		for _ in range(2):
+			# Majukan jadwal retry supaya job langsung jatuh tempo
+			frappe.db.set_value("Print Job", job, "next_attempt_at", add_to_date(now_datetime(), seconds=-1))
+			frappe.db.commit()
+			run_lane("_Test Bar")
+
+		status, attempts = frappe.db.get_value("Print Job", job, ["status", "attempts"])
+		self.assertEqual((status, attempts), ("Dead", 2))
+
+	def test_stuck_threshold_outlives_lane_lock(self):
+		self.assertGreater(print_spooler.STUCK_PRINTING_MINUTES * 60, print_spooler.LANE_LOCK_TIMEOUT)
+
+	def test_lane_prints_in_order_after_printer_recovers(self):
+		self.backend.offline.add("_Test Bar")
+		first = self.enqueue("_Test Bar", b"1")
+		self.enqueue("_Test Bar", b"2")
+		run_lane("_Test Bar")
+
+		self.backend.offline.clear()
+		frappe.db.set_value("Print Job", first, "next_attempt_at", None)
+		frappe.db.commit()
+		run_lane("_Test Bar")
+
+		self.assertEqual([data for _, data in self.backend.sent], [b"1", b"2"])
+
+	def test_job_queued_while_lane_exits_is_printed(self):
+		self.enqueue("_Test Grill", b"1")
+		drain = print_spooler._drain
+
+		def drain_then_enqueue(printer_name):
+			result = drain(printer_name)
+			if len(self.jobs) == 1:
+				# Masuk setelah _drain melihat antrian kosong, lock masih dipegang
+				self.enqueue("_Test Grill", b"2")
+			return result
+
+		with patch.object(print_spooler, "_drain", side_effect=drain_then_enqueue):
+			run_lane("_Test Grill")
+
+		self.assertEqual([data for _, data in self.backend.sent], [b"1", b"2"])
+
+	def test_rapid_kitchen_sends_coalesce_into_one_ticket(self):
+		def send(items):
+			name = enqueue_print_job(
+				"_Test Grill",
+				"Kitchen",
+				{"kitchen_station": "_Test Station", "items": [{"name": i} for i in items]},
+				pos_invoice="_Test Invoice",
+				kitchen_station="_Test Station",
+				coalesce_seconds=3,
+			)
+			if name not in self.jobs:
+				self.jobs.append(name)
+			frappe.db.commit()
+			return name
+
+		first = send(["ITEM-1"])
+		second = send(["ITEM-1", "ITEM-2"])
+		self.assertEqual(first, second)
+
+		payload = frappe.parse_json(frappe.db.get_value("Print Job", first, "payload"))
+		self.assertEqual([it["name"] for it in payload["items"]], ["ITEM-1", "ITEM-2"])
+
+		# Job yang sudah mulai dicetak tidak lagi menerima item baru
+		frappe.db.set_value("Print Job", first, "status", "Printing")
+		frappe.db.commit()
+		self.assertNotEqual(send(["ITEM-3"]), first)
+
+	def test_held_kitchen_job_does_not_block_lane(self):
+		self.assertEqual(print_spooler.get_kitchen_coalesce_seconds("_Test Branch Tanpa Settings"), 0)
+
+		held = enqueue_print_job(
+			"_Test Grill",
+			"Kitchen",
+			{"kitchen_station": "_Test Station", "items": [{"name": "ITEM-1"}]},
+			pos_invoice="_Test Invoice",
+			kitchen_station="_Test Station",
+			coalesce_seconds=30,
+		)
+		self.jobs.append(held)
+		frappe.db.commit()
+		print_spooler.kick_lane.assert_called_with("_Test Grill", delay=30)
+
+		with patch("time.sleep") as sleep:
+			run_lane("_Test Grill")
+
+		sleep.assert_not_called()
+		self.assertEqual(frappe.db.get_value("Print Job", held, "status"), "Queued")
+
+	def test_dead_kitchen_job_releases_ledger_claims(self):
+		from resto.resto_sopwer.doctype.kitchen_print_ledger.kitchen_print_ledger import (
+			attach_print_job,
+			claim_kitchen_items,
+		)
+
+		pairs = [("_Test Dead ITEM-1", "_Test Station")]
+		self.addCleanup(frappe.db.delete, "Kitchen Print Ledger", {"pos_invoice": "_Test Invoice"})
+		claim_kitchen_items("_Test Invoice", pairs)
+
+		job = enqueue_print_job(
+			"_Test Bar", "Kitchen", {"kitchen_station": "_Test Station", "items": [{"name": "_Test Dead ITEM-1"}]},
+			pos_invoice="_Test Invoice", kitchen_station="_Test Station", max_attempts=1,
+		)
+		self.jobs.append(job)
+		attach_print_job(pairs, job)
+		frappe.db.commit()
+
+		self.backend.offline.add("_Test Bar")
+		with patch.dict(print_spooler.JOB_RENDERERS, {"Kitchen": lambda job, payload: (b"kitchen", "KITCHEN")}):
+			run_lane("_Test Bar")
+
+		self.assertEqual(frappe.db.get_value("Print Job", job, "status"), "Dead")
+		# Item bisa dikirim ulang ke station itu
+		self.assertEqual(claim_kitchen_items("_Test Invoice", pairs), set(pairs))
+
+	def test_degraded_printer_fails_over_to_station_backup(self):
+		station = frappe.get_doc({
+			"doctype": "Kitchen Station",
+			"title": "_Test Failover Station",
+			"printer_name": "_Test Bar",
+			"backup_printer_name": "_Test Grill",
+		}).insert(ignore_if_duplicate=True)
+		self.addCleanup(frappe.delete_doc, "Kitchen Station", station.name, force=True)
+
+		health = frappe.cache()
+		health.hset(printer_health.PRINTER_HEALTH_KEY, "_Test Bar", {
+			**printer_health._default_health("_Test Bar"), "status": "degraded"
+		})
+		self.addCleanup(health.hdel, printer_health.PRINTER_HEALTH_KEY, "_Test Bar")
+
+		job = self.enqueue("_Test Bar", b"bar", kitchen_station=station.name)
+		run_lane("_Test Bar")
+
+		self.assertEqual(self.backend.sent, [("_Test Grill", b"bar")])
+		self.assertEqual(frappe.db.get_value("Print Job", job, "printed_on"), "_Test Grill")
@@ -1,9 +1,365 @@
 # Copyright (c) 2025, PT Sopwer Teknologi Indonesia and Contributors
 # See license.txt
 
-# import frappe
+import os
+import tempfile
+import time
+from unittest.mock import patch
+
+import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from resto.cups_pool import CupsConnectionManager, set_connection_factory
+from resto import print_metrics, printer_health
+from resto import printing
+from resto.printing import (
+	GS,
+	OPEN_DRAWER_COMMAND,
+	EscPosWriter,
+	_esc_align_center,
+	_esc_bold,
+	_esc_cut_full,
+	_esc_print_image,
+	cups_print_raw,
+)
+
+
+class FakeCups:
+	"""Stand-in pycups.Connection: catat panggilan, tanpa server CUPS."""
+
+	def __init__(self, printers=("Kitchen", "Kasir"), fail_next=0):
+		self.printers = {name: {} for name in printers}
+		self.fail_next = fail_next
+		self.get_printers_calls = 0
+		self.jobs = []
+		self.files = []
+		self.job_states = {}
+		self.get_jobs_calls = []
+
+	def getPrinters(self):
+		self.get_printers_calls += 1
+		return dict(self.printers)
+
+	def getDefault(self):
+		return None
+
+	def getJobs(self, which_jobs, my_jobs, limit, first_job_id, requested_attributes):
+		self.get_jobs_calls.append((first_job_id, limit))
+		return {
+			job_id: attrs for job_id, attrs in self.job_states.items()
+			if first_job_id <= job_id < first_job_id + limit
+		}
+
+	def _fail(self):
+		if self.fail_next:
+			self.fail_next -= 1
+			raise RuntimeError("failed to connect to server")
+
+	def printFile(self, printer, path, title, options):
+		self._fail()
+		self.files.append(path)
+		with open(path, "rb") as f:
+			self.jobs.append((printer, title, f.read()))
+		return len(self.jobs)
+
+	# API streaming pycups
+	def createJob(self, printer, title, options):
+		self._fail()
+		self._stream = (printer, title, bytearray())
+		return len(self.jobs) + 1
+
+	def startDocument(self, printer, job_id, doc_name, fmt, last):
+		pass
+
+	def writeRequestData(self, data, length):
+		self._stream[2].extend(data[:length])
+
+	def finishDocument(self, printer):
+		printer, title, data = self._stream
+		self.jobs.append((printer, title, bytes(data)))
+
+
+class FakeCupsWithoutStreaming(FakeCups):
+	def __getattribute__(self, name):
+		if name in ("createJob", "startDocument", "writeRequestData", "finishDocument"):
+			raise AttributeError(name)
+		return super().__getattribute__(name)
+
+
+class FakeClock:
+	def __init__(self):
+		self.now = 0.0
+
+	def __call__(self):
+		return self.now
+
 
 class TestPrinterSettings(FrappeTestCase):
-	pass
+	def tearDown(self):
+		set_connection_factory(None)
+
+	def test_connection_and_printer_list_are_reused(self):
+		fake = FakeCups()
+		set_connection_factory(lambda: fake)
+
+		cups_print_raw(b"one", "Kitchen")
+		cups_print_raw(b"two", "Kitchen")
+
+		self.assertEqual(fake.get_printers_calls, 1)
+		self.assertEqual([job[2] for job in fake.jobs], [b"one", b"two"])
+
+	def test_printer_list_expires_after_ttl(self):
+		fake, clock = FakeCups(), FakeClock()
+		manager = CupsConnectionManager(lambda: fake, printer_ttl=30, clock=clock)
+
+		manager.ensure_printer("Kitchen")
+		clock.now = 10
+		manager.ensure_printer("Kitchen")
+		self.assertEqual(fake.get_printers_calls, 1)
+
+		clock.now = 31
+		manager.ensure_printer("Kitchen")
+		self.assertEqual(fake.get_printers_calls, 2)
+
+	def test_new_printer_is_found_before_ttl(self):
+		fake = FakeCups(printers=("Kitchen",))
+		manager = CupsConnectionManager(lambda: fake)
+		manager.ensure_printer("Kitchen")
+
+		fake.printers["Bar"] = {}
+		manager.ensure_printer("Bar")
+
+		self.assertRaises(frappe.ValidationError, manager.ensure_printer, "Tidak Ada")
+
+	def test_reconnects_once_on_connection_failure(self):
+		connections = []
+
+		def factory():
+			conn = FakeCups(fail_next=1 if not connections else 0)
+			connections.append(conn)
+			return conn
+
+		set_connection_factory(factory)
+		job_id = cups_print_raw(b"ticket", "Kitchen")
+
+		self.assertEqual(len(connections), 2)
+		self.assertEqual(job_id, 1)
+		self.assertEqual(connections[1].jobs[0][2], b"ticket")
+
+	def test_raw_ticket_is_streamed_without_temp_file(self):
+		fake = FakeCups()
+		set_connection_factory(lambda: fake)
+
+		cups_print_raw(b"ticket", "Kitchen")
+
+		self.assertEqual(fake.jobs, [("Kitchen", "POS_Receipt", b"ticket")])
+		self.assertEqual(fake.files, [])
+
+	def test_drawer_kick_is_part_of_receipt_job(self):
+		fake = FakeCups()
+		set_connection_factory(lambda: fake)
+
+		cups_print_raw(b"receipt", "Kasir")
+
+		self.assertEqual(len(fake.jobs), 1)
+		self.assertEqual(fake.jobs[0][2], OPEN_DRAWER_COMMAND + b"receipt")
+
+	def test_temp_file_fallback_is_removed(self):
+		fake = FakeCupsWithoutStreaming()
+		set_connection_factory(lambda: fake)
+
+		cups_print_raw(b"ticket", "Kitchen")
+
+		self.assertEqual(fake.jobs[0][2], b"ticket")
+		self.assertFalse(os.path.exists(fake.files[0]))
+
+	def test_logo_is_rasterized_once_as_gs_v_0(self):
+		from PIL import Image
+
+		# 12x2, 4 kolom kiri hitam
+		image = Image.new("L", (12, 2), 255)
+		for y in range(2):
+			for x in range(4):
+				image.putpixel((x, y), 0)
+
+		with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
+			image.save(tmp, format="PNG")
+		self.addCleanup(os.unlink, tmp.name)
+
+		raw = _esc_print_image(tmp.name)
+		header = GS + b"v0\x00" + bytes([2, 0, 2, 0])
+		self.assertIn(header + bytes([0xF0, 0x00, 0xF0, 0x00]), raw)
+
+		# Cache memori kosong -> dibaca dari cache disk, hasil identik
+		printing._logo_cache.clear()
+		self.assertEqual(_esc_print_image(tmp.name), raw)
+		self.assertIn((tmp.name, os.path.getmtime(tmp.name), 384), printing._logo_cache)
+
+	def test_escpos_writer_matches_bytes_concatenation(self):
+		out = EscPosWriter(width=10)
+		out.align("center").bold(True).line("Judul").bold(False)
+		out.lr("Total:", "100")
+		out.separator()
+		out.wrap("satu dua tiga empat")
+		out += b"\x1b!\x00"
+		out.cut()
+
+		expected = (
+			_esc_align_center() + _esc_bold(True) + b"Judul\n" + _esc_bold(False)
+			+ b"Total: 100\n"
+			+ b"----------\n"
+			+ b"satu dua\ntiga empat\n"
+			+ b"\x1b!\x00"
+			+ _esc_cut_full()
+		)
+		self.assertEqual(out.getvalue(), expected)
+
+	def test_escpos_writer_wrap_with_indent(self):
+		out = EscPosWriter(width=12)
+		out.wrap("satu dua tiga empat", indent=2)
+		self.assertEqual(out.getvalue(), b"  satu dua\n  tiga empat\n")
+
+	def test_kitchen_and_void_tickets_share_print_context(self):
+		from resto.print_context import clear_invoice_print_context
+
+		clear_invoice_print_context()
+		self.addCleanup(clear_invoice_print_context)
+		entry = {
+			"kitchen_station": "Grill",
+			"pos_invoice": "_Test Ctx Invoice",
+			"owner": "Administrator",
+			"items": [{"name": "ITEM-1", "item_name": "Nasi", "short_name": "Nasi", "qty": 1}],
+		}
+
+		get_value = frappe.db.get_value
+		with patch.object(frappe.db, "get_value", side_effect=get_value) as lookup, \
+				patch.object(frappe, "get_all", side_effect=frappe.get_all) as get_all:
+			printing.build_kitchen_receipt_from_payload(entry)
+			printing.build_void_item_receipt("_Test Ctx Invoice", entry["items"])
+
+		user_lookups = [c for c in lookup.call_args_list if c.args and c.args[0] == "User"]
+		self.assertEqual(len(user_lookups), 1)
+		self.assertFalse([c for c in get_all.call_args_list if c.args and c.args[0] == "Resto Menu"])
+
+	def test_print_header_is_built_once_per_company_branch(self):
+		frappe.cache().delete_value(printing.PRINT_HEADER_CACHE_KEY)
+		self.addCleanup(frappe.cache().delete_value, printing.PRINT_HEADER_CACHE_KEY)
+		address = {"city": "Medan", "address_line1": "Jl. Satu", "address_line2": "", "phone": "123"}
+
+		with patch.object(printing, "get_company_address", return_value=address) as lookup:
+			first = printing.get_print_header("_Test Company", "_Test Branch")
+			second = printing.get_print_header("_Test Company", "_Test Branch")
+
+		lookup.assert_called_once()
+		self.assertEqual(first, second)
+		self.assertIn(b"_Test Company Medan\nJl. Satu\nTlp. 123\n", first)
+
+	def test_print_spans_are_aggregated_per_printer_and_ticket(self):
+		frappe.cache().delete_value(print_metrics.METRICS_CACHE_KEY)
+		self.addCleanup(frappe.cache().delete_value, print_metrics.METRICS_CACHE_KEY)
+		fake = FakeCups()
+		set_connection_factory(lambda: fake)
+
+		# submit di dalam span luar mewarisi jenis tiket
+		with print_metrics.span("job", printer="Kitchen", ticket_type="Kitchen"):
+			cups_print_raw(b"ticket", "Kitchen")
+		print_metrics.observe("build", 7, "Kitchen", "Kitchen")
+		print_metrics.observe("build", 300, "Kitchen", "Kitchen", failed=True)
+
+		stats = {(s["stage"], s["printer"], s["ticket_type"]): s for s in print_metrics.collect_stats()}
+		self.assertEqual(stats[("submit", "Kitchen", "Kitchen")]["count"], 1)
+		self.assertEqual(stats[("job", "Kitchen", "Kitchen")]["count"], 1)
+
+		build = stats[("build", "Kitchen", "Kitchen")]
+		self.assertEqual((build["count"], build["errors"], build["sum_ms"]), (2, 1, 307))
+		self.assertEqual((build["buckets"]["5"], build["buckets"]["10"], build["buckets"]["+Inf"]), (0, 1, 2))
+		self.assertEqual(build["p50_ms"], "10")
+
+		text = print_metrics.render_prometheus(print_metrics.collect_stats())
+		self.assertIn('resto_print_duration_ms_bucket{stage="build",printer="Kitchen",ticket_type="Kitchen",le="500"} 2', text)
+		self.assertIn('resto_print_errors_total{stage="build",printer="Kitchen",ticket_type="Kitchen"} 1', text)
+
+	def test_monitor_marks_printer_degraded_from_job_states(self):
+		cache = frappe.cache()
+		for key in (printer_health.PENDING_JOBS_KEY, printer_health.PRINTER_HEALTH_KEY):
+			cache.delete_value(key)
+			self.addCleanup(cache.delete_value, key)
+
+		fake = FakeCups()
+		set_connection_factory(lambda: fake)
+		job_ids = [cups_print_raw(b"ticket", "Kitchen") for _ in range(4)]
+		submitted_at = cache.hget(printer_health.PENDING_JOBS_KEY, str(job_ids[0]))["submitted_at"]
+
+		fake.job_states = {
+			job_ids[0]: {"job-state": printer_health.JOB_COMPLETED, "time-at-completed": submitted_at + 2},
+			**{job_id: {"job-state": printer_health.JOB_ABORTED} for job_id in job_ids[1:]},
+		}
+		printer_health.poll_printer_jobs(batch_size=2, now=submitted_at + 3)
+
+		health = printer_health.get_health("Kitchen")
+		self.assertEqual((health["status"], health["last_latency_ms"]), ("degraded", 2000))
+		self.assertEqual(cache.hgetall(printer_health.PENDING_JOBS_KEY), {})
+
+		# Printer pulih setelah job berikutnya selesai
+		job_id = cups_print_raw(b"ticket", "Kitchen")
+		fake.job_states[job_id] = {"job-state": printer_health.JOB_COMPLETED}
+		printer_health.poll_printer_jobs()
+		self.assertEqual(printer_health.get_health("Kitchen")["status"], "ok")
+
+	def test_job_stuck_in_queue_degrades_printer(self):
+		cache = frappe.cache()
+		for key in (printer_health.PENDING_JOBS_KEY, printer_health.PRINTER_HEALTH_KEY):
+			cache.delete_value(key)
+			self.addCleanup(cache.delete_value, key)
+
+		fake = FakeCups()
+		set_connection_factory(lambda: fake)
+		job_id = cups_print_raw(b"ticket", "Kitchen")
+		fake.job_states[job_id] = {"job-state": printer_health.JOB_PROCESSING}
+
+		printer_health.poll_printer_jobs()
+		self.assertFalse(printer_health.is_printer_degraded("Kitchen"))
+
+		submitted_at = cache.hget(printer_health.PENDING_JOBS_KEY, str(job_id))["submitted_at"]
+		printer_health.poll_printer_jobs(now=submitted_at + printer_health.STUCK_SECONDS + 1)
+		self.assertTrue(printer_health.is_printer_degraded("Kitchen"))
+
+	def test_old_pending_job_does_not_widen_cups_query(self):
+		cache = frappe.cache()
+		for key in (printer_health.PENDING_JOBS_KEY, printer_health.PRINTER_HEALTH_KEY):
+			cache.delete_value(key)
+			self.addCleanup(cache.delete_value, key)
+
+		fake = FakeCups()
+		set_connection_factory(lambda: fake)
+		now = time.time()
+		for job_id in (7, 100000, 100001):
+			printer_health.track_job("Kitchen", job_id, submitted_at=now)
+
+		printer_health.poll_printer_jobs(batch_size=50, now=now)
+		self.assertEqual(fake.get_jobs_calls, [(7, 1), (100000, 2)])
+
+	def test_ancient_held_job_expires_and_does_not_override_completions(self):
+		cache = frappe.cache()
+		for key in (printer_health.PENDING_JOBS_KEY, printer_health.PRINTER_HEALTH_KEY):
+			cache.delete_value(key)
+			self.addCleanup(cache.delete_value, key)
+
+		fake = FakeCups()
+		set_connection_factory(lambda: fake)
+		now = time.time()
+		printer_health.track_job("Kitchen", 1, submitted_at=now - printer_health.STUCK_SECONDS - 1)
+		printer_health.track_job("Kitchen", 2, submitted_at=now - 5)
+		fake.job_states = {
+			1: {"job-state": printer_health.JOB_HELD},
+			2: {"job-state": printer_health.JOB_COMPLETED, "time-at-completed": now - 4},
+		}
+
+		# Job terbaru selesai: satu job held tidak membuat printer degraded
+		printer_health.poll_printer_jobs(now=now)
+		self.assertFalse(printer_health.is_printer_degraded("Kitchen"))
+
+		# Lewat umur maksimum: job held berhenti dipantau
+		printer_health.poll_printer_jobs(now=now + printer_health.PENDING_MAX_AGE_SECONDS)
+		self.assertEqual(cache.hgetall(printer_health.PENDING_JOBS_KEY), {})
+		self.assertFalse(printer_health.is_printer_degraded("Kitchen"))
@@ -1,70 +1,275 @@
 # Copyright (c) 2025, PT Sopwer Teknologi Indonesia and contributors
 # For license information, please see license.txt
 
+import pickle
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
 import frappe
 from frappe.model.document import Document
 from frappe.model.mapper import get_mapped_doc
+from frappe.utils import cint, flt, get_system_timezone, get_time, getdate
+
+
+STOCK_CACHE_KEY = "resto_menu_stock"
+STOCK_VERSION_KEY = "resto_menu_stock_version"
+STOCK_RESET_VERSION = "__reset__"
+STOCK_CACHE_TTL = 60 * 60
+STOCK_REALTIME_EVENT = "resto_menu_stock"
+STOCK_RESET_REALTIME_EVENT = "resto_menu_stock_reset"
+
+# Tulis state menu hanya kalau versinya (waktu baca DB) tidak lebih lama dari
+# versi tersimpan atau reset terakhir; dua worker yang flush tidak berurutan
+# tidak bisa menimpa stok baru dengan yang lama.
+# KEYS: mirror, versi. ARGV: menu, versi, state (pickle), field reset, TTL
+SET_STOCK_STATE_SCRIPT = """
+local floor = tonumber(redis.call('HGET', KEYS[2], ARGV[4]) or '0')
+local current = tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or '0')
+local version = tonumber(ARGV[2])
+if version < floor or version < current then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[3])
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+return 1
+"""
 
 
 class RestoMenu(Document):
-    pass
+    def on_update(self):
+        # Admin bisa ubah use_stock / stock_limit dari form
+        publish_resto_menu_stock(self.name)
 	
 
-def consume_resto_menu_stock(resto_menu, qty):
-    menu = frappe.get_doc("Resto Menu", resto_menu)
+def _stock_state(row):
+    return {
+        "use_stock": cint(row.get("use_stock")),
+        "stock_limit": cint(row.get("stock_limit")),
+        "stock_used": cint(row.get("stock_used")),
+        "is_sold_out": cint(row.get("is_sold_out")),
+    }
+
+
+def _stock_response(state):
+    if state["use_stock"] and state["is_sold_out"]:
+        return {
+            "qty": -1,
+            "sold_out": True
+        }
+
+    remaining = (
+        state["stock_limit"] - state["stock_used"]
+        if state["use_stock"] else None
+    )
+
+    return {
+        "sold_out": False,
+        "remaining": remaining
+    }
+
+
+def _load_stock_states(menus):
+    """({menu: state}, versi) dari DB; versi = waktu baca DB dalam mikrodetik."""
+    if not menus:
+        return {}, 0
+
+    rows = frappe.db.sql("""
+        SELECT name, use_stock, stock_limit, stock_used, is_sold_out,
+            CAST(UNIX_TIMESTAMP(NOW(6)) * 1000000 AS UNSIGNED) AS version
+        FROM `tabResto Menu`
+        WHERE name IN %(menus)s
+    """, {"menus": list(menus)}, as_dict=True)
+
+    version = rows[0].version if rows else 0
+    return {r.name: _stock_state(r) for r in rows}, version
+
 
-    if not menu.use_stock:
+def _get_cached_stock_states(menus):
+    """Satu HMGET untuk semua menu; nilai disimpan dalam bentuk pickle (sama dengan RedisWrapper.hset)."""
+    cache = frappe.cache()
+    values = cache.hmget(cache.make_key(STOCK_CACHE_KEY), menus)
+    return {m: pickle.loads(v) for m, v in zip(menus, values) if v}
+
+
+def _cache_stock_states(states, version):
+    """Simpan state ke mirror Redis (satu pipeline), menolak yang lebih lama dari isi mirror."""
+    if not states:
         return
 
-    used = menu.stock_used or 0
-    limit = menu.stock_limit or 0
+    cache = frappe.cache()
+    keys = (cache.make_key(STOCK_CACHE_KEY), cache.make_key(STOCK_VERSION_KEY))
+    pipe = cache.pipeline()
+    for name, state in states.items():
+        pipe.eval(
+            SET_STOCK_STATE_SCRIPT, 2, *keys,
+            name, version, pickle.dumps(state), STOCK_RESET_VERSION, STOCK_CACHE_TTL
+        )
+    pipe.execute()
+
+
+def publish_resto_menu_stock(resto_menu):
+    """
+    Mirror stok terbaru ke Redis dan broadcast ke room Branch yang menjual menu ini
+    (client subscribe via frappe.realtime.doc_subscribe("Branch", branch)).
+    Dijalankan setelah commit supaya device tidak melihat stok yang kemudian di-rollback.
+    """
+    frappe.local.flags.setdefault("resto_menu_stock_changed", set()).add(resto_menu)
+    frappe.db.after_commit.add(_flush_stock_changes)
 
-    if used + qty > limit:
+
+def _flush_stock_changes():
+    # Callback bisa terdaftar beberapa kali dalam satu transaksi; yang pertama mengambil semua
+    menus = list(frappe.local.flags.pop("resto_menu_stock_changed", None) or [])
+    if not menus:
+        return
+
+    # Dibaca ulang setelah commit: nilai ter-commit terbaru, bukan snapshot sebelum commit
+    states, version = _load_stock_states(menus)
+    cache = frappe.cache()
+    deleted = [m for m in menus if m not in states]
+    if deleted:
+        cache.hdel(STOCK_CACHE_KEY, deleted)
+    _cache_stock_states(states, version)
+
+    branches = {}
+    for row in frappe.get_all(
+        "Branch Menu",
+        filters={"menu_item": ["in", list(states)]},
+        fields=["menu_item", "branch"],
+        distinct=True
+    ) if states else []:
+        branches.setdefault(row.menu_item, []).append(row.branch)
+
+    for resto_menu, state in states.items():
+        message = {
+            "resto_menu": resto_menu,
+            "stock_limit": state["stock_limit"],
+            "stock_used": state["stock_used"],
+            **_stock_response(state)
+        }
+        for branch in branches.get(resto_menu, []):
+            frappe.publish_realtime(STOCK_REALTIME_EVENT, message, doctype="Branch", docname=branch)
+
+
+def _stock_qty(resto_menu, qty):
+    """Qty porsi untuk stok: bilangan bulat positif (stok dihitung per porsi utuh)."""
+    value = flt(qty)
+    if value <= 0 or not value.is_integer():
         frappe.throw(
-            f"Menu {menu.title} sudah SOLD OUT",
+            f"Qty {qty} untuk stok menu {resto_menu} harus bilangan bulat lebih dari 0",
             frappe.ValidationError
         )
+    return int(value)
+
 
-    menu.stock_used = used + qty
+def try_consume_resto_menu_stock(resto_menu, qty):
+    """
+    Tambah stock_used secara atomik, hanya jika tidak melewati stock_limit.
+    is_sold_out dihitung di statement yang sama. Return True jika baris ter-update.
 
-    if menu.stock_used >= limit:
-        menu.is_sold_out = 1
+    Row lock InnoDB membuat dua kasir yang menjual porsi terakhir bersamaan
+    tidak bisa sama-sama lolos: yang kedua membaca nilai yang sudah naik.
+    """
+    qty = _stock_qty(resto_menu, qty)
 
-    menu.save(ignore_permissions=True)
-    
-def rollback_resto_menu_stock(resto_menu, qty):
-    menu = frappe.get_doc("Resto Menu", resto_menu)
+    # is_sold_out ditulis sebelum stock_used supaya keduanya memakai nilai lama
+    frappe.db.sql("""
+        UPDATE `tabResto Menu`
+        SET
+            is_sold_out = IF(IFNULL(stock_used, 0) + %(qty)s >= IFNULL(stock_limit, 0), 1, 0),
+            stock_used = IFNULL(stock_used, 0) + %(qty)s
+        WHERE
+            name = %(name)s
+            AND use_stock = 1
+            AND IFNULL(stock_used, 0) + %(qty)s <= IFNULL(stock_limit, 0)
+    """, {"name": resto_menu, "qty": qty})
 
-    if not menu.use_stock:
+    consumed = frappe.db._cursor.rowcount == 1
+    if consumed:
+        publish_resto_menu_stock(resto_menu)
+
+    return consumed
+
+
+def consume_resto_menu_stock(resto_menu, qty):
+    if try_consume_resto_menu_stock(resto_menu, qty):
         return
 
-    menu.stock_used = max((menu.stock_used or 0) - qty, 0)
+    # Gagal update: menu tidak pakai stok (abaikan) atau memang sudah habis
+    menu = frappe.db.get_value("Resto Menu", resto_menu, ["title", "use_stock"], as_dict=True)
+    if not menu or not menu.use_stock:
+        return
 
-    if menu.stock_used < menu.stock_limit:
-        menu.is_sold_out = 0
+    frappe.throw(
+        f"Menu {menu.title} sudah SOLD OUT",
+        frappe.ValidationError
+    )
 
-    menu.save(ignore_permissions=True)
+def rollback_resto_menu_stock(resto_menu, qty):
+    qty = _stock_qty(resto_menu, qty)
+
+    frappe.db.sql("""
+        UPDATE `tabResto Menu`
+        SET
+            is_sold_out = IF(
+                GREATEST(IFNULL(stock_used, 0) - %(qty)s, 0) < IFNULL(stock_limit, 0),
+                0,
+                is_sold_out
+            ),
+            stock_used = GREATEST(IFNULL(stock_used, 0) - %(qty)s, 0)
+        WHERE
+            name = %(name)s
+            AND use_stock = 1
+    """, {"name": resto_menu, "qty": qty})
+
+    rolled_back = frappe.db._cursor.rowcount == 1
+    if rolled_back:
+        publish_resto_menu_stock(resto_menu)
+
+    return rolled_back
 
 
 @frappe.whitelist()
 def get_resto_menu_stock(resto_menu):
-    menu = frappe.get_doc("Resto Menu", resto_menu)
+    result = get_resto_menu_stock_many([resto_menu])
 
-    if menu.use_stock and menu.is_sold_out:
-        return {
-            "qty": -1,
-            "sold_out": True
-        }
+    if resto_menu not in result:
+        frappe.throw(f"Resto Menu {resto_menu} tidak ditemukan", frappe.DoesNotExistError)
 
-    remaining = (
-        (menu.stock_limit or 0) - (menu.stock_used or 0)
-        if menu.use_stock else None
-    )
+    return result[resto_menu]
 
-    return {
-        "sold_out": False,
-        "remaining": remaining
-    }
+@frappe.whitelist()
+def get_resto_menu_stock_many(menus):
+    """
+    Stok banyak menu sekaligus dari mirror Redis.
+    Menu yang belum ada di cache diambil dengan satu query lalu disimpan.
+    Return { resto_menu: {sold_out, remaining | qty} }
+    """
+    menus = frappe.parse_json(menus) if isinstance(menus, str) else menus
+    states = get_stock_states(menus)
+    return {name: _stock_response(state) for name, state in states.items()}
+
+def get_stock_states(menus):
+    """
+    {resto_menu: {use_stock, stock_limit, stock_used, is_sold_out}} dari mirror Redis.
+    Menu yang belum ada di cache diambil dengan satu query lalu disimpan.
+    """
+    menus = list(dict.fromkeys(m for m in (menus or []) if m))
+    if not menus:
+        return {}
+
+    states = _get_cached_stock_states(menus)
+
+    missing = [m for m in menus if m not in states]
+    if missing:
+        loaded, version = _load_stock_states(missing)
+        _cache_stock_states(loaded, version)
+        states.update(loaded)
+
+    return {name: states[name] for name in menus if name in states}
 
 @frappe.whitelist()
 def make_branch_menu(source_name, branch=None, price_list=None, rate=0):
@@ -109,19 +314,112 @@ def make_branch_menu(source_name, branch=None, price_list=None, rate=0):
     frappe.db.commit()
     return doc.name
 
+def reset_resto_stock(branch=None, exclude_branches=None):
+    """
+    Reset stock_used, is_sold_out, stock_limit, dan uncheck use_stock dengan satu UPDATE.
+    branch: hanya menu yang dijual di branch ini.
+    exclude_branches: lewati menu milik branch yang punya jadwal reset sendiri.
+    Return jumlah baris yang direset.
+    """
+    start = time.monotonic()
+
+    conditions = ["use_stock = 1"]
+    params = {}
+
+    if branch:
+        conditions.append("""name IN (
+            SELECT bm.menu_item FROM `tabBranch Menu` bm WHERE bm.branch = %(branch)s
+        )""")
+        params["branch"] = branch
+
+    if exclude_branches:
+        conditions.append("""name NOT IN (
+            SELECT bm.menu_item FROM `tabBranch Menu` bm
+            WHERE bm.branch IN %(exclude_branches)s AND bm.menu_item IS NOT NULL
+        )""")
+        params["exclude_branches"] = tuple(exclude_branches)
+
+    frappe.db.sql(f"""
+        UPDATE `tabResto Menu`
+        SET use_stock = 0, stock_limit = 0, stock_used = 0, is_sold_out = 0
+        WHERE {" AND ".join(conditions)}
+    """, params)
+
+    reset_count = frappe.db._cursor.rowcount
+    elapsed_ms = round((time.monotonic() - start) * 1000, 1)
+
+    if reset_count:
+        frappe.db.after_commit.add(lambda: _after_stock_reset(branch))
+
+    frappe.logger("resto_stock").info({
+        "message": "Resto Menu stock reset",
+        "branch": branch or "ALL",
+        "excluded_branches": list(exclude_branches or []),
+        "rows_reset": reset_count,
+        "elapsed_ms": elapsed_ms
+    })
+
+    return reset_count
+
+
+def _after_stock_reset(branch=None):
+    # Mirror Redis diisi ulang otomatis saat get_resto_menu_stock_many berikutnya.
+    # Batas versi reset menolak flush terlambat yang membaca stok sebelum reset.
+    cache = frappe.cache()
+    reset_version = frappe.db.sql("SELECT CAST(UNIX_TIMESTAMP(NOW(6)) * 1000000 AS UNSIGNED)")[0][0]
+    version_key = cache.make_key(STOCK_VERSION_KEY)
+    pipe = cache.pipeline()
+    pipe.delete(cache.make_key(STOCK_CACHE_KEY), version_key)
+    # Nilai mentah (bukan pickle) karena dibaca SET_STOCK_STATE_SCRIPT
+    pipe.hset(version_key, STOCK_RESET_VERSION, reset_version)
+    pipe.expire(version_key, STOCK_CACHE_TTL)
+    pipe.execute()
+
+    branches = [branch] if branch else frappe.get_all("Branch", pluck="name")
+    for b in branches:
+        frappe.publish_realtime(STOCK_RESET_REALTIME_EVENT, {"branch": b}, doctype="Branch", docname=b)
+
+
+def _branches_with_reset_schedule():
+    if not frappe.get_meta("Branch").has_field("stock_reset_time"):
+        return []
+
+    return frappe.get_all(
+        "Branch",
+        filters={"stock_reset_time": ["is", "set"]},
+        fields=["name", "stock_reset_time", "stock_reset_time_zone", "last_stock_reset"]
+    )
+
+
 def reset_daily_resto_stock():
     """
-    Reset stock_used, is_sold_out, stock_limit, dan uncheck use_stock untuk semua Resto Menu yang pakai stok.
-    """
-    menus = frappe.get_all("Resto Menu", filters={"use_stock": 1}, fields=["name"])
-    
-    for m in menus:
-        menu_doc = frappe.get_doc("Resto Menu", m.name)
-        menu_doc.use_stock = 0
-        menu_doc.stock_limit = 0
-        menu_doc.stock_used = 0
-        menu_doc.is_sold_out = 0
-        menu_doc.save(ignore_permissions=True)
-    
-    frappe.clear_cache(doctype="Resto Menu")
-    frappe.log_error("Daily stock reset executed", "Resto Menu Stock Reset")
+    Scheduler harian global. Branch yang punya Stock Reset Time dilewati,
+    karena direset oleh reset_branch_stock_on_opening sesuai jam buka lokalnya.
+    """
+    scheduled = [b.name for b in _branches_with_reset_schedule()]
+    reset_resto_stock(exclude_branches=scheduled)
+    frappe.db.commit()
+
+
+def reset_branch_stock_on_opening():
+    """
+    Scheduler cron: reset stok per branch saat jam lokal sudah melewati
+    Stock Reset Time dan hari ini belum direset.
+    Menu yang dijual di beberapa branch ikut direset oleh branch yang buka paling awal.
+    """
+    for b in _branches_with_reset_schedule():
+        try:
+            tz = ZoneInfo(b.stock_reset_time_zone or get_system_timezone())
+        except Exception:
+            frappe.log_error(f"Time zone tidak valid: {b.stock_reset_time_zone}", f"Stock Reset {b.name}")
+            continue
+
+        local_now = datetime.now(tz)
+        if local_now.time() < get_time(str(b.stock_reset_time)):
+            continue
+        if b.last_stock_reset and getdate(b.last_stock_reset) >= local_now.date():
+            continue
+
+        reset_resto_stock(branch=b.name)
+        frappe.db.set_value("Branch", b.name, "last_stock_reset", local_now.date(), update_modified=False)
+        frappe.db.commit()
@@ -1,9 +1,105 @@
 # Copyright (c) 2025, PT Sopwer Teknologi Indonesia and Contributors
 # See license.txt
 
-# import frappe
+import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from resto.resto_sopwer.doctype.resto_menu.resto_menu import (
+	_cache_stock_states,
+	_load_stock_states,
+	consume_resto_menu_stock,
+	get_stock_states,
+	rollback_resto_menu_stock,
+)
+from resto.tests.utils import run_concurrently
+
+TEST_BRAND = "_Test Resto Brand"
+
+
+def _make_stock_menu(stock_limit):
+	if not frappe.db.exists("Brand", TEST_BRAND):
+		frappe.get_doc({"doctype": "Brand", "brand": TEST_BRAND}).insert(ignore_permissions=True)
+
+	menu = frappe.get_doc({
+		"doctype": "Resto Menu",
+		"title": f"Stock Test {frappe.generate_hash(length=6)}",
+		"menu_code": "_TST",
+		"brand": TEST_BRAND,
+		"use_stock": 1,
+		"stock_limit": stock_limit,
+		"stock_used": 0,
+	}).insert(ignore_permissions=True)
+
+	# Thread consumer memakai koneksi sendiri, jadi data harus sudah ter-commit
+	frappe.db.commit()
+	return menu.name
+
 
 class TestRestoMenu(FrappeTestCase):
-	pass
+	def tearDown(self):
+		for name in getattr(self, "_menus", []):
+			frappe.delete_doc("Resto Menu", name, force=True, ignore_permissions=True)
+		frappe.db.commit()
+
+	def make_menu(self, stock_limit):
+		name = _make_stock_menu(stock_limit)
+		self._menus = getattr(self, "_menus", []) + [name]
+		return name
+
+	def test_consume_marks_sold_out_at_limit(self):
+		menu = self.make_menu(2)
+
+		consume_resto_menu_stock(menu, 1)
+		self.assertEqual(frappe.db.get_value("Resto Menu", menu, "is_sold_out"), 0)
+
+		consume_resto_menu_stock(menu, 1)
+		used, sold_out = frappe.db.get_value("Resto Menu", menu, ["stock_used", "is_sold_out"])
+		self.assertEqual((used, sold_out), (2, 1))
+
+		self.assertRaises(frappe.ValidationError, consume_resto_menu_stock, menu, 1)
+
+	def test_fractional_or_non_positive_qty_is_rejected(self):
+		menu = self.make_menu(2)
+
+		for qty in (0.5, 0, -1):
+			self.assertRaises(frappe.ValidationError, consume_resto_menu_stock, menu, qty)
+			self.assertRaises(frappe.ValidationError, rollback_resto_menu_stock, menu, qty)
+
+		consume_resto_menu_stock(menu, 2.0)
+		self.assertEqual(frappe.db.get_value("Resto Menu", menu, "stock_used"), 2)
+
+	def test_rollback_reopens_menu(self):
+		menu = self.make_menu(1)
+		consume_resto_menu_stock(menu, 1)
+
+		rollback_resto_menu_stock(menu, 1)
+		used, sold_out = frappe.db.get_value("Resto Menu", menu, ["stock_used", "is_sold_out"])
+		self.assertEqual((used, sold_out), (0, 0))
+
+	def test_late_stock_flush_does_not_overwrite_newer_state(self):
+		menu = self.make_menu(5)
+		consume_resto_menu_stock(menu, 2)
+		# after_commit membaca ulang stok ter-commit lalu mengisi mirror
+		frappe.db.commit()
+		self.assertEqual(get_stock_states([menu])[menu]["stock_used"], 2)
+
+		# Worker lain yang membaca sebelum commit di atas baru flush sekarang
+		states, version = _load_stock_states([menu])
+		_cache_stock_states({menu: {**states[menu], "stock_used": 1}}, version - 1)
+		self.assertEqual(get_stock_states([menu])[menu]["stock_used"], 2)
+
+	def test_parallel_consumers_never_oversell(self):
+		stock_limit, consumers = 5, 20
+		menu = self.make_menu(stock_limit)
+
+		results = [
+			not isinstance(r, frappe.ValidationError)
+			for r in run_concurrently(consume_resto_menu_stock, consumers, menu, 1)
+		]
+
+		self.assertEqual(results.count(True), stock_limit)
+		self.assertEqual(results.count(False), consumers - stock_limit)
+
+		used, sold_out = frappe.db.get_value("Resto Menu", menu, ["stock_used", "is_sold_out"])
+		self.assertEqual(used, stock_limit)
+		self.assertEqual(sold_out, 1)
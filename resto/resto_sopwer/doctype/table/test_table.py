@@ -1,9 +1,169 @@
 # Copyright (c) 2025, PT Sopwer Teknologi Indonesia and Contributors
 # See license.txt
 
-# import frappe
+from unittest.mock import patch
+
+import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from resto.api import add_table_order, get_all_tables_with_details, update_table_status
+from resto.table_feed import TABLE_EVENT, get_table_changes
+from resto.table_lookup import (
+	INVOICE_TABLES_TTL,
+	get_invoice_tables,
+	get_invoice_tables_bulk,
+	invalidate_invoice_tables,
+)
+from resto.tests.utils import run_in_other_session
+
+TEST_FLOORS = ("_Test Floor A", "_Test Floor B")
+
+
+def make_table(table_name, floor, invoices=()):
+	for name in TEST_FLOORS:
+		if not frappe.db.exists("Table Floor", name):
+			frappe.get_doc({"doctype": "Table Floor", "name_floor": name}).insert()
+
+	table = frappe.get_doc({
+		"doctype": "Table",
+		"table_name": table_name,
+		"floor": floor,
+		"status": "Terisi" if invoices else "Kosong",
+		"orders": [{"invoice_name": inv} for inv in invoices],
+	})
+	table.flags.ignore_links = True
+	return table.insert()
+
 
 class TestTable(FrappeTestCase):
-	pass
+	def setUp(self):
+		make_table("_Test T1", TEST_FLOORS[0], ["_Test INV-1", "_Test INV-2"])
+		make_table("_Test T2", TEST_FLOORS[0])
+		make_table("_Test T3", TEST_FLOORS[1], ["_Test INV-3"])
+
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def test_floor_plan_orders_are_grouped_per_table(self):
+		with self.assertQueryCount(2):
+			tables = get_all_tables_with_details(floor=TEST_FLOORS[0])
+
+		self.assertEqual([t["id"] for t in tables], ["_Test T1", "_Test T2"])
+		self.assertEqual(
+			[t["orders"] for t in tables],
+			[[{"invoice_name": "_Test INV-1"}, {"invoice_name": "_Test INV-2"}], []]
+		)
+
+	def test_floor_plan_without_filter_returns_all_floors(self):
+		ids = {t["id"] for t in get_all_tables_with_details()}
+		self.assertTrue({"_Test T1", "_Test T2", "_Test T3"} <= ids)
+
+	def test_table_change_is_published_with_resumable_seq(self):
+		frappe.db.after_commit.run()
+		since = get_table_changes(since=0)["seq"]
+
+		table = frappe.get_doc("Table", "_Test T2")
+		table.status = "Terisi"
+		table.pax = 4
+		table.append("orders", {"invoice_name": "_Test INV-9"})
+		table.save()
+
+		with patch("frappe.publish_realtime") as publish:
+			frappe.db.after_commit.run()
+
+		event, message = publish.call_args.args
+		self.assertEqual(event, TABLE_EVENT)
+		self.assertEqual(publish.call_args.kwargs, {"doctype": "Table Floor", "docname": TEST_FLOORS[0]})
+		self.assertEqual(message["seq"], since + 1)
+		self.assertEqual((message["id"], message["status"], message["pax"]), ("_Test T2", "Terisi", 4))
+		self.assertEqual(message["orders"], [{"invoice_name": "_Test INV-9"}])
+
+		feed = get_table_changes(since=since, floor=TEST_FLOORS[0])
+		self.assertFalse(feed["reset"])
+		self.assertEqual([c["seq"] for c in feed["changes"]], [since + 1])
+		self.assertEqual(get_table_changes(since=since, floor=TEST_FLOORS[1])["changes"], [])
+
+	def test_table_changes_resync_when_seq_unknown(self):
+		feed = get_table_changes(since=10**9, floor=TEST_FLOORS[1])
+		self.assertTrue(feed["reset"])
+		self.assertEqual([t["id"] for t in feed["tables"]], ["_Test T3"])
+
+	def test_update_table_status_keeps_orders_of_other_waiters(self):
+		versions = frappe.db.count("Version", {"ref_doctype": "Table", "docname": "_Test T1"})
+		first = update_table_status("_Test T1", pax=3, orders=[{"invoice_name": "_Test INV-1"}, {"invoice_name": "_Test INV-4"}])
+		add_table_order("_Test T1", {"invoice_name": "_Test INV-5"})
+
+		table = frappe.get_doc("Table", "_Test T1")
+		self.assertEqual(table.pax, 3)
+		self.assertEqual(
+			[o.invoice_name for o in table.orders],
+			["_Test INV-1", "_Test INV-2", "_Test INV-4", "_Test INV-5"]
+		)
+		self.assertEqual([o.idx for o in table.orders], [1, 2, 3, 4])
+		self.assertEqual(frappe.db.count("Version", {"ref_doctype": "Table", "docname": "_Test T1"}), versions)
+
+		# Client masih memegang versi sebelum add_table_order
+		with self.assertRaises(frappe.TimestampMismatchError):
+			update_table_status("_Test T1", pax=5, modified=first["modified"])
+
+	def test_concurrent_waiters_do_not_duplicate_orders(self):
+		# Sesi lain hanya melihat data yang sudah di-commit
+		frappe.db.rollback()
+		table = make_table("_Test T Concurrent", TEST_FLOORS[0], ["_Test INV-C1"]).name
+		frappe.db.commit()
+		self.addCleanup(frappe.db.commit)
+		self.addCleanup(frappe.delete_doc, "Table", table, force=True)
+
+		# Snapshot REPEATABLE READ sesi ini dimulai sebelum waiter lain commit
+		frappe.db.get_value("Table", table, "modified")
+		run_in_other_session(add_table_order, table, {"invoice_name": "_Test INV-C2"})
+
+		add_table_order(table, {"invoice_name": "_Test INV-C2"})
+		add_table_order(table, {"invoice_name": "_Test INV-C3"})
+		frappe.db.commit()
+
+		orders = frappe.get_all(
+			"Table Order",
+			filters={"parenttype": "Table", "parent": table},
+			fields=["invoice_name", "idx"],
+			order_by="idx asc",
+			as_list=True
+		)
+		self.assertEqual(
+			[tuple(o) for o in orders],
+			[("_Test INV-C1", 1), ("_Test INV-C2", 2), ("_Test INV-C3", 3)]
+		)
+
+	def test_update_table_status_kosong_clears_table(self):
+		add_table_order("_Test T2", {"invoice_name": "_Test INV-6"})
+		self.assertEqual(frappe.db.get_value("Table", "_Test T2", "status"), "Terisi")
+
+		update_table_status("_Test T2", status="Kosong")
+
+		table = frappe.get_doc("Table", "_Test T2")
+		self.assertEqual((table.status, table.pax, table.orders), ("Kosong", 0, []))
+
+	def test_invoice_table_lookup_is_cached_and_invalidated(self):
+		update_table_status("_Test T1", pax=2)
+		self.assertEqual(get_invoice_tables("_Test INV-1"), {"table_names": "_Test T1", "pax": 2})
+
+		with self.assertQueryCount(0):
+			get_invoice_tables("_Test INV-1")
+
+		update_table_status("_Test T1", pax=6)
+		self.assertEqual(get_invoice_tables("_Test INV-1")["pax"], 6)
+
+	def test_invoice_table_lookup_expires(self):
+		invalidate_invoice_tables(["_Test INV-3"])
+		with patch.object(frappe.cache(), "set_value", wraps=frappe.cache().set_value) as set_value:
+			get_invoice_tables("_Test INV-3")
+
+		self.assertEqual(set_value.call_args.kwargs["expires_in_sec"], INVOICE_TABLES_TTL)
+
+	def test_invoice_table_lookup_bulk(self):
+		with self.assertQueryCount(1):
+			tables = get_invoice_tables_bulk(["_Test INV-1", "_Test INV-3", "_Test INV-X"])
+
+		self.assertEqual(tables["_Test INV-1"]["table_names"], "_Test T1")
+		self.assertEqual(tables["_Test INV-3"]["table_names"], "_Test T3")
+		self.assertEqual(tables["_Test INV-X"], {"table_names": "", "pax": 0})
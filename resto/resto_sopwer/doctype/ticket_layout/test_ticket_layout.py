@@ -0,0 +1,98 @@
+# Copyright (c) 2026, PT Sopwer Teknologi Indonesia and Contributors
+# See license.txt
+
+import os
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from resto import printing
+from resto.printing import EscPosWriter, _esc_bold
+from resto.ticket_layout import DEFAULT_TEMPLATES, compile_template, get_plan, render
+
+
+# Output build_escpos_bill / build_escpos_receipt sebelum template layout
+# (commit sebelum Ticket Layout), direkam dengan context dan alamat di bawah.
+GOLDEN_DIR = os.path.join(os.path.dirname(__file__), "test_data")
+PRINT_TIME = datetime(2026, 10, 18, 12, 30)
+COMPANY_ADDRESS = {"city": "Jakarta", "address_line1": "Jl. Sudirman 1", "address_line2": "", "phone": "021-555"}
+
+
+def make_print_context():
+	data = {
+		"name": "_Test Layout INV", "company": "_Test Company", "branch": "",
+		"order_type": "Take Away", "queue": "A12", "customer": "", "customer_name": "Budi",
+		"total": 95000, "discount_amount": 5000, "discount_name": "Member", "grand_total": 100000,
+		"paid_amount": 100000, "change_amount": 0,
+		"items": [
+			{"short_name": "Nasi Goreng", "qty": 2, "rate": 25000, "add_ons": "Telur (5000), Pedas"},
+			{"short_name": "Es Teh", "qty": 1, "rate": 10000, "add_ons": ""},
+			{"short_name": "Batal", "qty": 1, "rate": 1000, "status_kitchen": "Void Menu"},
+		],
+		"taxes": [
+			{"description": "Pendapatan Service", "amount": 4750},
+			{"description": "VAT 11%", "amount": 5000},
+		],
+		"payments": [{"mode_of_payment": "Cash", "amount": 100000}],
+	}
+	return SimpleNamespace(
+		data=data, table_names="T1, T2", total_pax=4, waiter_name="Waiter", cashier_name="Kasir", mandarin_map={}
+	)
+
+
+def read_golden(ticket_type):
+	with open(os.path.join(GOLDEN_DIR, f"{ticket_type.lower()}_default.bin"), "rb") as f:
+		return f.read()
+
+
+class TestTicketLayout(FrappeTestCase):
+	def test_default_templates_compile(self):
+		for template in DEFAULT_TEMPLATES.values():
+			plan = compile_template(template)
+			self.assertIn("table_names", plan.fields)
+
+	def test_plan_is_compiled_once_per_template(self):
+		template = "line No : {name}\nsep"
+		self.assertIs(get_plan(template), get_plan(template))
+
+	def test_render_fills_values_at_layout_width(self):
+		plan = compile_template("""
+			line No : {name}
+			bold? Pax : {pax}
+			line? Customer: {customer}
+			sep
+			items
+		""")
+		sections = {"items": lambda out, rows: [out.line(row) for row in rows]}
+
+		out = render(plan, EscPosWriter(width=42), {"name": "INV-1", "pax": 0, "customer": "Budi"}, sections, ["Nasi"])
+
+		self.assertEqual(out.getvalue(), b"No : INV-1\nCustomer: Budi\n" + b"-" * 42 + b"\nNasi\n")
+
+		out = render(plan, EscPosWriter(width=32), {"name": "INV-1", "pax": 4, "customer": ""}, sections, [])
+		self.assertIn(_esc_bold(True) + b"Pax : 4\n" + _esc_bold(False), out.getvalue())
+		self.assertNotIn(b"Customer", out.getvalue())
+
+	def test_invalid_template_is_rejected(self):
+		for template in ("unknown op", "line {bad field}", "align middle", "feed x"):
+			self.assertRaises(frappe.ValidationError, compile_template, template)
+
+	def test_default_templates_match_pre_layout_builders(self):
+		ctx = make_print_context()
+		with patch.object(printing, "get_invoice_print_context", return_value=ctx), \
+				patch.object(printing, "now_datetime", return_value=PRINT_TIME), \
+				patch.object(printing, "get_company_address", return_value=COMPANY_ADDRESS), \
+				patch.object(printing, "get_print_header", side_effect=printing.build_print_header):
+			self.assertEqual(printing.build_escpos_bill(ctx.data["name"]), read_golden("Bill"))
+			self.assertEqual(printing.build_escpos_receipt(ctx.data["name"]), read_golden("Receipt"))
+
+	def test_alignment_is_sent_only_when_it_changes(self):
+		plan = compile_template("center A\ncenter B\nalign center\nalign left\ncenter C")
+		out = render(plan, EscPosWriter(), {}, {})
+
+		expected = EscPosWriter().align("center").line("A").line("B")
+		expected.align("left").align("center").line("C")
+		self.assertEqual(out.getvalue(), expected.getvalue())
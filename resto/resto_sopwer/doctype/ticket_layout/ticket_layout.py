@@ -0,0 +1,36 @@
+# Copyright (c) 2026, PT Sopwer Teknologi Indonesia and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+from resto.ticket_layout import (
+	LINE_WIDTHS,
+	TEMPLATE_FIELDS,
+	compile_template,
+	invalidate_ticket_layout,
+)
+
+
+class TicketLayout(Document):
+	def validate(self):
+		line_width = int(self.line_width or 0)
+		if line_width not in LINE_WIDTHS:
+			frappe.throw(f"Line Width harus salah satu dari {', '.join(map(str, LINE_WIDTHS))}")
+
+		if self.paper_width == "58mm" and line_width > 42:
+			frappe.throw("Kertas 58mm maksimal 42 kolom")
+
+		# Template dicek saat simpan supaya kesalahan tidak baru ketahuan saat print
+		for fieldname in TEMPLATE_FIELDS.values():
+			if (self.get(fieldname) or "").strip():
+				compile_template(self.get(fieldname))
+
+	def on_update(self):
+		before = self.get_doc_before_save()
+		if before and before.branch != self.branch:
+			invalidate_ticket_layout(before.branch)
+		invalidate_ticket_layout(self.branch)
+
+	def on_trash(self):
+		invalidate_ticket_layout(self.branch)
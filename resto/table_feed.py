@@ -0,0 +1,90 @@
+"""
+Feed perubahan status meja lewat Frappe realtime.
+
+Setiap perubahan Table dikirim sebagai event ringkas (bentuk sama dengan satu
+entry get_all_tables_with_details + seq) ke room Table Floor meja tersebut:
+
+    frappe.realtime.doc_subscribe("Table Floor", floor)
+    frappe.realtime.on("resto_table_change", handler)
+
+seq naik terus per site. Event terakhir disimpan di Redis, jadi tablet yang
+reconnect cukup memanggil get_table_changes(since=<seq terakhir>); kalau yang
+terlewat sudah terbuang dari log, respon berisi snapshot lengkap (reset).
+"""
+import json
+
+import frappe
+
+TABLE_EVENT = "resto_table_change"
+TABLE_SEQ_KEY = "resto_table_seq"
+TABLE_LOG_KEY = "resto_table_changes"
+TABLE_LOG_SIZE = 2000
+
+
+def table_message(table, deleted=False):
+    """Entry meja ringkas dari dokumen Table (orders dari child table yang sudah dimuat)."""
+    return {
+        "id": table.name,
+        "name": table.table_name,
+        "status": table.status or "Kosong",
+        "type": table.table_type,
+        "zone": table.zone,
+        "customer": table.customer or None,
+        "pax": table.pax or 0,
+        "typeCustomer": table.type_customer or None,
+        "floor": table.floor or "1",
+        "takenBy": table.taken_by or None,
+        "checked": table.checked,
+        "orders": [{"invoice_name": o.invoice_name} for o in table.get("orders") or []],
+        "deleted": int(deleted),
+    }
+
+
+def publish_table_change(message):
+    """Beri seq, simpan ke log, dan broadcast event setelah commit."""
+
+    def _flush():
+        cache = frappe.cache()
+        message["seq"] = cache.incr(cache.make_key(TABLE_SEQ_KEY))
+
+        log_key = cache.make_key(TABLE_LOG_KEY)
+        pipe = cache.pipeline()
+        pipe.zadd(log_key, {json.dumps(message, default=str): message["seq"]})
+        pipe.zremrangebyrank(log_key, 0, -TABLE_LOG_SIZE - 1)
+        pipe.execute()
+
+        frappe.publish_realtime(TABLE_EVENT, message, doctype="Table Floor", docname=message["floor"])
+
+    frappe.db.after_commit.add(_flush)
+
+
+def on_table_change(doc, method=None, *args, **kwargs):
+    """doc_events Table: on_update / on_trash."""
+    publish_table_change(table_message(doc, deleted=method == "on_trash"))
+
+
+@frappe.whitelist(allow_guest=True)
+def get_table_changes(since=0, floor=None):
+    """
+    Perubahan meja setelah seq `since`. Kalau log tidak lagi mencakup `since`
+    (terbuang atau Redis di-restart), kembalikan snapshot lengkap dengan reset=1.
+    """
+    from resto.api import get_all_tables_with_details
+
+    since = int(since or 0)
+    cache = frappe.cache()
+    log_key = cache.make_key(TABLE_LOG_KEY)
+
+    # seq dibaca sebelum snapshot: client bisa menerima event dobel, tidak pernah terlewat
+    current = int(cache.get(cache.make_key(TABLE_SEQ_KEY)) or 0)
+    oldest = cache.zrange(log_key, 0, 0, withscores=True)
+    oldest_seq = int(oldest[0][1]) if oldest else current + 1
+
+    if since > current or (since < current and since + 1 < oldest_seq):
+        return {"seq": current, "reset": 1, "tables": get_all_tables_with_details(floor=floor)}
+
+    changes = [json.loads(raw) for raw in cache.zrangebyscore(log_key, since + 1, current)]
+    if floor:
+        changes = [c for c in changes if c["floor"] == floor]
+
+    return {"seq": current, "reset": 0, "changes": changes}
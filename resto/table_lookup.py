@@ -0,0 +1,93 @@
+"""
+Reverse lookup invoice -> meja (nama meja + pax).
+
+Tiket kitchen, checker, bill dan void selalu butuh meja dari invoice. Table
+Order.invoice_name sekarang ber-index, hasil per invoice di-cache di Redis
+(satu key per invoice dengan TTL) sampai meja yang memuat invoice itu berubah,
+dan get_invoice_tables_bulk
+mengambil banyak invoice dalam satu query untuk laporan / listing end day.
+"""
+from typing import Dict, Iterable
+
+import frappe
+
+INVOICE_TABLES_CACHE_KEY = "resto_invoice_tables"
+# Invoice yang sudah ditutup / di-merge tanpa perubahan meja tetap hilang sendiri
+INVOICE_TABLES_TTL = 6 * 60 * 60
+
+
+def _cache_key(invoice):
+    return f"{INVOICE_TABLES_CACHE_KEY}::{invoice}"
+
+
+def _empty():
+    return {"table_names": "", "pax": 0}
+
+
+def _load_invoice_tables(invoices) -> Dict[str, Dict]:
+    """Satu query (index invoice_name) untuk banyak invoice -> {invoice: {table_names, pax}}."""
+    result = {inv: _empty() for inv in invoices}
+    if not result:
+        return result
+
+    rows = frappe.db.sql("""
+        SELECT tor.invoice_name, tor.parent, IFNULL(t.pax, 0) AS pax
+        FROM `tabTable Order` tor
+        LEFT JOIN `tabTable` t ON t.name = tor.parent
+        WHERE tor.parenttype = 'Table' AND tor.invoice_name IN %(invoices)s
+        ORDER BY tor.invoice_name, tor.parent, tor.idx
+    """, {"invoices": list(result)}, as_dict=True)
+
+    tables = {}
+    for row in rows:
+        tables.setdefault(row.invoice_name, {})[row.parent] = None
+        # pax dijumlah per baris Table Order (perilaku lama get_total_pax_from_pos_invoice)
+        result[row.invoice_name]["pax"] += int(row.pax or 0)
+
+    for inv, names in tables.items():
+        result[inv]["table_names"] = ", ".join(names)
+    return result
+
+
+def get_invoice_tables(invoice: str) -> Dict:
+    """{table_names, pax} satu invoice, dari cache Redis."""
+    cache = frappe.cache()
+    info = cache.get_value(_cache_key(invoice))
+    if info is None:
+        info = _load_invoice_tables([invoice])[invoice]
+        cache.set_value(_cache_key(invoice), info, expires_in_sec=INVOICE_TABLES_TTL)
+    return info
+
+
+@frappe.whitelist()
+def get_invoice_tables_bulk(invoices) -> Dict[str, Dict]:
+    """{invoice: {table_names, pax}} untuk banyak invoice sekaligus (satu query, tanpa cache)."""
+    if isinstance(invoices, str):
+        invoices = frappe.parse_json(invoices)
+    return _load_invoice_tables(list(dict.fromkeys(i for i in invoices or [] if i)))
+
+
+def invalidate_invoice_tables(invoices: Iterable[str]):
+    """
+    Buang cache invoice yang meja-nya berubah. Dihapus sekarang (pembaca di
+    transaksi yang sama) dan lagi setelah commit (worker lain yang sempat
+    mengisi cache dengan data sebelum commit).
+    """
+    keys = [_cache_key(i) for i in dict.fromkeys(invoices) if i]
+    if not keys:
+        return
+
+    def _flush():
+        frappe.cache().delete_value(keys)
+
+    _flush()
+    frappe.db.after_commit.add(_flush)
+
+
+def invalidate_invoice_tables_for_table(doc, method=None, *args, **kwargs):
+    """doc_events Table: invoice di orders sebelum dan sesudah perubahan."""
+    before = doc.get_doc_before_save()
+    invoices = [o.invoice_name for o in doc.get("orders") or []]
+    if before:
+        invoices += [o.invoice_name for o in before.get("orders") or []]
+    invalidate_invoice_tables(invoices)
@@ -0,0 +1,55 @@
+"""
+Helper test yang butuh koneksi database sendiri (race antar worker / request).
+
+Tiap fungsi dijalankan di thread dengan frappe.init + frappe.connect sendiri,
+jadi datanya harus sudah ter-commit sebelum dipanggil.
+"""
+import threading
+
+import frappe
+
+
+def _run_in_own_connection(site, fn, args, barrier, results):
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        if barrier:
+            barrier.wait()
+        try:
+            result = fn(*args)
+            frappe.db.commit()
+        except Exception as e:
+            frappe.db.rollback()
+            result = e
+        results.append(result)
+    finally:
+        frappe.destroy()
+
+
+def run_concurrently(fn, workers, *args):
+    """
+    Jalankan fn(*args) di `workers` koneksi sekaligus (start bareng lewat barrier).
+    Tiap hasil di-commit; exception di-rollback dan dikembalikan sebagai hasil.
+    """
+    barrier = threading.Barrier(workers) if workers > 1 else None
+    results = []
+    threads = [
+        threading.Thread(
+            target=_run_in_own_connection,
+            args=(frappe.local.site, fn, args, barrier, results),
+        )
+        for _ in range(workers)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def run_in_other_session(fn, *args):
+    """fn(*args) di koneksi lain sampai commit (transaksi test ini tetap terbuka)."""
+    result = run_concurrently(fn, 1, *args)[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
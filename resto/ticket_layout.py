@@ -0,0 +1,250 @@
+"""
+Layout tiket deklaratif per branch: lebar kolom printer + urutan/visibilitas section.
+
+Template berupa teks, satu instruksi per baris:
+
+    header                      section Python (header, items, totals, payments, queue)
+    line No : {name}            teks biasa, {field} diisi saat render
+    bold? Table: {table_names}  akhiran '?' = baris dilewati kalau semua field kosong
+    center Terima kasih!        align center (kalau belum) lalu teks
+    big {queue}                 teks ukuran double (nomor antrian)
+    align left | sep | feed 8 | cut
+
+Template di-parse sekali menjadi RenderPlan (langkah + potongan literal/field
+yang sudah dipisah) dan di-cache per proses berdasarkan teks template, jadi
+render cukup mengisi nilai. Pengaturan per branch ada di doctype Ticket
+Layout dan disimpan di Redis sampai dokumennya berubah.
+"""
+import string
+
+import frappe
+
+LAYOUT_CACHE_KEY = "resto_ticket_layout"
+DEFAULT_LINE_WIDTH = 32
+LINE_WIDTHS = (32, 42, 48)
+
+SECTION_NAMES = ("header", "items", "totals", "payments", "queue")
+TEXT_OPS = ("line", "bold", "center", "big")
+ALIGNMENTS = ("left", "center", "right")
+
+DEFAULT_TEMPLATES = {
+    "Bill": """
+header
+line No : {name}
+line Date : {print_time}
+bold? Table: {table_names}
+line Purpose : {order_type}
+bold? Pax : {pax}
+line Cashier : {waiter}
+line? Customer: {customer}
+sep
+items
+sep
+totals
+sep
+center Terima kasih!
+center Selamat menikmati hidangan Anda!
+queue
+feed 8
+cut
+""",
+    "Receipt": """
+header
+line No : {name}
+line Date : {print_time}
+bold? Table: {table_names}
+line Purpose : {order_type}
+bold? Pax : {pax}
+line Cashier : {cashier}
+line? Customer: {customer}
+sep
+items
+sep
+totals
+payments
+sep
+center Terima kasih!
+center Selamat menikmati hidangan Anda!
+queue
+feed 8
+cut
+""",
+}
+
+# Field Ticket Layout per jenis tiket
+TEMPLATE_FIELDS = {
+    "Bill": "bill_template",
+    "Receipt": "receipt_template",
+}
+
+_formatter = string.Formatter()
+# teks template -> RenderPlan
+_plans = {}
+
+
+class RenderPlan:
+    __slots__ = ("steps", "fields")
+
+    def __init__(self, steps, fields):
+        self.steps = steps
+        self.fields = fields
+
+
+def _compile_text(text, lineno):
+    parts = []
+    try:
+        for literal, field, spec, conversion in _formatter.parse(text):
+            if field is not None and not field.isidentifier():
+                frappe.throw(f"Template baris {lineno}: field '{{{field}}}' tidak valid")
+            parts.append((literal, field, spec or ""))
+    except ValueError as e:
+        frappe.throw(f"Template baris {lineno}: {e}")
+    return tuple(parts)
+
+
+def compile_template(template):
+    """Parse teks template menjadi RenderPlan. Instruksi tidak dikenal -> ValidationError."""
+    steps, fields = [], set()
+
+    for lineno, raw in enumerate(template.splitlines(), start=1):
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        op, _, arg = line.partition(" ")
+        optional = op.endswith("?")
+        op = op.rstrip("?")
+
+        if op in TEXT_OPS:
+            parts = _compile_text(arg, lineno)
+            fields.update(f for _, f, _ in parts if f)
+            steps.append(("text", op, parts, optional))
+        elif op in SECTION_NAMES:
+            steps.append(("section", op))
+        elif op == "align":
+            if arg not in ALIGNMENTS:
+                frappe.throw(f"Template baris {lineno}: align harus salah satu dari {', '.join(ALIGNMENTS)}")
+            steps.append(("align", arg))
+        elif op == "feed":
+            if arg and not arg.isdigit():
+                frappe.throw(f"Template baris {lineno}: feed butuh angka")
+            steps.append(("feed", int(arg or 1)))
+        elif op in ("sep", "cut"):
+            steps.append((op,))
+        else:
+            frappe.throw(f"Template baris {lineno}: instruksi '{op}' tidak dikenal")
+
+    return RenderPlan(tuple(steps), frozenset(fields))
+
+
+def get_plan(template):
+    plan = _plans.get(template)
+    if plan is None:
+        plan = _plans[template] = compile_template(template)
+    return plan
+
+
+def render(plan, out, values, sections, *args):
+    """
+    Jalankan plan ke EscPosWriter `out`.
+    values: dict field -> nilai. sections: dict nama -> fn(out, *args).
+
+    ESC a hanya dikirim kalau alignment berubah (beberapa baris `center`
+    berurutan = satu perintah, sama dengan builder lama). Setelah section
+    alignment dianggap tidak diketahui karena section bisa mengubahnya.
+    """
+    alignment = None
+
+    def set_alignment(position):
+        nonlocal alignment
+        if position != alignment:
+            out.align(position)
+            alignment = position
+
+    for step in plan.steps:
+        kind = step[0]
+
+        if kind == "text":
+            _, op, parts, optional = step
+            if optional and not any(values.get(field) for _, field, _ in parts if field):
+                continue
+
+            text = "".join(
+                literal + (format(values.get(field, ""), spec) if field else "")
+                for literal, field, spec in parts
+            )
+            if op == "line":
+                out.line(text)
+            elif op == "bold":
+                out.bold(True).line(text).bold(False)
+            elif op == "center":
+                set_alignment("center")
+                out.line(text)
+            elif op == "big":
+                out += b"\x1b!\x38"                 # ESC ! 56 → double height & width
+                out.line(text)
+                out += b"\x1b!\x00"                 # reset font ke normal
+        elif kind == "section":
+            sections[step[1]](out, *args)
+            alignment = None
+        elif kind == "align":
+            set_alignment(step[1])
+        elif kind == "sep":
+            out.separator()
+        elif kind == "feed":
+            out.feed(step[1])
+        elif kind == "cut":
+            out.cut()
+
+    return out
+
+
+# ========== Pengaturan per Branch ==========
+def _layout_key(branch):
+    return branch or "__default__"
+
+
+def _load_layout(branch):
+    layout = {"line_width": DEFAULT_LINE_WIDTH, "templates": dict(DEFAULT_TEMPLATES)}
+    if not branch:
+        return layout
+
+    row = frappe.db.get_value(
+        "Ticket Layout",
+        {"branch": branch},
+        ["line_width", *TEMPLATE_FIELDS.values()],
+        as_dict=True
+    )
+    if row:
+        layout["line_width"] = int(row.line_width or DEFAULT_LINE_WIDTH)
+        for ticket_type, fieldname in TEMPLATE_FIELDS.items():
+            if (row.get(fieldname) or "").strip():
+                layout["templates"][ticket_type] = row.get(fieldname)
+    return layout
+
+
+def get_ticket_layout(branch=None):
+    """{line_width, templates} untuk branch; branch tanpa Ticket Layout memakai bawaan 32 kolom."""
+    key = _layout_key(branch)
+    cache = frappe.cache()
+
+    layout = cache.hget(LAYOUT_CACHE_KEY, key)
+    if layout is None:
+        layout = _load_layout(branch)
+        cache.hset(LAYOUT_CACHE_KEY, key, layout)
+    return layout
+
+
+def get_line_width(branch=None):
+    return get_ticket_layout(branch)["line_width"]
+
+
+def get_ticket_plan(branch, ticket_type):
+    """(line_width, RenderPlan) untuk jenis tiket di branch."""
+    layout = get_ticket_layout(branch)
+    return layout["line_width"], get_plan(layout["templates"][ticket_type])
+
+
+def invalidate_ticket_layout(branch=None):
+    key = _layout_key(branch)
+    frappe.db.after_commit.add(lambda: frappe.cache().hdel(LAYOUT_CACHE_KEY, key))